@@ -3,19 +3,35 @@
 from __future__ import annotations
 
 import logging
+from functools import partial
 
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import Platform
 from homeassistant.core import HomeAssistant
 
-from google import genai
-
-from .const import DOMAIN, CONF_MEDIA_SOURCE, VISION_MODEL_NAME, CONF_API_KEY
+from .const import (
+    DOMAIN,
+    CONF_MEDIA_SOURCE,
+    CONF_API_KEY,
+    CONF_REQUESTS_PER_MINUTE,
+    CONF_TOKENS_PER_MINUTE,
+    DEFAULT_REQUESTS_PER_MINUTE,
+    DEFAULT_TOKENS_PER_MINUTE,
+    CONF_PREPROCESS_IMAGES,
+    CONF_IMAGE_LONG_EDGE,
+    DEFAULT_IMAGE_LONG_EDGE,
+    CONF_BATCH_BACKFILL,
+    CONF_PAGES_PER_REQUEST,
+    DEFAULT_PAGES_PER_REQUEST,
+    CONF_CONTEXT_CACHING,
+)
 from .services import async_register_services
 from .llm import async_register_llm_apis
 from .types import JournalAssistantConfigEntry, JournalAssistantData
-from .storage import create_vector_db
-from .processing.vision_model import VisionModel
+from .storage import create_vector_db, load_notebooks
+from .client import async_get_vision_model, async_release_vision_model
+from .processing.image import ImageOptions
+from .processing.rate_limit import RateLimit
 from .media_source_processor import MediaSourceProcessor, ProcessMediaServiceCall
 
 __all__ = [
@@ -32,14 +48,33 @@ async def async_setup_entry(
     hass: HomeAssistant, entry: JournalAssistantConfigEntry
 ) -> bool:
     """Set up a config entry."""
-
-    def create_client() -> genai.Client:
-        return genai.Client(api_key=entry.options[CONF_API_KEY])
-
-    client = await hass.async_add_executor_job(create_client)
-
-    vision_model = VisionModel(client, VISION_MODEL_NAME)
-    vector_db = await create_vector_db(hass, entry, vision_model)
+    rate_limit: RateLimit | None = None
+    if requests_per_minute := int(
+        entry.options.get(CONF_REQUESTS_PER_MINUTE, DEFAULT_REQUESTS_PER_MINUTE)
+    ):
+        rate_limit = RateLimit(
+            requests_per_minute=requests_per_minute,
+            tokens_per_minute=int(
+                entry.options.get(CONF_TOKENS_PER_MINUTE, DEFAULT_TOKENS_PER_MINUTE)
+            ),
+        )
+    image_options: ImageOptions | None = None
+    if entry.options.get(CONF_PREPROCESS_IMAGES):
+        image_options = ImageOptions(
+            long_edge=int(
+                entry.options.get(CONF_IMAGE_LONG_EDGE, DEFAULT_IMAGE_LONG_EDGE)
+            )
+        )
+    vision_model = await async_get_vision_model(
+        hass,
+        entry.options[CONF_API_KEY],
+        rate_limit,
+        image_options,
+        context_caching=entry.options.get(CONF_CONTEXT_CACHING, False),
+    )
+    entry.async_on_unload(partial(async_release_vision_model, hass, vision_model))
+    notebooks = await load_notebooks(hass, entry)
+    vector_db = await create_vector_db(hass, entry, vision_model, notebooks)
 
     media_source = entry.options[CONF_MEDIA_SOURCE]
     processor = MediaSourceProcessor(
@@ -47,11 +82,16 @@ async def async_setup_entry(
         entry.entry_id,
         media_source,
         ProcessMediaServiceCall(entry.entry_id),
+        batch_backfill=entry.options.get(CONF_BATCH_BACKFILL, False),
+        pages_per_request=int(
+            entry.options.get(CONF_PAGES_PER_REQUEST, DEFAULT_PAGES_PER_REQUEST)
+        ),
     )
 
     entry.runtime_data = JournalAssistantData(
+        notebooks=notebooks,
         vector_db=vector_db,
-        vision_model=VisionModel(client, VISION_MODEL_NAME),
+        vision_model=vision_model,
         media_source_processor=processor,
     )
     await hass.config_entries.async_forward_entry_setups(
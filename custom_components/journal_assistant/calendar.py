@@ -1,53 +1,66 @@
 """Journal Assistant calendar platform."""
 
+from collections import OrderedDict
 import datetime
 import logging
 import slugify
 
 from ical.calendar import Calendar
 from ical.journal import Journal
-from ical.timeline import generic_timeline
 
 from homeassistant.components.calendar import CalendarEntity, CalendarEvent
-from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.event import async_track_point_in_utc_time
 from homeassistant.util import dt as dt_util
 
 from .const import DOMAIN
-from .storage import load_journal_entries
+from .processing.journal import JournalTimeline, Notebooks
+from .types import JournalAssistantConfigEntry
 
 _LOGGER = logging.getLogger(__name__)
 
-UPDATE_INTERVAL = datetime.timedelta(minutes=15)
+# Maximum number of materialized events with descriptions kept per calendar
+MAX_CACHED_EVENTS = 500
 
 
 async def async_setup_entry(
     hass: HomeAssistant,
-    entry: ConfigEntry,
+    entry: JournalAssistantConfigEntry,
     async_add_entities: AddEntitiesCallback,
 ) -> None:
     """Set up the journal calendar component."""
     _LOGGER.debug("Setting up journal calendar component")
-    entries = await load_journal_entries(hass, entry)
-    for journal_name, calendar in entries.items():
-        async_add_entities([JournalCalendar(entry, journal_name, calendar)])
+    notebooks = entry.runtime_data.notebooks
+    for journal_name, calendar in notebooks.calendars.items():
+        async_add_entities([JournalCalendar(entry, journal_name, calendar, notebooks)])
 
 
 class JournalCalendar(CalendarEntity):
     """A journal calendar component."""
 
     _attr_has_entity_name = True
+    _attr_should_poll = False
 
     def __init__(
-        self, entry: ConfigEntry, journal_name: str, calendar: Calendar
+        self,
+        entry: JournalAssistantConfigEntry,
+        journal_name: str,
+        calendar: Calendar,
+        notebooks: Notebooks,
     ) -> None:
         """Initialize the journal calendar component."""
         self._attr_unique_id = f"{entry.entry_id}-{slugify.slugify(journal_name)}"
         self._entry = entry
         self._attr_name = journal_name
         self._calendar = calendar
+        self._notebooks = notebooks
         self._event: CalendarEvent | None = None
+        # Indexes are built lazily per timezone and live as long as the entity,
+        # which is recreated when the notebook contents are reloaded.
+        self._timelines: dict[datetime.tzinfo, JournalTimeline] = {}
+        self._calendar_events: OrderedDict[str, CalendarEvent] = OrderedDict()
+        self._unsub_update: CALLBACK_TYPE | None = None
         self._attr_device_info = {
             "identifiers": {(DOMAIN, entry.entry_id)},
             "name": entry.title,
@@ -65,24 +78,87 @@ class JournalCalendar(CalendarEntity):
         end_date: datetime.datetime,
     ) -> list[CalendarEvent]:
         """Return calendar events within a datetime range."""
-        events = generic_timeline(
-            self._calendar.journal, start_date.tzinfo or dt_util.UTC
-        ).overlapping(
+        events = self._timeline(start_date.tzinfo or dt_util.UTC).overlapping(
             start_date,
             end_date,
         )
-        return [_get_calendar_event(event) for event in events]
-
-    async def async_update(self) -> None:
-        """Update entity state with the next upcoming event."""
+        return await self._async_get_calendar_events(list(events))
+
+    async def async_added_to_hass(self) -> None:
+        """Compute the initial state and schedule the next state transition."""
+        await super().async_added_to_hass()
+        await self._async_update_event()
+        self.async_on_remove(self._async_cancel_update)
+
+    async def _async_update_event(self) -> None:
+        """Update the next upcoming event and schedule the next state transition.
+
+        Journal entries only change when the notebook is reloaded, which
+        recreates the entity, so the state only needs to be recomputed when the
+        current event ends or the next event starts.
+        """
+        self._async_cancel_update()
         now = dt_util.now()
-        events = generic_timeline(
-            self._calendar.journal, now.tzinfo or dt_util.UTC
-        ).active_after(now)
+        events = self._timeline(now.tzinfo or dt_util.UTC).active_after(now)
         if event := next(events, None):
-            self._event = _get_calendar_event(event)
+            self._event = (await self._async_get_calendar_events([event]))[0]
         else:
             self._event = None
+            return
+        if now < self._event.start_datetime_local:
+            next_update = self._event.start_datetime_local
+        else:
+            next_update = self._event.end_datetime_local
+        self._unsub_update = async_track_point_in_utc_time(
+            self.hass, self._async_handle_update, dt_util.as_utc(next_update)
+        )
+
+    async def _async_handle_update(self, _: datetime.datetime) -> None:
+        """Handle a scheduled state transition."""
+        self._unsub_update = None
+        await self._async_update_event()
+        self.async_write_ha_state()
+
+    @callback
+    def _async_cancel_update(self) -> None:
+        """Cancel any scheduled state transition."""
+        if self._unsub_update:
+            self._unsub_update()
+        self._unsub_update = None
+
+    def _timeline(self, tzinfo: datetime.tzinfo) -> JournalTimeline:
+        """Return the timeline index for the journal in the specified timezone."""
+        if (timeline := self._timelines.get(tzinfo)) is None:
+            timeline = JournalTimeline(self._calendar.journal, tzinfo)
+            self._timelines[tzinfo] = timeline
+        return timeline
+
+    async def _async_get_calendar_events(
+        self, journals: list[Journal]
+    ) -> list[CalendarEvent]:
+        """Return CalendarEvents for the journal entries, loading descriptions as needed.
+
+        Only the most recently used events are kept so that memory stays bounded
+        as the journal grows.
+        """
+        if missing := [
+            journal
+            for journal in journals
+            if (journal.uid or "") not in self._calendar_events
+        ]:
+            for journal in await self.hass.async_add_executor_job(
+                self._notebooks.materialize, missing
+            ):
+                self._calendar_events[journal.uid or ""] = _get_calendar_event(journal)
+
+        results = []
+        for journal in journals:
+            uid = journal.uid or ""
+            self._calendar_events.move_to_end(uid)
+            results.append(self._calendar_events[uid])
+        while len(self._calendar_events) > MAX_CACHED_EVENTS:
+            self._calendar_events.popitem(last=False)
+        return results
 
 
 def _get_calendar_event(event: Journal) -> CalendarEvent:
@@ -0,0 +1,173 @@
+"""Model API clients shared by all config entries.
+
+Creating a client loads SSL certificates, and the first request on a new client
+pays for a TLS handshake. A client is kept for each API key and a vision model
+for each API key and set of options, so that the config entry reload after each
+scan, and other config entries using the same API key, reuse the same client and
+its pool of open connections. Config entries with different options get their
+own vision model, sharing the client of the API key.
+
+A vision model is released shortly after the last config entry using it is
+unloaded, and the client once no vision model uses its API key.
+"""
+
+import logging
+from dataclasses import dataclass
+
+import httpx
+from google import genai
+from google.genai import types
+
+from homeassistant.const import EVENT_HOMEASSISTANT_CLOSE
+from homeassistant.core import CALLBACK_TYPE, Event, HomeAssistant, callback
+from homeassistant.helpers.event import async_call_later
+from homeassistant.util.hass_dict import HassKey
+from homeassistant.util.ssl import get_default_context
+
+from .const import DOMAIN, VISION_MODEL_NAME
+from .extraction_cache import async_get_extraction_cache
+from .processing.batch import GenaiBatchBackend
+from .processing.image import ImageOptions
+from .processing.rate_limit import RateLimit
+from .processing.vision_model import VisionModel
+
+_LOGGER = logging.getLogger(__name__)
+
+# Seconds an unused vision model is kept, so a config entry reload reuses it
+RELEASE_DELAY = 60
+
+type _VisionModelKey = tuple[str, RateLimit | None, ImageOptions | None, bool]
+
+
+@dataclass
+class _SharedVisionModel:
+    """A vision model and the number of config entries using it."""
+
+    vision_model: VisionModel
+    users: int = 0
+    cancel_release: CALLBACK_TYPE | None = None
+
+
+DATA_VISION_MODELS: HassKey[dict[_VisionModelKey, _SharedVisionModel]] = HassKey(
+    f"{DOMAIN}_vision_models"
+)
+DATA_CLIENTS: HassKey[dict[str, tuple[genai.Client, httpx.AsyncHTTPTransport]]] = (
+    HassKey(f"{DOMAIN}_clients")
+)
+
+
+def _create_client(api_key: str) -> tuple[genai.Client, httpx.AsyncHTTPTransport]:
+    """Create a client for the model API, which performs blocking I/O.
+
+    Without a transport the client opens a new HTTP session for every async
+    request. With a transport it uses a single pooled HTTP client, which keeps
+    connections open between requests.
+    """
+    transport = httpx.AsyncHTTPTransport(verify=get_default_context())
+    client = genai.Client(
+        api_key=api_key,
+        http_options=types.HttpOptions(async_client_args={"transport": transport}),
+    )
+    return client, transport
+
+
+async def _async_get_client(hass: HomeAssistant, api_key: str) -> genai.Client:
+    """Return the client for an API key, creating it on first use."""
+    if (clients := hass.data.get(DATA_CLIENTS)) is None:
+        clients = hass.data[DATA_CLIENTS] = {}
+
+        async def async_close(_: Event) -> None:
+            """Cancel pending releases and close the connections of all clients."""
+            for shared in hass.data.get(DATA_VISION_MODELS, {}).values():
+                if shared.cancel_release is not None:
+                    shared.cancel_release()
+                    shared.cancel_release = None
+            for _, transport in clients.values():
+                await transport.aclose()
+
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_CLOSE, async_close)
+    if (existing := clients.get(api_key)) is not None:
+        return existing[0]
+
+    client, transport = await hass.async_add_executor_job(_create_client, api_key)
+    if (existing := clients.get(api_key)) is not None:
+        # Created by another config entry while the client was being created
+        await transport.aclose()
+        return existing[0]
+    _LOGGER.debug("Creating model API client")
+    clients[api_key] = (client, transport)
+    return client
+
+
+async def async_get_vision_model(
+    hass: HomeAssistant,
+    api_key: str,
+    rate_limit: RateLimit | None = None,
+    image_options: ImageOptions | None = None,
+    context_caching: bool = False,
+) -> VisionModel:
+    """Return the vision model for an API key and options, creating it on first use.
+
+    Each call must be paired with a call to `async_release_vision_model`. The
+    connection to the model API is warmed up in the background when the client
+    for the API key is created.
+    """
+    vision_models = hass.data.setdefault(DATA_VISION_MODELS, {})
+    key: _VisionModelKey = (api_key, rate_limit, image_options, context_caching)
+    if (shared := vision_models.get(key)) is None:
+        new_client = api_key not in hass.data.get(DATA_CLIENTS, {})
+        client = await _async_get_client(hass, api_key)
+        if (shared := vision_models.get(key)) is None:
+            _LOGGER.debug("Creating vision model")
+            vision_model = VisionModel(
+                client,
+                VISION_MODEL_NAME,
+                rate_limit=rate_limit,
+                cache=async_get_extraction_cache(hass),
+                image_options=image_options,
+                context_caching=context_caching,
+                batch_backend=GenaiBatchBackend(client),
+            )
+            shared = vision_models[key] = _SharedVisionModel(vision_model)
+            if new_client:
+                hass.async_create_background_task(
+                    vision_model.async_warm_up(), f"{DOMAIN} model API warm up"
+                )
+    if shared.cancel_release is not None:
+        shared.cancel_release()
+        shared.cancel_release = None
+    shared.users += 1
+    return shared.vision_model
+
+
+@callback
+def async_release_vision_model(hass: HomeAssistant, vision_model: VisionModel) -> None:
+    """Release a vision model returned by `async_get_vision_model`.
+
+    The vision model is discarded after a delay once it has no users, and the
+    client of its API key is closed when no other vision model uses it.
+    """
+    vision_models = hass.data.get(DATA_VISION_MODELS, {})
+    key, shared = next(
+        (key, shared)
+        for key, shared in vision_models.items()
+        if shared.vision_model is vision_model
+    )
+    shared.users -= 1
+    if shared.users > 0:
+        return
+
+    @callback
+    def async_release(_: object) -> None:
+        """Discard the unused vision model and its client if no longer used."""
+        del vision_models[key]
+        api_key = key[0]
+        if any(other[0] == api_key for other in vision_models):
+            return
+        _LOGGER.debug("Closing model API client")
+        _, transport = hass.data[DATA_CLIENTS].pop(api_key)
+        hass.async_create_background_task(
+            transport.aclose(), f"{DOMAIN} close model API client"
+        )
+
+    shared.cancel_release = async_call_later(hass, RELEASE_DELAY, async_release)
@@ -24,6 +24,21 @@ from .const import (
     DEFAULT_NOTES,
     CONF_API_KEY,
     CONF_MEDIA_SOURCE,
+    CONF_REQUESTS_PER_MINUTE,
+    CONF_TOKENS_PER_MINUTE,
+    DEFAULT_REQUESTS_PER_MINUTE,
+    DEFAULT_TOKENS_PER_MINUTE,
+    CONF_PREPROCESS_IMAGES,
+    CONF_BATCH_BACKFILL,
+    CONF_PAGES_PER_REQUEST,
+    DEFAULT_PAGES_PER_REQUEST,
+    CONF_CONTEXT_CACHING,
+    CONF_EMBEDDING_BACKEND,
+    DEFAULT_EMBEDDING_BACKEND,
+    EMBEDDING_BACKEND_GEMINI,
+    EMBEDDING_BACKEND_LOCAL,
+    CONF_IMAGE_LONG_EDGE,
+    DEFAULT_IMAGE_LONG_EDGE,
 )
 
 _LOGGER = logging.getLogger(__name__)
@@ -58,7 +73,60 @@ CONFIG_FLOW = {
 }
 
 OPTIONS_FLOW = {
-    "init": SchemaFlowFormStep(),
+    "init": SchemaFlowFormStep(
+        vol.Schema(
+            {
+                vol.Required(
+                    CONF_REQUESTS_PER_MINUTE, default=DEFAULT_REQUESTS_PER_MINUTE
+                ): selector.NumberSelector(
+                    selector.NumberSelectorConfig(
+                        min=0, mode=selector.NumberSelectorMode.BOX
+                    )
+                ),
+                vol.Required(
+                    CONF_TOKENS_PER_MINUTE, default=DEFAULT_TOKENS_PER_MINUTE
+                ): selector.NumberSelector(
+                    selector.NumberSelectorConfig(
+                        min=1, mode=selector.NumberSelectorMode.BOX
+                    )
+                ),
+                vol.Required(
+                    CONF_PREPROCESS_IMAGES, default=False
+                ): selector.BooleanSelector(),
+                vol.Required(
+                    CONF_IMAGE_LONG_EDGE, default=DEFAULT_IMAGE_LONG_EDGE
+                ): selector.NumberSelector(
+                    selector.NumberSelectorConfig(
+                        min=384,
+                        max=4096,
+                        unit_of_measurement="px",
+                        mode=selector.NumberSelectorMode.BOX,
+                    )
+                ),
+                vol.Required(
+                    CONF_BATCH_BACKFILL, default=False
+                ): selector.BooleanSelector(),
+                vol.Required(
+                    CONF_PAGES_PER_REQUEST, default=DEFAULT_PAGES_PER_REQUEST
+                ): selector.NumberSelector(
+                    selector.NumberSelectorConfig(
+                        min=1, max=10, mode=selector.NumberSelectorMode.BOX
+                    )
+                ),
+                vol.Required(
+                    CONF_CONTEXT_CACHING, default=False
+                ): selector.BooleanSelector(),
+                vol.Required(
+                    CONF_EMBEDDING_BACKEND, default=DEFAULT_EMBEDDING_BACKEND
+                ): selector.SelectSelector(
+                    selector.SelectSelectorConfig(
+                        options=[EMBEDDING_BACKEND_GEMINI, EMBEDDING_BACKEND_LOCAL],
+                        translation_key=CONF_EMBEDDING_BACKEND,
+                    )
+                ),
+            }
+        )
+    ),
 }
 
 
@@ -14,3 +14,25 @@ DEFAULT_NOTES = [
 DEFAULT_NOTE_NAME = "Journal"
 
 CONF_CONFIG_ENTRY_ID = "config_entry_id"
+
+# Vision model quota. Requests are not rate limited unless a request quota is
+# set, e.g. 10 requests per minute for the Gemini API free tier.
+CONF_REQUESTS_PER_MINUTE = "requests_per_minute"
+CONF_TOKENS_PER_MINUTE = "tokens_per_minute"
+DEFAULT_REQUESTS_PER_MINUTE = 0
+DEFAULT_TOKENS_PER_MINUTE = 250_000
+
+# Local preprocessing of page images before they are sent to the vision model
+CONF_PREPROCESS_IMAGES = "preprocess_images"
+CONF_IMAGE_LONG_EDGE = "image_long_edge"
+DEFAULT_IMAGE_LONG_EDGE = 1536
+
+CONF_BATCH_BACKFILL = "batch_backfill"
+CONF_PAGES_PER_REQUEST = "pages_per_request"
+DEFAULT_PAGES_PER_REQUEST = 1
+CONF_CONTEXT_CACHING = "context_caching"
+
+CONF_EMBEDDING_BACKEND = "embedding_backend"
+EMBEDDING_BACKEND_GEMINI = "gemini"
+EMBEDDING_BACKEND_LOCAL = "local"
+DEFAULT_EMBEDDING_BACKEND = EMBEDDING_BACKEND_GEMINI
@@ -0,0 +1,112 @@
+"""Persistent cache of journal pages extracted by the vision model.
+
+The cache is content addressed by the page image and the prompt and model used
+to extract it, so it is shared by all config entries. A page that is renamed,
+moved to another folder, or processed again after the hash store is lost is not
+sent to the vision model again.
+
+Cached pages are spread over several storage files by key, so that saving a new
+extraction only rewrites one small file, and only the files for the keys that
+are looked up are loaded.
+"""
+
+import asyncio
+import logging
+import zlib
+from functools import partial
+from typing import Any
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+from homeassistant.util.hass_dict import HassKey
+
+from .const import DOMAIN
+from .processing.model import JournalPage
+from .processing.vision_model import ExtractionCache
+
+_LOGGER = logging.getLogger(__name__)
+
+STORAGE_VERSION = 1
+STORAGE_KEY = f"{DOMAIN}/extraction_cache"
+# Number of storage files the cached pages are spread over
+CACHE_SHARDS = 16
+# The oldest extractions in a storage file are evicted when the cache grows
+# beyond this size
+MAX_CACHE_ENTRIES = 4000
+SAVE_DELAY = 10
+
+DATA_EXTRACTION_CACHE: HassKey["StoreExtractionCache"] = HassKey(
+    f"{DOMAIN}_extraction_cache"
+)
+
+
+@callback
+def async_get_extraction_cache(hass: HomeAssistant) -> "StoreExtractionCache":
+    """Return the extraction cache shared by all config entries."""
+    if (cache := hass.data.get(DATA_EXTRACTION_CACHE)) is None:
+        cache = StoreExtractionCache(hass)
+        hass.data[DATA_EXTRACTION_CACHE] = cache
+    return cache
+
+
+class StoreExtractionCache(ExtractionCache):
+    """An extraction cache persisted in Home Assistant storage."""
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        max_entries: int = MAX_CACHE_ENTRIES,
+        shards: int = CACHE_SHARDS,
+    ) -> None:
+        """Initialize the extraction cache."""
+        self._hass = hass
+        self._stores: list[Store[dict[str, Any]]] = [
+            Store(hass, STORAGE_VERSION, f"{STORAGE_KEY}.{shard:x}", private=True)
+            for shard in range(shards)
+        ]
+        self._shards: list[dict[str, dict[str, Any]] | None] = [None] * shards
+        self._max_shard_entries = max(1, max_entries // shards)
+        self._lock = asyncio.Lock()
+        self._removed_legacy = False
+
+    async def async_get(self, key: str) -> JournalPage | None:
+        """Return the journal page previously extracted for the key, if any."""
+        pages = await self._async_load(self._shard(key))
+        if (data := pages.get(key)) is None:
+            return None
+        return JournalPage.from_dict(data)
+
+    async def async_put(self, key: str, journal_page: JournalPage) -> None:
+        """Store the journal page extracted for the key."""
+        shard = self._shard(key)
+        pages = await self._async_load(shard)
+        pages.pop(key, None)
+        pages[key] = journal_page.to_dict(omit_none=True)
+        while len(pages) > self._max_shard_entries:
+            del pages[next(iter(pages))]
+        self._stores[shard].async_delay_save(
+            partial(self._data_to_save, shard), SAVE_DELAY
+        )
+
+    def _shard(self, key: str) -> int:
+        """Return the storage file holding the key."""
+        return zlib.crc32(key.encode()) % len(self._stores)
+
+    async def _async_load(self, shard: int) -> dict[str, dict[str, Any]]:
+        """Load a storage file from disk if not already loaded."""
+        async with self._lock:
+            if not self._removed_legacy:
+                # Extractions used to be kept in a single file, rewritten on
+                # every save. It is only a cache, so it is not migrated.
+                self._removed_legacy = True
+                await Store(self._hass, STORAGE_VERSION, STORAGE_KEY).async_remove()
+            if (pages := self._shards[shard]) is None:
+                data = await self._stores[shard].async_load() or {}
+                pages = self._shards[shard] = data.get("pages", {})
+                _LOGGER.debug("Loaded %d cached extractions", len(pages))
+        return pages
+
+    @callback
+    def _data_to_save(self, shard: int) -> dict[str, Any]:
+        """Return the data of a storage file to write to disk."""
+        return {"pages": self._shards[shard] or {}}
@@ -0,0 +1,330 @@
+"""Persistent state of the media source processor.
+
+The hash store keeps the content hash and metadata of each processed media item,
+the scan statistics, the crawl frontier of an unfinished scan, the retry ledger
+of failed items and the items waiting for batch jobs. Items are stored in a
+compact format keyed by their identifier relative to the media source prefix.
+"""
+
+import base64
+import datetime
+from dataclasses import dataclass
+from typing import Any
+
+from mashumaro.config import BaseConfig
+from mashumaro.mixins.json import DataClassJSONMixin
+
+from homeassistant.components.media_source import URI_SCHEME
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+
+from .const import DOMAIN
+
+STORAGE_VERSION = 2
+HASH_STORAGE_PATH = f"{DOMAIN}/{{config_entry_id}}/hashes"
+# Hash updates are coalesced into a single write of the hash store
+SAVE_DELAY = 10
+# Delay before retrying a failed item, doubled after each failed attempt
+RETRY_BACKOFF = datetime.timedelta(minutes=30)
+MAX_RETRY_BACKOFF = datetime.timedelta(days=1)
+# Items are dead-lettered after failing this many scans in a row
+MAX_ATTEMPTS = 5
+
+
+@dataclass
+class ScanStats(DataClassJSONMixin):
+    """Statistics for a media source scan."""
+
+    scanned_folders: int = 0
+    scanned_files: int = 0
+    processed_files: int = 0
+    skipped_items: int = 0
+    errors: int = 0
+    last_scan_start: datetime.datetime | None = None
+    last_scan_end: datetime.datetime | None = None
+
+
+@dataclass
+class MediaMetadata(DataClassJSONMixin):
+    """Metadata used to detect media content changes without downloading it."""
+
+    etag: str | None = None
+    """The `ETag` header returned when the content was last fetched."""
+
+    last_modified: str | None = None
+    """The `Last-Modified` header returned when the content was last fetched."""
+
+    size: int | None = None
+    """Size of the local media file."""
+
+    mtime_ns: int | None = None
+    """Modification time of the local media file."""
+
+    class Config(BaseConfig):
+        omit_none = False
+        code_generation_options = ["TO_DICT_ADD_OMIT_NONE_FLAG"]
+
+
+@dataclass
+class FailedItem(DataClassJSONMixin):
+    """A media item that failed to process and when it may be retried."""
+
+    title: str
+    """Title of the media item, used to queue it again."""
+
+    attempts: int = 0
+    """Number of scans in a row where the item failed."""
+
+    last_error: str | None = None
+    """The error from the most recent failed attempt."""
+
+    next_attempt: datetime.datetime | None = None
+    """When the item may be retried, or None if it was dead-lettered."""
+
+    @property
+    def dead_lettered(self) -> bool:
+        """Return True if the item is no longer retried until it is replayed."""
+        return self.next_attempt is None
+
+    def eligible(self, now: datetime.datetime) -> bool:
+        """Return True if the item may be retried."""
+        return self.next_attempt is not None and self.next_attempt <= now
+
+
+@dataclass
+class BatchPage(DataClassJSONMixin):
+    """A media item submitted in a batch job that is waiting for its result."""
+
+    identifier: str
+    title: str
+    content_hash: str
+    metadata: MediaMetadata | None = None
+    cache_key: str | None = None
+
+
+def _encode_digest(content_hash: str) -> str:
+    """Encode a hex content hash as unpadded base64 for storage."""
+    algorithm, sep, digest = content_hash.rpartition(":")
+    encoded = base64.urlsafe_b64encode(bytes.fromhex(digest)).rstrip(b"=").decode()
+    return f"{algorithm}{sep}{encoded}"
+
+
+def _decode_digest(value: str) -> str:
+    """Decode a stored base64 content hash into a hex content hash."""
+    algorithm, sep, encoded = value.rpartition(":")
+    digest = base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4)).hex()
+    return f"{algorithm}{sep}{digest}"
+
+
+def _relative_identifier(prefix: str, identifier: str) -> str:
+    """Return an identifier relative to the media source prefix for storage."""
+    return identifier.removeprefix(prefix)
+
+
+def _absolute_identifier(prefix: str, key: str) -> str:
+    """Return the identifier for a stored key relative to the media source prefix."""
+    return key if key.startswith(URI_SCHEME) else f"{prefix}{key}"
+
+
+def _encode_items(
+    prefix: str, hashes: dict[str, str], metadata: dict[str, MediaMetadata]
+) -> dict[str, list[Any]]:
+    """Encode the content hashes and metadata in the compact storage format.
+
+    Each item is keyed by its identifier relative to the media source prefix and
+    stored as a row of `[digest, etag, last_modified, size, mtime_ns]` with
+    trailing empty values omitted.
+    """
+    items = {}
+    for identifier, content_hash in hashes.items():
+        key = _relative_identifier(prefix, identifier)
+        row: list[Any] = [_encode_digest(content_hash)]
+        if (item_metadata := metadata.get(identifier)) is not None:
+            row.extend(
+                [
+                    item_metadata.etag,
+                    item_metadata.last_modified,
+                    item_metadata.size,
+                    item_metadata.mtime_ns,
+                ]
+            )
+            while row[-1] is None:
+                row.pop()
+        items[key] = row
+    return items
+
+
+def _decode_items(
+    prefix: str, items: dict[str, list[Any]]
+) -> tuple[dict[str, str], dict[str, MediaMetadata]]:
+    """Decode the compact storage format into content hashes and metadata."""
+    hashes = {}
+    metadata = {}
+    for key, row in items.items():
+        identifier = _absolute_identifier(prefix, key)
+        hashes[identifier] = _decode_digest(row[0])
+        if len(row) > 1:
+            metadata[identifier] = MediaMetadata(*row[1:])
+    return hashes, metadata
+
+
+class _HashStorage(Store[dict[str, Any]]):
+    """Storage for content hashes that migrates older storage formats."""
+
+    def __init__(self, hass: HomeAssistant, key: str, prefix: str) -> None:
+        """Initialize the hash storage."""
+        super().__init__(hass, version=STORAGE_VERSION, key=key, private=True)
+        self._prefix = prefix
+
+    async def _async_migrate_func(
+        self, old_major_version: int, old_minor_version: int, old_data: dict[str, Any]
+    ) -> dict[str, Any]:
+        """Migrate the hashes and metadata to the compact format."""
+        if old_major_version == 1:
+            hashes = old_data.pop("hashes", {})
+            metadata = {
+                identifier: MediaMetadata.from_dict(value)
+                for identifier, value in old_data.pop("metadata", {}).items()
+            }
+            old_data["prefix"] = self._prefix
+            old_data["items"] = _encode_items(self._prefix, hashes, metadata)
+        return old_data
+
+
+class HashStore:
+    """Content hashes and scan statistics for a media source.
+
+    Updates are kept in memory and written with a delayed save so that many
+    updates during a scan are coalesced into a single write. Call `async_flush`
+    to write any pending updates immediately.
+    """
+
+    def __init__(self, hass: HomeAssistant, config_entry_id: str, prefix: str) -> None:
+        """Initialize the hash store."""
+        self._prefix = prefix
+        self._store = _HashStorage(
+            hass, HASH_STORAGE_PATH.format(config_entry_id=config_entry_id), prefix
+        )
+        self._loaded = False
+        self._dirty = False
+        self.hashes: dict[str, str] = {}
+        self.metadata: dict[str, MediaMetadata] = {}
+        self.scan_stats = ScanStats()
+        # The crawl frontier of an unfinished scan
+        self.pending_folders: set[str] = set()
+        self.pending_items: dict[str, str] = {}
+        self.failures: dict[str, FailedItem] = {}
+        # Items submitted in each unfinished batch job
+        self.batch_jobs: dict[str, list[BatchPage]] = {}
+
+    async def async_load(self) -> None:
+        """Load the hash store from disk if not already loaded."""
+        if self._loaded:
+            return
+        self._loaded = True
+        if (data := await self._store.async_load()) is None:
+            return
+        self.scan_stats = ScanStats.from_dict(data.get("scan_stats", {}))
+        prefix = data.get("prefix", self._prefix)
+        self.hashes, self.metadata = _decode_items(prefix, data.get("items", {}))
+        frontier = data.get("frontier", {})
+        self.pending_folders = {
+            _absolute_identifier(prefix, key) for key in frontier.get("folders", [])
+        }
+        self.pending_items = {
+            _absolute_identifier(prefix, key): title
+            for key, title in frontier.get("items", {}).items()
+        }
+        self.failures = {
+            _absolute_identifier(prefix, key): FailedItem.from_dict(value)
+            for key, value in data.get("failures", {}).items()
+        }
+        self.batch_jobs = {
+            name: [
+                BatchPage.from_dict(
+                    {
+                        **page,
+                        "identifier": _absolute_identifier(prefix, page["identifier"]),
+                    }
+                )
+                for page in pages
+            ]
+            for name, pages in data.get("batch_jobs", {}).items()
+        }
+
+    @property
+    def has_frontier(self) -> bool:
+        """Return True if there is an unfinished scan to resume."""
+        return bool(self.pending_folders or self.pending_items)
+
+    def record_failure(
+        self, identifier: str, title: str, err: Exception, now: datetime.datetime
+    ) -> FailedItem:
+        """Record a failed attempt at processing an item in the retry ledger."""
+        failure = self.failures.setdefault(identifier, FailedItem(title=title))
+        failure.attempts += 1
+        failure.last_error = str(err) or type(err).__name__
+        if failure.attempts >= MAX_ATTEMPTS:
+            failure.next_attempt = None
+        else:
+            failure.next_attempt = now + min(
+                RETRY_BACKOFF * 2 ** (failure.attempts - 1), MAX_RETRY_BACKOFF
+            )
+        return failure
+
+    @callback
+    def async_schedule_save(self) -> None:
+        """Schedule a delayed write of the hash store.
+
+        The write is not postponed by further updates, so that progress is
+        persisted regularly during a long scan.
+        """
+        if self._dirty:
+            return
+        self._dirty = True
+        self._store.async_delay_save(self._data_to_save, SAVE_DELAY)
+
+    async def async_flush(self) -> None:
+        """Write any pending updates to disk."""
+        if self._dirty:
+            await self._store.async_save(self._data_to_save())
+
+    @callback
+    def _data_to_save(self) -> dict[str, Any]:
+        """Return the data to write to disk."""
+        self._dirty = False
+        data = {
+            "scan_stats": self.scan_stats.to_dict(),
+            "prefix": self._prefix,
+            "items": _encode_items(self._prefix, self.hashes, self.metadata),
+        }
+        if self.has_frontier:
+            data["frontier"] = {
+                "folders": [
+                    _relative_identifier(self._prefix, identifier)
+                    for identifier in self.pending_folders
+                ],
+                "items": {
+                    _relative_identifier(self._prefix, identifier): title
+                    for identifier, title in self.pending_items.items()
+                },
+            }
+        if self.failures:
+            data["failures"] = {
+                _relative_identifier(self._prefix, identifier): failure.to_dict()
+                for identifier, failure in self.failures.items()
+            }
+        if self.batch_jobs:
+            data["batch_jobs"] = {
+                name: [
+                    {
+                        **page.to_dict(),
+                        "identifier": _relative_identifier(
+                            self._prefix, page.identifier
+                        ),
+                    }
+                    for page in pages
+                ]
+                for name, pages in self.batch_jobs.items()
+            }
+        return data
@@ -0,0 +1,99 @@
+"""Library for watching a local media directory for changed files.
+
+The watcher uses the platform filesystem notification APIs (e.g. inotify) to
+report files that are created, modified or moved into a local media directory
+so they can be processed without scanning the entire media source.
+"""
+
+import logging
+import mimetypes
+from collections.abc import Callable
+from pathlib import Path
+
+from watchdog.events import (
+    FileSystemEvent,
+    FileSystemEventHandler,
+)
+from watchdog.observers import Observer
+
+from homeassistant.components.media_source.const import MEDIA_MIME_TYPES
+from homeassistant.core import HomeAssistant
+
+_LOGGER = logging.getLogger(__name__)
+
+__all__ = [
+    "LocalMediaWatcher",
+]
+
+
+def is_media_file(path: Path) -> bool:
+    """Return True if the path is a visible media file served by the local media source."""
+    if any(part.startswith(".") for part in path.parts):
+        return False
+    mime_type, _ = mimetypes.guess_type(str(path))
+    return mime_type is not None and mime_type.split("/")[0] in MEDIA_MIME_TYPES
+
+
+class _EventHandler(FileSystemEventHandler):
+    """Forward changed media files to the event loop."""
+
+    def __init__(
+        self, hass: HomeAssistant, root: Path, on_change: Callable[[Path], None]
+    ) -> None:
+        """Initialize the event handler."""
+        self._hass = hass
+        self._root = root
+        self._on_change = on_change
+
+    def _changed(self, src_path: str | bytes) -> None:
+        """Report a changed file relative to the watched directory."""
+        path = Path(str(src_path))
+        try:
+            relative_path = path.relative_to(self._root)
+        except ValueError:
+            return
+        if not is_media_file(relative_path):
+            return
+        self._hass.loop.call_soon_threadsafe(self._on_change, relative_path)
+
+    def on_any_event(self, event: FileSystemEvent) -> None:
+        """Handle a filesystem event from the observer thread."""
+        if event.is_directory:
+            return
+        if event.event_type in ("created", "modified", "closed"):
+            self._changed(event.src_path)
+        elif event.event_type == "moved":
+            self._changed(event.dest_path)
+
+
+class LocalMediaWatcher:
+    """Watch a local media directory for created or modified media files.
+
+    The callback is invoked in the event loop with the path of each changed file
+    relative to the watched directory. A single file may be reported multiple
+    times while it is being written.
+    """
+
+    def __init__(
+        self, hass: HomeAssistant, root: Path, on_change: Callable[[Path], None]
+    ) -> None:
+        """Initialize the local media watcher."""
+        self._root = root
+        self._handler = _EventHandler(hass, root, on_change)
+        self._observer: Observer | None = None
+
+    def start(self) -> None:
+        """Start watching the directory, which performs blocking I/O."""
+        _LOGGER.debug("Watching local media directory %s", self._root)
+        observer = Observer()
+        observer.schedule(self._handler, str(self._root), recursive=True)
+        observer.start()
+        self._observer = observer
+
+    def stop(self) -> None:
+        """Stop watching the directory, which performs blocking I/O."""
+        if self._observer is None:
+            return
+        self._observer.stop()
+        self._observer.join()
+        self._observer = None
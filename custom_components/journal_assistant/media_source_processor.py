@@ -5,67 +5,221 @@ the media source for files and directories. This library keeps track of the hash
 of the contents of each file and will publish an event when the content has changed
 since the last scan.
 
-This actually fetches the media content to determine if it has changed, so the
-source must be resilient to frequent requests. This works well for local sources
-where it would be reading a local file anyway.
+Before fetching the media content, cheap metadata is used to detect whether the
+content may have changed: the file size and modification time for media stored
+in a local media directory, or a conditional request using the `ETag` and
+`Last-Modified` headers for other sources. The content is only downloaded and
+hashed when the metadata indicates it may have changed.
+
+A scan is a pipeline of stages connected by bounded queues: crawling folders,
+fetching and hashing items, extracting changed items with the vision model, and
+writing the results. Each stage has its own concurrency and retry settings, so
+slow vision model calls do not stall the crawl and slow writes do not stall the
+vision model. The settings are fixed defaults tuned for the vision model quota,
+not config entry options.
+
+Items that fail are recorded in a persistent retry ledger and are skipped by
+later scans until their exponential backoff has elapsed. Items that keep failing
+are parked in a dead-letter list where they are no longer retried until they are
+replayed.
+
+Large backfills may optionally be submitted to the vision model as batch jobs,
+which are cheaper and do not use the interactive quota but may take hours to
+complete. Submitted jobs are persisted with the hash store and polled until
+their results can be written.
 """
 
+import asyncio
 import hashlib
 import logging
 import datetime
+import os
 from abc import ABC, abstractmethod
+from http import HTTPStatus
+from pathlib import Path
+from typing import Any
 
 import aiohttp
-from dataclasses import dataclass
-from mashumaro.mixins.json import DataClassJSONMixin
+from aiohttp import hdrs
+from collections.abc import Awaitable, Callable, Coroutine
+from dataclasses import dataclass, field
+from functools import partial
+
+from google.genai import errors
 
+from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
 from homeassistant.exceptions import HomeAssistantError, ServiceValidationError
 from homeassistant.components.media_source import (
     async_browse_media,
     URI_SCHEME,
     async_resolve_media,
-    Unresolvable,
+    MediaSourceItem,
+)
+from homeassistant.components.media_source.const import (
+    DOMAIN as MEDIA_SOURCE_DOMAIN,
 )
 from homeassistant.components.media_player.errors import BrowseError
 from homeassistant.components.media_player.browse_media import (
     async_process_play_media_url,
 )
-from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.helpers.event import async_call_later, async_track_time_interval
 from homeassistant.helpers import aiohttp_client
-from homeassistant.helpers.storage import Store
+from homeassistant.helpers.start import async_at_started
+from homeassistant.util import dt as dt_util, raise_if_invalid_path
 
 from .const import DOMAIN, CONF_MEDIA_SOURCE, CONF_CONFIG_ENTRY_ID
+from .hash_store import BatchPage, FailedItem, HashStore, MediaMetadata, ScanStats
+from .local_media_watcher import LocalMediaWatcher
+from .processing.batch import BatchJobError
+from .processing.model import JournalPage
+from .processing.pipeline import Stage, StageConfig
+from .processing.prompts import note_prefix
+from .processing.vision_model import TIMESTAMP_RE, BatchSubmission
+from .services import async_extract_journal_page
+from .storage import save_journal_entry
 
 _LOGGER = logging.getLogger(__name__)
 
-STORAGE_VERSION = 1
-HASH_STORAGE_PATH = f"{DOMAIN}/{{config_entry_id}}/hashes"
 LISTENER_DATA_KEY = "listener"
 UPDATE_INTERVAL = datetime.timedelta(hours=6)
+# Full scans are only a safety net when watching a local media directory
+WATCH_UPDATE_INTERVAL = datetime.timedelta(days=1)
+# Seconds to wait for writes to a changed file to settle before processing it
+WATCH_DELAY = 5
+# Changed files are processed at most this long after the first pending change,
+# even when other files keep changing
+WATCH_MAX_DELAY = 30
+CRAWL_STAGE = "crawl"
+FETCH_STAGE = "fetch"
+VISION_STAGE = "vision"
+WRITE_STAGE = "write"
+DEFAULT_STAGE_CONFIGS = {
+    # Folders discovered while crawling are queued by the crawl workers
+    # themselves, so the crawl queue is unbounded to avoid deadlock.
+    CRAWL_STAGE: StageConfig(concurrency=4, queue_size=0),
+    # Items waiting to be fetched are only identifiers, so the whole item
+    # frontier is queued and ordered by recency instead of blocking the crawl.
+    # Changed files from the watcher join the same queue without waiting.
+    FETCH_STAGE: StageConfig(concurrency=8, queue_size=0, retries=1),
+    # Items waiting for the vision model hold their downloaded content, so the
+    # queue is only large enough for the newest pages to jump ahead. Requests
+    # are paced by the vision model rate limit, so several run at once.
+    VISION_STAGE: StageConfig(concurrency=4, queue_size=8, retries=2),
+    WRITE_STAGE: StageConfig(concurrency=1, queue_size=8, retries=2),
+}
+# New content is hashed with blake2b, which is faster than sha256 on 64-bit
+# CPUs. Hashes stored before this were sha256 and keep their algorithm.
+DEFAULT_HASH_ALGORITHM = "blake2b"
+LEGACY_HASH_ALGORITHM = "sha256"
+HASH_CHUNK_SIZE = 64 * 1024
+# Limits for the pages submitted in a single batch job, which are sent inline
+# with the request and must stay below the API request size limit
+BATCH_SIZE = 50
+BATCH_MAX_BYTES = 15 * 1024 * 1024
+BATCH_POLL_INTERVAL = datetime.timedelta(minutes=5)
+
+
+@dataclass
+class MediaContent:
+    """Media content that was already downloaded while scanning."""
+
+    title: str
+    """Title of the media item, used as the journal page filename."""
+
+    content: bytes
+    """The downloaded media content."""
 
 
 class ProcessItem(ABC):
     """Base class for processing media items."""
 
     @abstractmethod
-    async def process(self, hass: HomeAssistant, identifier: str) -> bool:
-        """Process the media item.
+    async def extract(
+        self,
+        hass: HomeAssistant,
+        identifier: str,
+        media_content: MediaContent | None = None,
+    ) -> JournalPage | None:
+        """Extract a journal page from the media item.
+
+        The media content is provided when it was already downloaded by the
+        scanner, otherwise the item must be fetched using its identifier.
+
+        Return None if there is nothing left to write for the item. Raise a
+        HomeAssistantError if there is a retryable error.
+        """
+
+    @abstractmethod
+    async def write(
+        self, hass: HomeAssistant, title: str, journal_page: JournalPage
+    ) -> None:
+        """Persist an extracted journal page."""
+
+
+class BatchProcessItem(ProcessItem):
+    """Base class for processing several media items per request or batch job.
+
+    The media source processor only packs pages into a single request or
+    submits batch jobs when its item processor implements this interface.
+    """
+
+    @abstractmethod
+    async def extract_pages(
+        self, hass: HomeAssistant, media_contents: list[MediaContent]
+    ) -> dict[str, JournalPage | ValueError]:
+        """Extract journal pages from several media items at once.
 
-        Return True if the item was processed, or False if there is a retryable error.
+        Returns the journal page, or the error extracting it, for each item
+        keyed by its title. Raise a HomeAssistantError if there is a retryable
+        error for all of the items.
         """
 
+    @abstractmethod
+    async def submit_batch(
+        self, hass: HomeAssistant, media_contents: list[MediaContent]
+    ) -> BatchSubmission:
+        """Submit media content to be extracted as a batch job.
 
-class ProcessMediaServiceCall(ProcessItem):
-    """Base class for processing media items."""
+        Returns the batch job and the cache key of each submitted item, and the
+        journal pages of items that were already extracted, keyed by title.
+        Raise a HomeAssistantError if the job could not be submitted.
+        """
+
+    @abstractmethod
+    async def batch_results(
+        self, hass: HomeAssistant, name: str, cache_keys: list[str | None]
+    ) -> list[JournalPage | ValueError | BatchJobError] | None:
+        """Return the journal pages extracted by a batch job.
+
+        Returns None if the job is still running, otherwise for each submitted
+        item in order a journal page, a ValueError if the response could not
+        be parsed, or a BatchJobError if the request failed. Raise a
+        BatchJobError if the job failed, or a HomeAssistantError if the job
+        could not be checked.
+        """
+
+
+class ProcessMediaServiceCall(BatchProcessItem):
+    """Process media items in process, or with the process_media service."""
 
     def __init__(self, config_entry_id: str) -> None:
         """Initialize the process media service call."""
         self._config_entry_id = config_entry_id
 
-    async def process(self, hass: HomeAssistant, identifier: str) -> bool:
-        """Process the media item."""
+    async def extract(
+        self,
+        hass: HomeAssistant,
+        identifier: str,
+        media_content: MediaContent | None = None,
+    ) -> JournalPage | None:
+        """Extract a journal page from the media item."""
         try:
+            if media_content is not None:
+                return await self._async_extract_content(
+                    hass, identifier, media_content
+                )
+            # The service call downloads, extracts and writes the page
             await hass.services.async_call(
                 DOMAIN,
                 "process_media",
@@ -77,24 +231,160 @@ class ProcessMediaServiceCall(ProcessItem):
             )
         except ServiceValidationError as err:
             _LOGGER.warning("Skipping process_media due to bad request: %s", err)
-            return True
-        except HomeAssistantError as err:
-            _LOGGER.error("Retryable error processing media content: %s", err)
-            return False
-        return True
+        except errors.APIError as err:
+            raise HomeAssistantError(f"Error extracting journal page: {err}") from err
+        return None
+
+    async def write(
+        self, hass: HomeAssistant, title: str, journal_page: JournalPage
+    ) -> None:
+        """Persist an extracted journal page."""
+        await save_journal_entry(hass, self._config_entry_id, title, journal_page)
+
+    async def extract_pages(
+        self, hass: HomeAssistant, media_contents: list[MediaContent]
+    ) -> dict[str, JournalPage | ValueError]:
+        """Extract journal pages from several media items at once."""
+        vision_model = self._config_entry(hass).runtime_data.vision_model
+        try:
+            results = await vision_model.process_journal_pages(
+                [
+                    (Path(media_content.title), media_content.content)
+                    for media_content in media_contents
+                ]
+            )
+        except (ValueError, errors.APIError) as err:
+            raise HomeAssistantError(f"Error extracting journal pages: {err}") from err
+        return {
+            media_content.title: result
+            for media_content in media_contents
+            if (result := results.get(Path(media_content.title).name)) is not None
+        }
+
+    async def submit_batch(
+        self, hass: HomeAssistant, media_contents: list[MediaContent]
+    ) -> BatchSubmission:
+        """Submit media content to be extracted as a batch job."""
+        vision_model = self._config_entry(hass).runtime_data.vision_model
+        try:
+            submission = await vision_model.async_submit_batch(
+                [
+                    (Path(media_content.title), media_content.content)
+                    for media_content in media_contents
+                ]
+            )
+        except (BatchJobError, ValueError, errors.APIError) as err:
+            raise HomeAssistantError(f"Error submitting batch job: {err}") from err
+        titles = {
+            Path(media_content.title).name: media_content.title
+            for media_content in media_contents
+        }
+        return BatchSubmission(
+            name=submission.name,
+            cache_keys={
+                titles[filename]: cache_key
+                for filename, cache_key in submission.cache_keys.items()
+            },
+            cached={
+                titles[filename]: journal_page
+                for filename, journal_page in submission.cached.items()
+            },
+        )
+
+    async def batch_results(
+        self, hass: HomeAssistant, name: str, cache_keys: list[str | None]
+    ) -> list[JournalPage | ValueError | BatchJobError] | None:
+        """Return the journal pages extracted by a batch job."""
+        vision_model = self._config_entry(hass).runtime_data.vision_model
+        try:
+            return await vision_model.async_batch_results(name, cache_keys)
+        except errors.APIError as err:
+            raise HomeAssistantError(f"Error checking batch job: {err}") from err
+
+    def _config_entry(self, hass: HomeAssistant) -> ConfigEntry:
+        """Return the config entry for processing media items."""
+        if (
+            config_entry := hass.config_entries.async_get_entry(self._config_entry_id)
+        ) is None:
+            raise HomeAssistantError(f"Config entry {self._config_entry_id} not found")
+        return config_entry
+
+    async def _async_extract_content(
+        self, hass: HomeAssistant, identifier: str, media_content: MediaContent
+    ) -> JournalPage:
+        """Extract media content that was already downloaded without fetching it again."""
+        return await async_extract_journal_page(
+            self._config_entry(hass),
+            identifier,
+            media_content.title,
+            media_content.content,
+        )
 
 
 @dataclass
-class ScanStats(DataClassJSONMixin):
-    """Statistics for a media source scan."""
+class FileStat:
+    """File size and modification time of a local media file."""
+
+    size: int
+    mtime_ns: int
+
+
+def local_media_path(hass: HomeAssistant, identifier: str) -> Path | None:
+    """Return the file path for a media source identifier in a local media directory."""
+    try:
+        item = MediaSourceItem.from_uri(hass, identifier, None)
+    except ValueError:
+        return None
+    if item.domain != MEDIA_SOURCE_DOMAIN:
+        return None
+    source_dir_id, _, location = item.identifier.partition("/")
+    if (media_dir := hass.config.media_dirs.get(source_dir_id)) is None:
+        return None
+    try:
+        raise_if_invalid_path(location)
+    except ValueError:
+        return None
+    if Path(location).is_absolute():
+        return None
+    return Path(media_dir, location)
+
 
-    scanned_folders: int = 0
-    scanned_files: int = 0
-    processed_files: int = 0
-    skipped_items: int = 0
-    errors: int = 0
-    last_scan_start: datetime.datetime | None = None
-    last_scan_end: datetime.datetime | None = None
+def _stat_file(path: Path) -> FileStat | None:
+    """Return the size and modification time of a file, if it exists."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return FileStat(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+
+
+def _hash_algorithm(content_hash: str) -> str:
+    """Return the algorithm used to compute a stored content hash.
+
+    Hashes are stored as `<algorithm>:<hexdigest>`, except for sha256 which is
+    stored as a bare digest for compatibility with existing hash stores.
+    """
+    algorithm, sep, _ = content_hash.partition(":")
+    return algorithm if sep else LEGACY_HASH_ALGORITHM
+
+
+async def async_hash_content(
+    content: aiohttp.StreamReader,
+    algorithm: str = DEFAULT_HASH_ALGORITHM,
+    buffer: bytearray | None = None,
+) -> str:
+    """Incrementally hash a response body.
+
+    The body is only kept in memory when a `buffer` is provided.
+    """
+    hasher = hashlib.new(algorithm)
+    async for chunk in content.iter_chunked(HASH_CHUNK_SIZE):
+        hasher.update(chunk)
+        if buffer is not None:
+            buffer.extend(chunk)
+    if algorithm == LEGACY_HASH_ALGORITHM:
+        return hasher.hexdigest()
+    return f"{algorithm}:{hasher.hexdigest()}"
 
 
 class MediaSourceProcessor:
@@ -106,22 +396,49 @@ class MediaSourceProcessor:
         config_entry_id: str,
         media_source_prefix: str,
         process_item: ProcessItem,
+        stage_configs: dict[str, StageConfig] | None = None,
+        hash_algorithm: str = DEFAULT_HASH_ALGORITHM,
+        batch_backfill: bool = False,
+        pages_per_request: int = 1,
     ) -> None:
-        """Initialize the media source listener."""
+        """Initialize the media source listener.
+
+        When `batch_backfill` is set, changed items found by a full scan are
+        submitted as batch jobs instead of being extracted one at a time.
+        Otherwise up to `pages_per_request` changed items of the same notebook
+        found by a full scan are extracted together. Items changed in a watched
+        local media directory are always extracted immediately. The
+        `stage_configs` replace the default settings of individual stages.
+        """
         self._hass = hass
         self._media_source_prefix = media_source_prefix
         self._config_entry_id = config_entry_id
-        self._store: Store = Store(
-            hass,
-            version=STORAGE_VERSION,
-            key=HASH_STORAGE_PATH.format(config_entry_id=config_entry_id),
-            private=True,
-        )
+        self._hash_store = HashStore(hass, config_entry_id, media_source_prefix)
         self._process_item = process_item
+        self._batch_process_item = (
+            process_item if isinstance(process_item, BatchProcessItem) else None
+        )
         self._unsub_refresh: CALLBACK_TYPE | None = None
         _LOGGER.info("Creating media source listener for %s", self._media_source_prefix)
         self._scanning = False
-        self._scan_stats = ScanStats()
+        self._stage_configs = {**DEFAULT_STAGE_CONFIGS, **(stage_configs or {})}
+        self._stages: list[Stage[Any]] = []
+        self._hash_algorithm = hash_algorithm
+        self._watcher: LocalMediaWatcher | None = None
+        self._pending_items: dict[str, str] = {}
+        self._unsub_pending: CALLBACK_TYPE | None = None
+        self._pending_since: datetime.datetime | None = None
+        self._unsub_resume: CALLBACK_TYPE | None = None
+        self._scan: _Scan | None = None
+        # Items are only packed or batched when the item processor supports it
+        self._batch_backfill = batch_backfill and self._batch_process_item is not None
+        self._pages_per_request = (
+            pages_per_request if self._batch_process_item is not None else 1
+        )
+        self._unsub_batch_poll: CALLBACK_TYPE | None = None
+        self._polling = False
+        self._tasks: set[asyncio.Task[Any]] = set()
+        self._reload_pending = False
 
     @property
     def scanning(self) -> bool:
@@ -131,22 +448,93 @@ class MediaSourceProcessor:
     @property
     def scan_stats(self) -> ScanStats:
         """Return the scan statistics."""
-        return self._scan_stats
+        return self._hash_store.scan_stats
+
+    @property
+    def queue_depths(self) -> dict[str, int]:
+        """Return the number of items waiting in each stage of the current scan."""
+        return {stage.name: stage.queue_depth for stage in self._stages}
+
+    @property
+    def failures(self) -> dict[str, FailedItem]:
+        """Return the items in the retry ledger, including dead-lettered items."""
+        return self._hash_store.failures
+
+    @property
+    def dead_letters(self) -> dict[str, FailedItem]:
+        """Return the items that are no longer retried until they are replayed."""
+        return {
+            identifier: failure
+            for identifier, failure in self._hash_store.failures.items()
+            if failure.dead_lettered
+        }
+
+    @property
+    def batch_jobs(self) -> dict[str, list[BatchPage]]:
+        """Return the unfinished batch jobs and the items submitted in each."""
+        return self._hash_store.batch_jobs
 
     async def async_attach(self) -> None:
-        """Attach an event listener."""
+        """Attach an event listener.
+
+        When the media source is a local media directory, changed files are
+        processed as soon as they are written and the periodic full scan is only
+        a safety net for missed events.
+        """
+        await self._hash_store.async_load()
+        update_interval = UPDATE_INTERVAL
+        if (media_dir := local_media_path(self._hass, self._media_source_prefix)) and (
+            await self._hass.async_add_executor_job(media_dir.is_dir)
+        ):
+            watcher = LocalMediaWatcher(self._hass, media_dir, self._async_file_changed)
+            try:
+                await self._hass.async_add_executor_job(watcher.start)
+            except OSError as err:
+                _LOGGER.warning(
+                    "Unable to watch media directory %s: %s", media_dir, err
+                )
+            else:
+                self._watcher = watcher
+                update_interval = WATCH_UPDATE_INTERVAL
         self._unsub_refresh = async_track_time_interval(
-            self._hass, self.async_process_media, UPDATE_INTERVAL
+            self._hass, self.async_process_media, update_interval
         )
-        if (data := await self._store.async_load()) is not None:
-            self._scan_stats = ScanStats.from_dict(data.get("scan_stats", {}))
+        if self._batch_backfill or (
+            self._batch_process_item is not None and self._hash_store.batch_jobs
+        ):
+            self._unsub_batch_poll = async_track_time_interval(
+                self._hass, self.async_poll_batch_jobs, BATCH_POLL_INTERVAL
+            )
+        if self._hash_store.has_frontier:
+            _LOGGER.debug("Scheduling resume of an interrupted scan")
+            self._unsub_resume = async_at_started(self._hass, self._async_resume_scan)
 
-    @callback
-    def async_detach(self) -> None:
-        """Detach the event listener."""
+    async def async_detach(self) -> None:
+        """Detach the event listener, stopping any scan and writing its progress.
+
+        The scan frontier is saved when this returns, so that a listener for
+        the reloaded config entry resumes it without repeating any work.
+        """
         if self._unsub_refresh:
             self._unsub_refresh()
         self._unsub_refresh = None
+        if self._unsub_pending:
+            self._unsub_pending()
+        self._unsub_pending = None
+        if self._unsub_resume:
+            self._unsub_resume()
+        self._unsub_resume = None
+        if self._unsub_batch_poll:
+            self._unsub_batch_poll()
+        self._unsub_batch_poll = None
+        if self._watcher:
+            await self._hass.async_add_executor_job(self._watcher.stop)
+        self._watcher = None
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self._hash_store.async_flush()
 
     async def async_process_media(self, _: datetime.datetime) -> None:
         """Walk the directory structure and check for changes."""
@@ -155,96 +543,706 @@ class MediaSourceProcessor:
             return
         self._scanning = True
         try:
-            await self._async_process_media()
+            scan_stats = await self._async_run_task(self._async_process_media())
+        finally:
+            self._scanning = False
+        self._async_reload_if_processed(scan_stats)
+
+    async def async_poll_batch_jobs(self, _: datetime.datetime) -> None:
+        """Write the results of any batch jobs that have finished."""
+        if self._polling or self._scanning:
+            # The scan reloads the integration when it finishes, so polling
+            # waits for it rather than reloading in the middle of the scan
+            return
+        self._polling = True
+        try:
+            processed = await self._async_run_task(self._async_poll_batch_jobs())
+        finally:
+            self._polling = False
+            await self._hash_store.async_flush()
+        self._async_reload_if_processed(ScanStats(processed_files=processed))
+
+    async def _async_poll_batch_jobs(self) -> int:
+        """Write the results of finished batch jobs and return the number written."""
+        if (batch_process_item := self._batch_process_item) is None:
+            return 0
+        processed = 0
+        for name, pages in list(self._hash_store.batch_jobs.items()):
+            processed += await self._async_poll_batch_job(
+                batch_process_item, name, pages
+            )
+        return processed
+
+    @callback
+    def async_replay_dead_letters(self) -> list[str]:
+        """Reset the retry ledger for dead-lettered items and process them again.
+
+        Returns the identifiers of the items that were replayed.
+        """
+        store = self._hash_store
+        replayed = self.dead_letters
+        for identifier, failure in replayed.items():
+            del store.failures[identifier]
+            self._pending_items[identifier] = failure.title
+        if replayed:
+            _LOGGER.info("Replaying %d dead-lettered media items", len(replayed))
+            store.async_schedule_save()
+            self._async_schedule_pending(0)
+        return list(replayed)
+
+    async def _async_resume_scan(self, _: HomeAssistant) -> None:
+        """Resume a scan that was interrupted, e.g. by a restart."""
+        self._unsub_resume = None
+        await self.async_process_media(dt_util.utcnow())
+
+    @callback
+    def _async_file_changed(self, relative_path: Path) -> None:
+        """Queue a changed local media file, waiting for writes to settle."""
+        identifier = (
+            f"{self._media_source_prefix.rstrip('/')}/{relative_path.as_posix()}"
+        )
+        self._pending_items[identifier] = relative_path.name
+        now = dt_util.utcnow()
+        if self._pending_since is None:
+            self._pending_since = now
+        # A steady stream of changes can't postpone the pending files forever
+        remaining = (
+            self._pending_since + datetime.timedelta(seconds=WATCH_MAX_DELAY) - now
+        ).total_seconds()
+        self._async_schedule_pending(max(0, min(WATCH_DELAY, remaining)))
+
+    @callback
+    def _async_schedule_pending(self, delay: float) -> None:
+        """Schedule processing of the pending items, replacing any earlier schedule."""
+        if self._unsub_pending:
+            self._unsub_pending()
+        self._unsub_pending = async_call_later(
+            self._hass, delay, self._async_process_pending
+        )
+
+    async def _async_process_pending(self, _: datetime.datetime) -> None:
+        """Process the local media files that changed since the last check."""
+        self._unsub_pending = None
+        items = [
+            _ScanItem(identifier, title)
+            for identifier, title in self._pending_items.items()
+        ]
+        if (scan := self._scan) is not None:
+            # Join the running scan, where the recency priority lets the
+            # changed files go ahead of any backfill
+            self._pending_items.clear()
+            self._pending_since = None
+            for item in items:
+                scan.stats.scanned_files += 1
+                await self._async_queue_item(scan, item)
+            return
+        if self._scanning:
+            # Check the files again once the scan has finished
+            self._unsub_pending = async_call_later(
+                self._hass, WATCH_DELAY, self._async_process_pending
+            )
+            return
+        self._pending_items.clear()
+        self._pending_since = None
+        _LOGGER.debug("Processing %d changed local media files", len(items))
+        self._scanning = True
+        scan_stats = ScanStats(scanned_files=len(items))
+        try:
+            await self._async_run_task(self._async_run_scan(scan_stats, items=items))
         finally:
             self._scanning = False
+            await self._hash_store.async_flush()
+        self._async_reload_if_processed(scan_stats)
+
+    async def _async_run_task[T](self, coro: Coroutine[Any, Any, T]) -> T:
+        """Run work in a task that is cancelled when the listener is detached."""
+        task = self._hass.async_create_background_task(
+            coro, f"{DOMAIN} media source {self._media_source_prefix}"
+        )
+        self._tasks.add(task)
+        try:
+            return await task
+        finally:
+            self._tasks.discard(task)
 
-    async def _async_process_media(self) -> None:
+    async def _async_process_media(self) -> ScanStats:
         """Walk the directory structure and check for changes."""
         _LOGGER.info("Processing changes in media source %s", self._media_source_prefix)
-        session = aiohttp_client.async_get_clientsession(self._hass)
 
-        data = await self._store.async_load() or {}
-        hashes = data.get("hashes", {})
+        store = self._hash_store
+        await store.async_load()
+        if store.has_frontier:
+            # Resume an interrupted scan without repeating the folders that
+            # were already listed
+            _LOGGER.info(
+                "Resuming scan with %d folders and %d items remaining",
+                len(store.pending_folders),
+                len(store.pending_items),
+            )
+            scan_stats = store.scan_stats
+            folders = list(store.pending_folders)
+            items = [
+                _ScanItem(identifier, title)
+                for identifier, title in store.pending_items.items()
+            ]
+        else:
+            scan_stats = ScanStats()
+            scan_stats.last_scan_start = datetime.datetime.now()
+            store.scan_stats = scan_stats
+            folders = [self._media_source_prefix]
+            items = []
+        store.async_schedule_save()
+        try:
+            await self._async_run_scan(
+                scan_stats,
+                folders=folders,
+                items=items,
+                batch_backfill=self._batch_backfill,
+                pages_per_request=self._pages_per_request,
+            )
+            # The scan finished, so there is nothing left to resume
+            store.pending_folders.clear()
+            store.pending_items.clear()
+        finally:
+            scan_stats.last_scan_end = datetime.datetime.now()
+            store.async_schedule_save()
+            await store.async_flush()
+
+        _LOGGER.debug("Processing ended")
+        return scan_stats
 
-        scan_stats = ScanStats()
-        scan_stats.last_scan_start = datetime.datetime.now()
-        data["scan_stats"] = scan_stats.to_dict()
-        await self._store.async_save(data)
-        self._scan_stats = scan_stats
+    @callback
+    def _async_reload_if_processed(self, scan_stats: ScanStats) -> None:
+        """Reload the integration if any media content was processed.
 
-        queue = [self._media_source_prefix]
-        while queue:
-            identifier = queue.pop()
-            _LOGGER.debug("Processing media %s", identifier)
-            try:
-                browse = await async_browse_media(self._hass, identifier)
-            except BrowseError as err:
-                _LOGGER.error("Error browsing media %s: %s", identifier, err)
-                scan_stats.errors += 1
-                continue
-            for child in browse.children or ():
-                child_identifier = f"{URI_SCHEME}{child.domain}/{child.identifier}"  # ty: ignore[unresolved-attribute]
-                if child.can_expand:
-                    scan_stats.scanned_folders += 1
-                    queue.append(child_identifier)
-                    continue
+        The reload is postponed until a running scan has finished.
+        """
+        if scan_stats.processed_files:
+            self._reload_pending = True
+        if self._reload_pending and not self._scanning:
+            self._reload_pending = False
+            _LOGGER.info("Reloading integration to update processed results")
+            self._hass.async_create_task(
+                self._hass.config_entries.async_reload(self._config_entry_id)
+            )
+
+    async def _async_run_scan(
+        self,
+        scan_stats: ScanStats,
+        folders: list[str] | None = None,
+        items: list["_ScanItem"] | None = None,
+        batch_backfill: bool = False,
+        pages_per_request: int = 1,
+    ) -> None:
+        """Check the folders and items for changes.
 
-                scan_stats.scanned_files += 1
-                _LOGGER.debug("Processing media content %s", child_identifier)
+        The scan is a pipeline of stages connected by queues: crawling folders,
+        fetching and hashing items, extracting changed items with the vision
+        model, and writing the results. The crawl and fetch queues hold every
+        discovered folder and item, so the newest items are fetched first. The
+        later stages hold downloaded content and are bounded, so fetching only
+        blocks when they fall behind. With `batch_backfill`, the vision stage
+        collects changed items into batch jobs instead, or with
+        `pages_per_request` it packs several items into each request.
+        """
+        scan = _Scan(
+            store=self._hash_store,
+            stats=scan_stats,
+            session=aiohttp_client.async_get_clientsession(self._hass),
+            batch_backfill=batch_backfill,
+            pages_per_request=pages_per_request,
+            batched={
+                page.identifier
+                for pages in self._hash_store.batch_jobs.values()
+                for page in pages
+            },
+        )
+        scan.write = self._stage(
+            WRITE_STAGE,
+            partial(self._async_write_item, scan),
+            partial(self._on_item_error, scan),
+            (OSError, HomeAssistantError),
+        )
+        scan.vision = self._stage(
+            VISION_STAGE,
+            partial(self._async_extract_item, scan),
+            partial(self._on_item_error, scan),
+            (HomeAssistantError,),
+            _recency,
+        )
+        scan.fetch = self._stage(
+            FETCH_STAGE,
+            partial(self._async_fetch_item, scan),
+            partial(self._on_item_error, scan),
+            (aiohttp.ClientError,),
+            _recency,
+        )
+        scan.crawl = self._stage(
+            CRAWL_STAGE,
+            partial(self._async_crawl_folder, scan),
+            partial(self._on_folder_error, scan),
+            (BrowseError,),
+        )
+        # Stages are drained in order since each stage only adds work to the
+        # stages after it.
+        self._stages = [scan.crawl, scan.fetch, scan.vision, scan.write]
+        for stage in self._stages:
+            stage.start()
+        self._scan = scan
+        try:
+            for folder in folders or ():
+                await self._async_queue_folder(scan, folder)
+            for item in items or ():
+                await self._async_queue_item(scan, item)
+            for stage in self._stages:
+                await stage.join()
+                if stage is scan.fetch:
+                    # Changed files can no longer join this scan
+                    self._scan = None
+                if stage is scan.vision:
+                    await self._async_flush_vision(scan)
+        finally:
+            self._scan = None
+            # All stages are shut down before waiting in case the scan is cancelled
+            for stage in self._stages:
+                stage.shutdown()
+            await asyncio.gather(*(stage.stop() for stage in self._stages))
+            self._stages = []
+
+    def _stage[T](
+        self,
+        name: str,
+        handler: Callable[[T], Awaitable[None]],
+        on_error: Callable[[T, Exception], None],
+        retry_on: tuple[type[Exception], ...],
+        priority: Callable[[T], Any] | None = None,
+    ) -> Stage[T]:
+        """Create a pipeline stage using the configured settings."""
+        return Stage(
+            name, handler, self._stage_configs[name], on_error, retry_on, priority
+        )
+
+    async def _async_queue_folder(self, scan: "_Scan", identifier: str) -> None:
+        """Add a folder to the crawl frontier and queue it to be browsed."""
+        scan.store.pending_folders.add(identifier)
+        scan.store.async_schedule_save()
+        await scan.crawl.put(identifier)
+
+    async def _async_queue_item(self, scan: "_Scan", item: "_ScanItem") -> None:
+        """Add an item to the crawl frontier and queue it to be fetched."""
+        scan.store.pending_items[item.identifier] = item.title
+        scan.store.async_schedule_save()
+        await scan.fetch.put(item)
+
+    @callback
+    def _async_folder_done(self, scan: "_Scan", identifier: str) -> None:
+        """Remove a folder from the crawl frontier."""
+        scan.store.pending_folders.discard(identifier)
+        scan.store.async_schedule_save()
+
+    @callback
+    def _async_item_done(self, scan: "_Scan", item: "_ScanItem") -> None:
+        """Remove an item from the crawl frontier."""
+        scan.store.pending_items.pop(item.identifier, None)
+        scan.store.async_schedule_save()
+
+    @callback
+    def _on_folder_error(self, scan: "_Scan", identifier: str, err: Exception) -> None:
+        """Record an error browsing a folder."""
+        _LOGGER.error("Error browsing media %s: %s", identifier, err)
+        scan.stats.errors += 1
+        self._async_folder_done(scan, identifier)
+
+    @callback
+    def _on_item_error(self, scan: "_Scan", item: "_ScanItem", err: Exception) -> None:
+        """Record an error processing a media item in the retry ledger."""
+        scan.stats.errors += 1
+        failure = scan.store.record_failure(
+            item.identifier, item.title, err, dt_util.utcnow()
+        )
+        if failure.dead_lettered:
+            _LOGGER.error(
+                "Error processing media content %s after %d attempts, "
+                "moving to dead-letter list: %s",
+                item.identifier,
+                failure.attempts,
+                err,
+            )
+        else:
+            _LOGGER.error(
+                "Error processing media content %s, retrying after %s: %s",
+                item.identifier,
+                failure.next_attempt,
+                err,
+            )
+        self._async_item_done(scan, item)
+
+    async def _async_crawl_folder(self, scan: "_Scan", identifier: str) -> None:
+        """Browse a folder and queue its children."""
+        _LOGGER.debug("Processing media %s", identifier)
+        browse = await async_browse_media(self._hass, identifier)
+        for child in browse.children or ():
+            child_identifier = f"{URI_SCHEME}{child.domain}/{child.identifier}"  # ty: ignore[unresolved-attribute]
+            if (
+                child_identifier in scan.store.pending_folders
+                or child_identifier in scan.store.pending_items
+            ):
+                # Already queued when an interrupted scan was resumed
+                continue
+            if child.can_expand:
+                scan.stats.scanned_folders += 1
+                await self._async_queue_folder(scan, child_identifier)
+            else:
                 # Can't expand, this is the media file.
+                scan.stats.scanned_files += 1
+                await self._async_queue_item(
+                    scan, _ScanItem(child_identifier, child.title)
+                )
+        # The folder's children are now part of the frontier
+        self._async_folder_done(scan, identifier)
+
+    async def _async_fetch_item(self, scan: "_Scan", item: "_ScanItem") -> None:
+        """Check a media file for changes and queue it for extraction if changed."""
+        _LOGGER.debug("Processing media content %s", item.identifier)
+        if (
+            failure := scan.store.failures.get(item.identifier)
+        ) is not None and not failure.eligible(dt_util.utcnow()):
+            _LOGGER.debug("Media content failed recently, skipping")
+            scan.stats.skipped_items += 1
+            self._async_item_done(scan, item)
+            return
+        if item.identifier in scan.batched:
+            _LOGGER.debug("Media content is waiting for a batch job, skipping")
+            scan.stats.skipped_items += 1
+            self._async_item_done(scan, item)
+            return
+        if not await self._async_fetch_if_changed(scan, item):
+            self._async_item_done(scan, item)
+            return
+        scan.stats.processed_files += 1
+        await scan.vision.put(item)
+
+    async def _async_extract_item(self, scan: "_Scan", item: "_ScanItem") -> None:
+        """Extract the journal page from a changed media item."""
+        batch_process_item = self._batch_process_item
+        if (
+            batch_process_item is not None
+            and scan.batch_backfill
+            and item.media_content is not None
+            and TIMESTAMP_RE.match(item.title)
+        ):
+            # The item stays in the crawl frontier until the batch is submitted
+            scan.batch.append(item)
+            scan.batch_bytes += len(item.media_content.content)
+            if len(scan.batch) >= BATCH_SIZE or scan.batch_bytes >= BATCH_MAX_BYTES:
+                await self._async_submit_batch(batch_process_item, scan)
+            return
+        if (
+            batch_process_item is not None
+            and scan.pages_per_request > 1
+            and item.media_content is not None
+            and TIMESTAMP_RE.match(item.title)
+        ):
+            # Pages of the same notebook share a prompt so they can be packed
+            prefix = note_prefix(Path(item.title))
+            pack = scan.packs.setdefault(prefix, [])
+            pack.append(item)
+            if len(pack) >= scan.pages_per_request:
+                del scan.packs[prefix]
+                await self._async_extract_pack(batch_process_item, scan, pack)
+            return
+        item.journal_page = await self._process_item.extract(
+            self._hass, item.identifier, item.media_content
+        )
+        # Release the downloaded content while waiting to be written
+        item.media_content = None
+        await scan.write.put(item)
+
+    async def _async_write_item(self, scan: "_Scan", item: "_ScanItem") -> None:
+        """Persist the extracted journal page and record the content hash."""
+        if item.journal_page is not None:
+            await self._process_item.write(self._hass, item.title, item.journal_page)
+        if item.content_hash is not None and item.metadata is not None:
+            scan.store.hashes[item.identifier] = item.content_hash
+            scan.store.metadata[item.identifier] = item.metadata
+        scan.store.failures.pop(item.identifier, None)
+        self._async_item_done(scan, item)
+
+    async def _async_flush_vision(self, scan: "_Scan") -> None:
+        """Extract or submit the items still collected by the vision stage."""
+        if (batch_process_item := self._batch_process_item) is None:
+            return
+        packs = list(scan.packs.values())
+        scan.packs.clear()
+        for pack in packs:
+            await self._async_extract_pack(batch_process_item, scan, pack)
+        if scan.batch:
+            await self._async_submit_batch(batch_process_item, scan)
+
+    async def _async_extract_pack(
+        self,
+        batch_process_item: BatchProcessItem,
+        scan: "_Scan",
+        items: list["_ScanItem"],
+    ) -> None:
+        """Extract the journal pages from several changed items in one request."""
+        media_contents = [
+            item.media_content for item in items if item.media_content is not None
+        ]
+        try:
+            results = await batch_process_item.extract_pages(self._hass, media_contents)
+        except HomeAssistantError as err:
+            for item in items:
+                self._on_item_error(scan, item, err)
+            return
+        for item in items:
+            item.media_content = None
+            if (result := results.get(item.title)) is None:
+                self._on_item_error(
+                    scan, item, HomeAssistantError("Missing from packed response")
+                )
+                continue
+            if isinstance(result, ValueError):
+                # Matches extracting the item on its own, which is not retried
+                _LOGGER.warning(
+                    "Skipping media content %s due to bad response: %s",
+                    item.identifier,
+                    result,
+                )
+            else:
+                item.journal_page = result
+            await scan.write.put(item)
+
+    async def _async_submit_batch(
+        self, batch_process_item: BatchProcessItem, scan: "_Scan"
+    ) -> None:
+        """Submit the collected items as a batch job."""
+        items, scan.batch, scan.batch_bytes = scan.batch, [], 0
+        media_contents = [
+            item.media_content for item in items if item.media_content is not None
+        ]
+        _LOGGER.info("Submitting batch job for %d media items", len(items))
+        try:
+            submission = await batch_process_item.submit_batch(
+                self._hass, media_contents
+            )
+        except HomeAssistantError as err:
+            for item in items:
+                self._on_item_error(scan, item, err)
+            return
+        submitted = []
+        for item in items:
+            item.media_content = None
+            if (journal_page := submission.cached.get(item.title)) is not None:
+                # Already extracted, so written without waiting for the job
+                item.journal_page = journal_page
+                await scan.write.put(item)
+            else:
+                submitted.append(item)
+        if submission.name is None or not submitted:
+            return
+        scan.store.batch_jobs[submission.name] = [
+            BatchPage(
+                identifier=item.identifier,
+                title=item.title,
+                content_hash=item.content_hash or "",
+                metadata=item.metadata,
+                cache_key=submission.cache_keys.get(item.title),
+            )
+            for item in submitted
+        ]
+        # The items are counted as processed once the batch job is written
+        scan.stats.processed_files -= len(submitted)
+        for item in submitted:
+            scan.batched.add(item.identifier)
+            self._async_item_done(scan, item)
+        if self._unsub_batch_poll is None:
+            self._unsub_batch_poll = async_track_time_interval(
+                self._hass, self.async_poll_batch_jobs, BATCH_POLL_INTERVAL
+            )
+
+    async def _async_poll_batch_job(
+        self, batch_process_item: BatchProcessItem, name: str, pages: list[BatchPage]
+    ) -> int:
+        """Write the results of a batch job if it has finished.
+
+        Returns the number of journal pages written.
+        """
+        store = self._hash_store
+        now = dt_util.utcnow()
+        try:
+            results = await batch_process_item.batch_results(
+                self._hass, name, [page.cache_key for page in pages]
+            )
+        except BatchJobError as err:
+            _LOGGER.error("Batch job %s failed: %s", name, err)
+            del store.batch_jobs[name]
+            for page in pages:
+                store.record_failure(page.identifier, page.title, err, now)
+            store.async_schedule_save()
+            return 0
+        except HomeAssistantError as err:
+            _LOGGER.warning("Unable to check batch job %s: %s", name, err)
+            return 0
+        if results is None:
+            _LOGGER.debug("Batch job %s is still running", name)
+            return 0
+
+        _LOGGER.info("Batch job %s finished with %d results", name, len(results))
+        del store.batch_jobs[name]
+        written = 0
+        for page, result in zip(pages, results):
+            if isinstance(result, BatchJobError):
+                _LOGGER.error(
+                    "Error processing media content %s in batch job: %s",
+                    page.identifier,
+                    result,
+                )
+                store.record_failure(page.identifier, page.title, result, now)
+                continue
+            if isinstance(result, ValueError):
+                # Matches extracting the item on its own, which is not retried
+                _LOGGER.warning(
+                    "Skipping media content %s due to bad response: %s",
+                    page.identifier,
+                    result,
+                )
+            else:
                 try:
-                    play_media = await async_resolve_media(
-                        self._hass, child_identifier, target_media_player=None
-                    )
-                except Unresolvable as err:
-                    _LOGGER.error("Error resolving media %s: %s", child_identifier, err)
-                    scan_stats.errors += 1
-                    continue
-                url = async_process_play_media_url(self._hass, play_media.url)
-                _LOGGER.debug("Fetching media content %s", url)
-                # Download the content and compare the hash to determine if it has changed.
-                try:
-                    response = await session.request("get", url)
-                    response.raise_for_status()
-                    content = await response.read()
-                except aiohttp.ClientError as err:
+                    await self._process_item.write(self._hass, page.title, result)
+                except (OSError, HomeAssistantError) as err:
                     _LOGGER.error(
-                        "Error downloading media content %s: %s", play_media.url, err
+                        "Error writing media content %s: %s", page.identifier, err
                     )
-                    scan_stats.errors += 1
+                    store.record_failure(page.identifier, page.title, err, now)
                     continue
+                written += 1
+            store.hashes[page.identifier] = page.content_hash
+            if page.metadata is not None:
+                store.metadata[page.identifier] = page.metadata
+            store.failures.pop(page.identifier, None)
+        store.async_schedule_save()
+        return written
 
-                content_hash = hashlib.sha256(content).hexdigest()
-                if content_hash == hashes.get(child_identifier):
-                    _LOGGER.debug("Media content has not changed, skipping")
-                    scan_stats.skipped_items += 1
-                    continue
+    async def _async_fetch_if_changed(self, scan: "_Scan", item: "_ScanItem") -> bool:
+        """Fetch the media content if it has changed since it was last processed.
 
-                _LOGGER.debug("Media content has changed (%s bytes)", len(content))
+        Returns True if the content has changed, updating the item with the new
+        content hash, metadata, and content. The content is buffered while it is
+        hashed and dropped when it turns out to be unchanged, so changed items
+        are never downloaded a second time.
+        """
+        identifier = item.identifier
+        previous = (
+            scan.store.metadata.get(identifier)
+            if identifier in scan.store.hashes
+            else None
+        )
 
-                # Process the media content
-                scan_stats.processed_files += 1
-                result = await self._process_item.process(self._hass, child_identifier)
-                if not result:
-                    _LOGGER.info("Error processing media content %s", child_identifier)
-                    scan_stats.errors += 1
-                    continue
+        # Check the local file before resolving or downloading anything
+        file_stat: FileStat | None = None
+        if (path := local_media_path(self._hass, identifier)) is not None:
+            file_stat = await self._hass.async_add_executor_job(_stat_file, path)
+            if (
+                file_stat is not None
+                and previous is not None
+                and previous.size == file_stat.size
+                and previous.mtime_ns == file_stat.mtime_ns
+            ):
+                _LOGGER.debug("Media file has not changed, skipping")
+                scan.stats.skipped_items += 1
+                return False
 
-                # Store the updated hash
-                hashes[child_identifier] = content_hash
-                data["hashes"] = hashes
-                await self._store.async_save(data)
+        play_media = await async_resolve_media(
+            self._hass, identifier, target_media_player=None
+        )
+        url = async_process_play_media_url(self._hass, play_media.url)
+        _LOGGER.debug("Fetching media content %s", url)
+        headers = {}
+        if previous is not None and file_stat is None:
+            if previous.etag:
+                headers[hdrs.IF_NONE_MATCH] = previous.etag
+            if previous.last_modified:
+                headers[hdrs.IF_MODIFIED_SINCE] = previous.last_modified
+        # Stream the content and compare the hash to determine if it has changed.
+        # An existing hash is compared using the algorithm it was stored with so
+        # that changing the algorithm does not reprocess every item.
+        previous_hash = scan.store.hashes.get(identifier)
+        algorithm = (
+            _hash_algorithm(previous_hash) if previous_hash else self._hash_algorithm
+        )
+        buffer = bytearray()
+        # The response is always released so the connection returns to the pool
+        async with scan.session.get(url, headers=headers) as response:
+            response.raise_for_status()
+            if response.status == HTTPStatus.NOT_MODIFIED:
+                _LOGGER.debug("Media content was not modified, skipping")
+                scan.stats.skipped_items += 1
+                return False
+            content_hash = await async_hash_content(response.content, algorithm, buffer)
+            new_metadata = MediaMetadata(
+                etag=response.headers.get(hdrs.ETAG),
+                last_modified=response.headers.get(hdrs.LAST_MODIFIED),
+                size=file_stat.size if file_stat else None,
+                mtime_ns=file_stat.mtime_ns if file_stat else None,
+            )
+        if content_hash == previous_hash:
+            _LOGGER.debug("Media content has not changed, skipping")
+            scan.stats.skipped_items += 1
+            if scan.store.failures.pop(identifier, None) is not None:
+                scan.store.async_schedule_save()
+            if new_metadata != previous:
+                scan.store.metadata[identifier] = new_metadata
+                scan.store.async_schedule_save()
+            return False
 
-        scan_stats.last_scan_end = datetime.datetime.now()
-        data["scan_stats"] = scan_stats.to_dict()
-        await self._store.async_save(data)
-        self._scan_stats = scan_stats
+        _LOGGER.debug("Media content has changed")
+        item.content_hash = content_hash
+        item.metadata = new_metadata
+        item.media_content = MediaContent(title=item.title, content=bytes(buffer))
+        return True
 
-        _LOGGER.debug("Processing ended")
 
-        if scan_stats.processed_files:
-            _LOGGER.info("Reloading integration to update processed results")
-            self._hass.async_create_task(
-                self._hass.config_entries.async_reload(self._config_entry_id)
-            )
+def _recency(item: "_ScanItem") -> tuple[int, int]:
+    """Return a priority that orders the newest pages first.
+
+    Pages are ordered by the timestamp in the filename and pages without a
+    timestamp are processed last.
+    """
+    if (re_match := TIMESTAMP_RE.match(item.title)) is None:
+        return (1, 0)
+    return (0, -int(re_match.group(1)))
+
+
+@dataclass
+class _ScanItem:
+    """A media item moving through the stages of a scan."""
+
+    identifier: str
+    title: str
+    content_hash: str | None = None
+    metadata: MediaMetadata | None = None
+    media_content: MediaContent | None = None
+    journal_page: JournalPage | None = None
+
+
+@dataclass
+class _Scan:
+    """State shared by the stages of a single scan."""
+
+    store: HashStore
+    stats: ScanStats
+    session: aiohttp.ClientSession
+    crawl: Stage[str] = field(init=False)
+    fetch: Stage[_ScanItem] = field(init=False)
+    vision: Stage[_ScanItem] = field(init=False)
+    write: Stage[_ScanItem] = field(init=False)
+    batch_backfill: bool = False
+    # Changed items collected for the next batch job
+    batch: list[_ScanItem] = field(default_factory=list)
+    batch_bytes: int = 0
+    # Items waiting for the results of a batch job
+    batched: set[str] = field(default_factory=set)
+    pages_per_request: int = 1
+    # Changed items collected for the next request of each notebook
+    packs: dict[str, list[_ScanItem]] = field(default_factory=dict)
@@ -0,0 +1,122 @@
+"""Library for submitting model requests as asynchronous batch jobs.
+
+Batch jobs are processed by the model API in the background at a lower cost
+than interactive requests and do not count against the interactive quota. They
+may take hours to complete, so jobs are submitted and then polled for results.
+"""
+
+import logging
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+
+from google import genai
+from google.genai import types
+
+_LOGGER = logging.getLogger(__name__)
+
+__all__ = [
+    "BatchBackend",
+    "BatchJobError",
+    "BatchRequest",
+    "BatchResult",
+    "GenaiBatchBackend",
+]
+
+FAILED_STATES = {
+    types.JobState.JOB_STATE_FAILED,
+    types.JobState.JOB_STATE_CANCELLED,
+    types.JobState.JOB_STATE_EXPIRED,
+}
+DONE_STATES = {
+    types.JobState.JOB_STATE_SUCCEEDED,
+    types.JobState.JOB_STATE_PARTIALLY_SUCCEEDED,
+}
+
+
+class BatchJobError(Exception):
+    """A batch job failed without producing results."""
+
+
+@dataclass
+class BatchRequest:
+    """A single request in a batch job."""
+
+    contents: types.Content
+    config: types.GenerateContentConfig
+
+
+@dataclass
+class BatchResult:
+    """The result of a single request in a batch job."""
+
+    text: str | None = None
+    """The response text, if the request succeeded."""
+
+    error: str | None = None
+    """The error, if the request failed."""
+
+
+class BatchBackend(ABC):
+    """An API for running batch jobs."""
+
+    @abstractmethod
+    async def submit(
+        self, model: str, display_name: str, requests: list[BatchRequest]
+    ) -> str:
+        """Submit a batch job and return its name."""
+
+    @abstractmethod
+    async def results(self, name: str) -> list[BatchResult] | None:
+        """Return the results of a batch job, or None if it is still running.
+
+        Results are in the same order as the submitted requests. Raises a
+        BatchJobError if the job failed.
+        """
+
+
+class GenaiBatchBackend(BatchBackend):
+    """Run batch jobs with the Gemini batch API using inline requests."""
+
+    def __init__(self, client: genai.Client) -> None:
+        """Initialize the batch backend."""
+        self._client = client
+
+    async def submit(
+        self, model: str, display_name: str, requests: list[BatchRequest]
+    ) -> str:
+        """Submit a batch job and return its name."""
+        job = await self._client.aio.batches.create(
+            model=model,
+            src=[
+                types.InlinedRequest(contents=request.contents, config=request.config)
+                for request in requests
+            ],
+            config=types.CreateBatchJobConfig(display_name=display_name),
+        )
+        if not job.name:
+            raise BatchJobError("Batch job was created without a name")
+        _LOGGER.debug(
+            "Submitted batch job %s with %d requests", job.name, len(requests)
+        )
+        return job.name
+
+    async def results(self, name: str) -> list[BatchResult] | None:
+        """Return the results of a batch job, or None if it is still running."""
+        job = await self._client.aio.batches.get(name=name)
+        if job.state in FAILED_STATES:
+            raise BatchJobError(
+                f"Batch job {name} ended in state {job.state}: {job.error}"
+            )
+        if job.state not in DONE_STATES:
+            return None
+        responses = (job.dest.inlined_responses if job.dest else None) or []
+        results = []
+        for inlined in responses:
+            if inlined.error is not None or inlined.response is None:
+                results.append(BatchResult(error=str(inlined.error)))
+                continue
+            try:
+                results.append(BatchResult(text=inlined.response.text or ""))
+            except AttributeError as err:
+                results.append(BatchResult(error=str(err)))
+        return results
@@ -0,0 +1,119 @@
+"""Library for preparing journal page images before sending them to the model.
+
+Scanned or photographed notebook pages are often very large images with wide
+blank margins. Handwriting remains legible at a much lower resolution, so pages
+can be cropped to their content, downscaled, converted to grayscale and
+re-encoded to reduce the upload size, request latency and input tokens.
+
+Preprocessing decodes the whole image and must be run in an executor.
+"""
+
+import io
+import logging
+from dataclasses import dataclass
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+_LOGGER = logging.getLogger(__name__)
+
+__all__ = [
+    "ImageOptions",
+    "PreparedImage",
+    "preprocess_image",
+]
+
+DEFAULT_MIME_TYPE = "image/png"
+DEFAULT_LONG_EDGE = 1536
+# Pixels lighter than this are treated as blank paper when cropping margins
+MARGIN_THRESHOLD = 200
+# Padding kept around the content as a fraction of the cropped size
+MARGIN_PADDING = 0.02
+MIME_TYPES = {
+    "WEBP": "image/webp",
+    "JPEG": "image/jpeg",
+}
+
+
+@dataclass(frozen=True)
+class ImageOptions:
+    """Settings for preprocessing page images."""
+
+    long_edge: int = DEFAULT_LONG_EDGE
+    """Maximum size in pixels of the longest side of the image."""
+
+    crop_margins: bool = True
+    """Crop blank margins around the page content."""
+
+    grayscale: bool = True
+    """Convert the image to grayscale."""
+
+    format: str = "WEBP"
+    """Format to encode the image with, either WEBP or JPEG."""
+
+    quality: int = 80
+    """Lossy encoding quality."""
+
+
+@dataclass
+class PreparedImage:
+    """An image ready to be sent to the model."""
+
+    content: bytes
+    mime_type: str
+
+
+def _crop_margins(image: Image.Image) -> Image.Image:
+    """Crop the blank margins around the darker content of the page."""
+    mask = image.convert("L").point(lambda p: 255 if p < MARGIN_THRESHOLD else 0)
+    if (bbox := mask.getbbox()) is None:
+        return image
+    left, top, right, bottom = bbox
+    pad_x = int((right - left) * MARGIN_PADDING)
+    pad_y = int((bottom - top) * MARGIN_PADDING)
+    return image.crop(
+        (
+            max(0, left - pad_x),
+            max(0, top - pad_y),
+            min(image.width, right + pad_x),
+            min(image.height, bottom + pad_y),
+        )
+    )
+
+
+def preprocess_image(content: bytes, options: ImageOptions) -> PreparedImage:
+    """Prepare a page image for the model, which performs blocking work.
+
+    Content that can't be decoded as an image, that is too large to decode
+    safely, or that would not get smaller is returned unchanged.
+    """
+    original = PreparedImage(content=content, mime_type=DEFAULT_MIME_TYPE)
+    try:
+        image: Image.Image = Image.open(io.BytesIO(content))
+        image.load()
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as err:
+        _LOGGER.debug("Unable to decode page image, sending unchanged: %s", err)
+        return original
+    if original_mime := Image.MIME.get(image.format or ""):
+        original.mime_type = original_mime
+
+    # Camera images may be stored rotated with an orientation tag
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ("RGB", "L"):
+        # Flatten transparency onto white paper
+        background = Image.new("RGB", image.size, "white")
+        rgba = image.convert("RGBA")
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        image = background
+    if options.grayscale:
+        image = image.convert("L")
+    if options.crop_margins:
+        image = _crop_margins(image)
+    image.thumbnail((options.long_edge, options.long_edge), Image.Resampling.LANCZOS)
+
+    buffer = io.BytesIO()
+    image.save(buffer, format=options.format, quality=options.quality)
+    if buffer.tell() >= len(content):
+        return original
+    return PreparedImage(
+        content=buffer.getvalue(), mime_type=MIME_TYPES[options.format]
+    )
@@ -1,18 +1,21 @@
 """Converter from yaml journal files to an RFC5545 Journal."""
 
 from pathlib import Path
+import bisect
 import itertools
 import datetime
 import logging
 import hashlib
 from typing import cast
-from collections.abc import Generator
-
+from collections.abc import Generator, Iterable
+from dataclasses import dataclass, field
 
 from ical.calendar import Calendar
 from ical.journal import Journal
+from ical.timespan import Timespan
+from ical.util import normalize_datetime
 
-import yaml
+from mashumaro.mixins.json import DataClassJSONMixin
 
 from homeassistant.util import dt as dt_util
 from custom_components.journal_assistant.vectordb import IndexableDocument
@@ -22,7 +25,10 @@ from .model import JournalPage
 _LOGGER = logging.getLogger(__name__)
 
 __all__ = [
+    "JournalTimeline",
+    "Notebooks",
     "journal_from_yaml",
+    "notebooks_from_yaml",
 ]
 
 INDEX_BATCH_SIZE = 25
@@ -90,74 +96,294 @@ def write_journal_page_yaml(
     write_content(content, filename)
 
 
+@dataclass
+class IndexedPage(DataClassJSONMixin):
+    """The dates contained in a single notebook page file."""
+
+    mtime_ns: int
+    """Modification time of the file when it was indexed."""
+
+    size: int
+    """Size of the file when it was indexed."""
+
+    dates: list[str] = field(default_factory=list)
+    """Dates with content on the page, in page order."""
+
+
+@dataclass
+class JournalDateIndex(DataClassJSONMixin):
+    """An index of the dates that each notebook page file contributes to.
+
+    The index is persisted to disk so that only new or changed page files need
+    to be parsed when the journal is loaded.
+    """
+
+    pages: dict[str, IndexedPage] = field(default_factory=dict)
+    """Indexed page files keyed by filename relative to the storage directory."""
+
+
+def _note_name(filename: str) -> str:
+    """Return the note name prefix for a page filename."""
+    return filename.split("-")[0]
+
+
+def update_date_index(storage_dir: Path, date_index: JournalDateIndex) -> bool:
+    """Update the index with any added, changed, or removed page files.
+
+    Changed page files are parsed one at a time and only their dates are kept,
+    so this pass runs to completion before any journal entry can be built.
+    Returns True if the index was modified.
+    """
+    changed = False
+    found = set()
+    for path in storage_dir.glob("*.yaml"):
+        found.add(path.name)
+        stat = path.stat()
+        existing = date_index.pages.get(path.name)
+        if (
+            existing is not None
+            and existing.mtime_ns == stat.st_mtime_ns
+            and existing.size == stat.st_size
+        ):
+            continue
+        _LOGGER.debug("Indexing journal page %s", path.name)
+        page = JournalPage.from_yaml(path.read_text())
+        date_index.pages[path.name] = IndexedPage(
+            mtime_ns=stat.st_mtime_ns,
+            size=stat.st_size,
+            dates=list(get_dated_content(page)),
+        )
+        changed = True
+    for removed in date_index.pages.keys() - found:
+        del date_index.pages[removed]
+        changed = True
+    return changed
+
+
+def load_date_index(storage_dir: Path, index_path: Path) -> JournalDateIndex:
+    """Load the date index from disk, updating it for any changed page files."""
+    date_index = JournalDateIndex()
+    if index_path.exists():
+        try:
+            date_index = JournalDateIndex.from_json(index_path.read_text())
+        except ValueError as err:
+            _LOGGER.warning("Rebuilding invalid journal index %s: %s", index_path, err)
+    if update_date_index(storage_dir, date_index) or not index_path.exists():
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+        write_content(date_index.to_json(), index_path)
+    return date_index
+
+
+class Notebooks:
+    """Journal entries for all notebooks with lazily loaded descriptions.
+
+    Each notebook is an RFC5545 calendar with a journal entry per date. The
+    entries do not hold their description, which is materialized from the
+    page files on demand for only the entries that are needed.
+    """
+
+    def __init__(
+        self,
+        storage_dir: Path,
+        date_index: JournalDateIndex,
+        allowed_notes: set[str],
+        default_note_name: str,
+    ) -> None:
+        """Initialize Notebooks."""
+        self._storage_dir = storage_dir
+        # Journal uid to the date and page files with content for that date
+        self._sources: dict[str, tuple[str, list[str]]] = {}
+        self._journals: dict[str, Journal] = {}
+        self.calendars: dict[str, Calendar] = {}
+
+        filenames = sorted(
+            date_index.pages, key=lambda filename: (_note_name(filename), filename)
+        )
+        _LOGGER.debug("Journal names: %s", sorted({_note_name(f) for f in filenames}))
+        for note_name, note_filenames in itertools.groupby(filenames, _note_name):
+            # Allow notes to have their own calendar entry if in the list of allowed notes
+            key_name = note_name if note_name in allowed_notes else default_note_name
+
+            dated_files: dict[str, list[str]] = {}
+            for filename in note_filenames:
+                for date in date_index.pages[filename].dates:
+                    if date not in dated_files:
+                        dated_files[date] = []
+                    dated_files[date].append(filename)
+
+            if key_name not in self.calendars:
+                self.calendars[key_name] = Calendar()
+
+            # Add a journal entry for each date
+            calendar = self.calendars[key_name]
+            for date, date_filenames in dated_files.items():
+                journal = Journal()
+                journal.uid = hashlib.sha256(f"{note_name}-{date}".encode()).hexdigest()
+                journal.summary = f"{note_name} {date}"
+                journal.categories = [key_name]
+                if note_name not in allowed_notes:
+                    journal.categories.append(note_name)
+                if "T" in date:
+                    journal.dtstart = datetime.datetime.fromisoformat(date)
+                else:
+                    journal.dtstart = datetime.date.fromisoformat(date)
+                calendar.journal.append(journal)
+                self._sources[journal.uid] = (date, date_filenames)
+                self._journals[journal.uid] = journal
+
+    def get(self, uid: str) -> Journal | None:
+        """Return the journal entry with the given uid, without a description."""
+        return self._journals.get(uid)
+
+    def load_descriptions(self, uids: Iterable[str]) -> dict[str, str]:
+        """Load the descriptions for the specified journal entries from disk.
+
+        This performs blocking I/O and should be called from an executor.
+        """
+        dated_content: dict[str, dict[str, list[str]]] = {}
+        descriptions = {}
+        for uid in uids:
+            if (source := self._sources.get(uid)) is None:
+                continue
+            date, filenames = source
+            content_list = []
+            for filename in filenames:
+                if filename not in dated_content:
+                    path = self._storage_dir / filename
+                    try:
+                        page = JournalPage.from_yaml(path.read_text())
+                    except FileNotFoundError:
+                        _LOGGER.debug("Journal page %s no longer exists", filename)
+                        dated_content[filename] = {}
+                        continue
+                    dated_content[filename] = get_dated_content(page)
+                content_list.extend(dated_content[filename].get(date, []))
+            descriptions[uid] = "\n".join(content_list)
+        return descriptions
+
+    def materialize(self, journals: Iterable[Journal]) -> list[Journal]:
+        """Return copies of the journal entries with their descriptions loaded.
+
+        This performs blocking I/O and should be called from an executor.
+        """
+        journals = list(journals)
+        descriptions = self.load_descriptions(journal.uid or "" for journal in journals)
+        return [
+            journal.model_copy(
+                update={"description": descriptions.get(journal.uid or "")}
+            )
+            for journal in journals
+        ]
+
+
+def notebooks_from_yaml(
+    storage_dir: Path,
+    index_path: Path,
+    allowed_notes: set[str],
+    default_note_name: str,
+) -> Notebooks:
+    """Load notebooks from yaml journal files using the on-disk date index."""
+    _LOGGER.debug("Loading journal index from %s", storage_dir)
+    date_index = load_date_index(storage_dir, index_path)
+    return Notebooks(storage_dir, date_index, allowed_notes, default_note_name)
+
+
 def journal_from_yaml(
     storage_dir: Path,
     allowed_notes: set[str],
     default_note_name: str,
 ) -> dict[str, Calendar]:
-    """Convert a yaml journal to an RFC5545 Journal."""
+    """Convert a yaml journal to an RFC5545 Journal with all descriptions loaded."""
     _LOGGER.debug("Loading journal content from %s", storage_dir)
-    # Get the unique list of journal names
-    filename_prefixes = {
-        filename.name.split("-")[0] for filename in storage_dir.glob("*.yaml")
+    date_index = JournalDateIndex()
+    update_date_index(storage_dir, date_index)
+    notebooks = Notebooks(storage_dir, date_index, allowed_notes, default_note_name)
+    return {
+        key_name: Calendar(journal=notebooks.materialize(calendar.journal))
+        for key_name, calendar in notebooks.calendars.items()
     }
-    note_names = list(filename_prefixes)
-    note_names.sort()
-    _LOGGER.debug("Journal names: %s", note_names)
-
-    journals = {}
-    for note_name in note_names:
-        # Load all pages from with the same journal prefix
-        pages = journal_pages(storage_dir, note_name)
-
-        # Allow notes to have their own calendar entry if in the list of allowed notes
-        key_name = note_name if note_name in allowed_notes else default_note_name
-
-        dated_content: dict[str, list[str]] = {}
-        for page in pages:
-            for date, content_list in get_dated_content(page).items():
-                if date not in dated_content:
-                    dated_content[date] = []
-                dated_content[date].extend(content_list)
-
-        if key_name not in journals:
-            journals[key_name] = Calendar()
-
-        # Add a journal entry for each date
-        calendar = journals[key_name]
-        for date, content_list in dated_content.items():
-            journal = Journal()
-            journal.uid = hashlib.sha256(f"{note_name}-{date}".encode()).hexdigest()
-            journal.summary = f"{note_name} {date}"
-            journal.categories = [key_name]
-            if note_name not in allowed_notes:
-                journal.categories.append(note_name)
-            if "T" in date:
-                journal.dtstart = datetime.datetime.fromisoformat(date)
-            else:
-                journal.dtstart = datetime.date.fromisoformat(date)
-            journal.description = "\n".join(content_list)
-            calendar.journal.append(journal)
 
-        journals[key_name] = calendar
 
-    return journals
+class JournalTimeline:
+    """A sorted interval index of journal entries for fast range lookups.
 
+    Journal entries do not recur, so the timeline is built once by sorting all
+    entries by their timespan. Lookups use a binary search on the start times
+    bounded by the longest entry duration, so a range query costs
+    O(log n + k) instead of a scan of every entry.
+    """
 
-def _serialize_content(item: Journal) -> str:
-    """Serialize a journal entry."""
-    return yaml.dump(
-        item.model_dump(
-            exclude={"uid", "dtsamp"}, exclude_unset=True, exclude_none=True
+    def __init__(self, journal: list[Journal], tzinfo: datetime.tzinfo) -> None:
+        """Initialize the JournalTimeline."""
+        self._tzinfo = tzinfo
+        items = sorted(
+            ((entry.timespan_of(tzinfo), entry) for entry in journal),
+            key=lambda item: (item[0].start, item[0].end),
+        )
+        self._spans = [span for span, _ in items]
+        self._entries = [entry for _, entry in items]
+        self._starts = [span.start for span in self._spans]
+        self._max_duration = max(
+            (span.end - span.start for span in self._spans),
+            default=datetime.timedelta(0),
         )
-    )
+
+    def __len__(self) -> int:
+        """Return the number of entries in the timeline."""
+        return len(self._entries)
+
+    def overlapping(
+        self,
+        start: datetime.date | datetime.datetime,
+        end: datetime.date | datetime.datetime,
+    ) -> Generator[Journal]:
+        """Return the journal entries active during the timespan.
+
+        The end date is exclusive.
+        """
+        timespan = Timespan.of(
+            normalize_datetime(start, self._tzinfo),
+            normalize_datetime(end, self._tzinfo),
+        )
+        lo = bisect.bisect_left(self._starts, timespan.start - self._max_duration)
+        hi = bisect.bisect_right(self._starts, timespan.end)
+        for index in range(lo, hi):
+            if self._spans[index].intersects(timespan):
+                yield self._entries[index]
+
+    def active_after(
+        self, instant: datetime.date | datetime.datetime
+    ) -> Generator[Journal]:
+        """Return the journal entries active after the specified time."""
+        value = normalize_datetime(instant, self._tzinfo)
+        lo = bisect.bisect_right(self._starts, value - self._max_duration)
+        for index in range(lo, len(self._entries)):
+            span = self._spans[index]
+            if span.start > value or span.end > value:
+                yield self._entries[index]
+
+
+def render_document(journal_entry: Journal) -> str:
+    """Return the text of a journal entry that is used for the index.
+
+    The output is deterministic so that unchanged entries render the same text.
+    """
+    lines = [f"summary: {journal_entry.summary or ''}"]
+    if journal_entry.dtstart is not None:
+        lines.append(f"dtstart: {journal_entry.dtstart.isoformat()}")
+    if journal_entry.categories:
+        lines.append(f"categories: {', '.join(journal_entry.categories)}")
+    if journal_entry.description:
+        lines.append("description:")
+        lines.append(journal_entry.description)
+    return "\n".join(lines) + "\n"
 
 
 def create_indexable_document(journal_entry: Journal) -> IndexableDocument:
     """Create an indexable document from a journal entry."""
     return IndexableDocument(
         uid=journal_entry.uid or "",
-        document=_serialize_content(journal_entry),
+        document=render_document(journal_entry),
         timestamp=dt_util.start_of_local_day(journal_entry.dtstart),
         metadata={
             "category": (next(iter(journal_entry.categories), "")),
@@ -167,18 +393,22 @@ def create_indexable_document(journal_entry: Journal) -> IndexableDocument:
 
 
 def indexable_notebooks_iterator(
-    notebooks: dict[str, Calendar], batch_size: int | None = None
+    notebooks: Notebooks, batch_size: int | None = None
 ) -> Generator[list[IndexableDocument]]:
-    """Iterate over notebooks in batches."""
-    total = sum(len(calendar.journal) for calendar in notebooks.values())
+    """Iterate over notebooks in batches.
+
+    This is a lazy pipeline from journal entries to page files to dated content
+    to indexable documents, so only the current batch is materialized. This
+    performs blocking I/O and should be consumed from an executor.
+    """
     count = 0
-    for calendar in notebooks.values():
+    for calendar in notebooks.calendars.values():
         for found_journal_entries in itertools.batched(
             calendar.journal, batch_size or INDEX_BATCH_SIZE
         ):
             count += len(found_journal_entries)
-            _LOGGER.debug("Processing batch %s of %s", count, total)
+            _LOGGER.debug("Processing batch of %s documents", count)
             yield [
                 create_indexable_document(journal_entry)
-                for journal_entry in found_journal_entries
+                for journal_entry in notebooks.materialize(found_journal_entries)
             ]
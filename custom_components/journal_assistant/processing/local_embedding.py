@@ -0,0 +1,148 @@
+"""Library for computing text embeddings locally without a model API.
+
+Text is split into overlapping character n-grams, which are hashed into a large
+feature space and weighted with TF-IDF. The sparse feature vector is reduced to
+a small dense embedding with a sparse random projection, where each feature is
+added to a few embedding dimensions chosen by its hash. No model weights are
+needed, so documents and queries are embedded on the CPU without any network
+requests.
+
+Documents are embedded with sublinear term frequencies only, so their
+embeddings do not change as the corpus grows. Queries are additionally weighted
+with the inverse document frequency of the indexed documents, so rare n-grams
+contribute most to the similarity score. Document frequencies are tracked per
+document, so a document that is indexed again replaces its earlier version and
+a removed document no longer counts.
+"""
+
+import asyncio
+import logging
+import re
+import zlib
+from collections.abc import Iterable
+
+import numpy as np
+
+from custom_components.journal_assistant.vectordb import Embedding
+
+_LOGGER = logging.getLogger(__name__)
+
+__all__ = [
+    "LocalEmbedding",
+]
+
+DEFAULT_DIMENSIONS = 256
+# Number of hashed n-gram features, as a power of two
+FEATURE_BITS = 20
+NGRAM_SIZES = (3, 4, 5)
+# Number of embedding dimensions each feature is projected onto
+PROJECTION_DENSITY = 4
+# Changed whenever the projection changes so that stored embeddings are rebuilt
+PROJECTION_VERSION = 2
+WHITESPACE_RE = re.compile(r"\s+")
+_MULTIPLIERS = np.array(
+    [0x9E3779B1 + 2 * i * 0x85EBCA77 for i in range(PROJECTION_DENSITY)],
+    dtype=np.uint64,
+)
+
+
+def _features(text: str) -> tuple[np.ndarray, np.ndarray]:
+    """Return the hashed n-gram features of the text and their counts."""
+    normalized = f" {WHITESPACE_RE.sub(' ', text.lower()).strip()} "
+    hashes = [
+        zlib.crc32(normalized[i : i + size].encode())
+        for size in NGRAM_SIZES
+        for i in range(len(normalized) - size + 1)
+    ]
+    if not hashes:
+        return np.zeros(0, dtype=np.uint64), np.zeros(0)
+    features = np.array(hashes, dtype=np.uint64) & ((1 << FEATURE_BITS) - 1)
+    unique, counts = np.unique(features, return_counts=True)
+    return unique, counts.astype(np.float64)
+
+
+class LocalEmbedding:
+    """Embed text with hashed character n-grams and a random projection."""
+
+    def __init__(self, dimensions: int = DEFAULT_DIMENSIONS) -> None:
+        """Initialize the local embedding model."""
+        self._dimensions = dimensions
+        self._document_features: dict[str, np.ndarray] = {}
+        self._document_frequency = np.zeros(1 << FEATURE_BITS, dtype=np.int32)
+
+    @property
+    def name(self) -> str:
+        """Return a name identifying the embeddings produced by this model."""
+        return (
+            f"local/char-ngram-v{PROJECTION_VERSION}-{FEATURE_BITS}-{self._dimensions}"
+        )
+
+    @property
+    def documents(self) -> int:
+        """Return the number of documents counted in the document frequencies."""
+        return len(self._document_features)
+
+    async def async_update_documents(self, documents: dict[str, str]) -> None:
+        """Count the n-grams of indexed documents in the document frequencies.
+
+        The documents are keyed by uid and replace any earlier version of the
+        same document.
+        """
+        loop = asyncio.get_running_loop()
+        document_features = await loop.run_in_executor(
+            None,
+            lambda: {uid: _features(text)[0] for uid, text in documents.items()},
+        )
+        for uid, features in document_features.items():
+            if (previous := self._document_features.get(uid)) is not None:
+                self._document_frequency[previous] -= 1
+            self._document_features[uid] = features.astype(np.uint32)
+            self._document_frequency[features] += 1
+
+    async def async_remove_documents(self, uids: Iterable[str]) -> None:
+        """Remove the n-grams of documents from the document frequencies."""
+        for uid in uids:
+            if (previous := self._document_features.pop(uid, None)) is not None:
+                self._document_frequency[previous] -= 1
+
+    def _project(self, features: np.ndarray, weights: np.ndarray) -> np.ndarray:
+        """Project weighted features into a normalized dense embedding."""
+        embedding = np.zeros(self._dimensions)
+        if len(features):
+            # Multiply-shift hashing: the dimension comes from the high bits of
+            # each mixed hash, which depend on all bits of the feature, and the
+            # sign from the next bit below them.
+            mixed = (features[:, None] * _MULTIPLIERS) & np.uint64(0xFFFFFFFF)
+            scaled = mixed * np.uint64(self._dimensions)
+            indices = (scaled >> np.uint64(32)).astype(np.intp)
+            signs = np.where(scaled & np.uint64(0x80000000), 1.0, -1.0)
+            np.add.at(embedding, indices, signs * weights[:, None])
+        if (norm := np.linalg.norm(embedding)) > 0:
+            embedding /= norm
+        return embedding
+
+    def _embed_documents(self, texts: list[str]) -> list[Embedding]:
+        """Embed documents, which performs blocking CPU work."""
+        embeddings = []
+        for text in texts:
+            features, counts = _features(text)
+            embeddings.append(
+                Embedding(embedding=self._project(features, 1 + np.log(counts)))
+            )
+        return embeddings
+
+    def embed_query(self, text: str) -> Embedding:
+        """Embed a search query weighted by inverse document frequency."""
+        features, counts = _features(text)
+        document_frequency = self._document_frequency[features]
+        idf = np.log((1 + self.documents) / (1 + document_frequency)) + 1
+        return Embedding(embedding=self._project(features, (1 + np.log(counts)) * idf))
+
+    async def embed_document_async(self, texts: list[str]) -> list[Embedding]:
+        """Embed documents, which does not change the document frequencies."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._embed_documents, texts)
+
+    async def embed_query_async(self, texts: list[str]) -> list[Embedding]:
+        """Embed search queries, which are small enough to embed in the event loop."""
+        return [self.embed_query(text) for text in texts]
@@ -1,11 +1,13 @@
 """Journal Assistant vector search database."""
 
+import dataclasses
 import itertools
 import logging
 import asyncio
 import json
-from typing import Any
+from typing import Any, Protocol
 import pathlib
+from collections.abc import Iterable
 
 import numpy as np
 
@@ -16,6 +18,7 @@ from custom_components.journal_assistant.vectordb import (
     QueryResult,
     Embedding,
     EmbeddingFunction,
+    DocumentFunction,
 )
 
 _LOGGER = logging.getLogger(__name__)
@@ -27,15 +30,46 @@ MODEL = "models/text-embedding-004"
 EMPTY_QUERY = "task"  # Arbitrary query to use when no query is provided
 
 
+class DocumentStatistics(Protocol):
+    """Statistics of the indexed documents used by an embedding model."""
+
+    async def async_update_documents(self, documents: dict[str, str]) -> None:
+        """Update the statistics with the content of documents keyed by uid."""
+
+    async def async_remove_documents(self, uids: Iterable[str]) -> None:
+        """Remove documents from the statistics."""
+
+
 class LocalVectorDB(VectorDB):
-    """Local vector search database."""
+    """Local vector search database.
+
+    When a `document_fn` is provided the document content is not kept in memory
+    or persisted and is only loaded for the documents returned by a query.
+
+    The store is tagged with the `embedding_model` that produced its embeddings.
+    A store created by a different model is discarded when loaded, so that its
+    documents are embedded again and embeddings from different models are
+    never compared. For models that learn from the indexed documents, every
+    upserted document is passed to the `document_statistics`, including ones
+    whose embeddings are unchanged, so the statistics are rebuilt from the
+    current documents each time the index is loaded. Documents that no longer
+    exist are removed from the index and the statistics with `prune_index`.
+    """
 
     def __init__(
-        self, index_fn: EmbeddingFunction, query_fn: EmbeddingFunction
+        self,
+        index_fn: EmbeddingFunction,
+        query_fn: EmbeddingFunction,
+        document_fn: DocumentFunction | None = None,
+        embedding_model: str = MODEL,
+        document_statistics: DocumentStatistics | None = None,
     ) -> None:
         """Initialize the vector database."""
         self._index_fn = index_fn
         self._query_fn = query_fn
+        self._document_fn = document_fn
+        self._embedding_model = embedding_model
+        self._document_statistics = document_statistics
         self._documents: dict[str, IndexableDocument] = {}
         self._embeddings: dict[str, Embedding] = {}
 
@@ -57,8 +91,18 @@ class LocalVectorDB(VectorDB):
         data = await loop.run_in_executor(None, _load_store)
         if data is None:
             return
+        # Stores written before they were tagged used the default model
+        if (embedding_model := data.get("embedding_model", MODEL)) != (
+            self._embedding_model
+        ):
+            _LOGGER.info(
+                "Discarding embeddings from %s to index with %s",
+                embedding_model,
+                self._embedding_model,
+            )
+            return
         self._documents = {
-            uid: IndexableDocument.from_dict(document)
+            uid: self._strip_document(IndexableDocument.from_dict(document))
             for uid, document in data["documents"].items()
         }
         self._embeddings = {
@@ -76,7 +120,8 @@ class LocalVectorDB(VectorDB):
             with path.open("w") as file:
                 json.dump(data, file)
 
-        data = {
+        data: dict[str, Any] = {
+            "embedding_model": self._embedding_model,
             "documents": {
                 uid: document.to_dict(omit_none=True)
                 for uid, document in self._documents.items()
@@ -92,6 +137,10 @@ class LocalVectorDB(VectorDB):
     async def upsert_index(self, documents: list[IndexableDocument]) -> None:
         """Add notebooks to the index."""
         _LOGGER.debug("Upserting %d documents in the index", len(documents))
+        if self._document_statistics is not None:
+            await self._document_statistics.async_update_documents(
+                {document.uid: document.document for document in documents}
+            )
 
         embed_docs: list[IndexableDocument] = []
         for document in documents:
@@ -103,9 +152,44 @@ class LocalVectorDB(VectorDB):
 
         embeddings = await self._index_fn([doc.document for doc in embed_docs])
         for document, embedding in zip(embed_docs, embeddings):
-            self._documents[document.uid] = document
+            self._documents[document.uid] = self._strip_document(document)
             self._embeddings[document.uid] = embedding
 
+    async def prune_index(self, uids: set[str]) -> int:
+        """Remove all documents except the specified ones from the index.
+
+        Returns the number of documents removed.
+        """
+        removed = self._documents.keys() - uids
+        for uid in removed:
+            del self._documents[uid]
+            self._embeddings.pop(uid, None)
+        if removed and self._document_statistics is not None:
+            await self._document_statistics.async_remove_documents(removed)
+        return len(removed)
+
+    def _strip_document(self, document: IndexableDocument) -> IndexableDocument:
+        """Drop the document content if it can be loaded on demand."""
+        if self._document_fn is None or not document.document:
+            return document
+        return dataclasses.replace(document, document="")
+
+    async def _load_documents(self, results: list[QueryResult]) -> list[QueryResult]:
+        """Load the document content for the query results."""
+        if self._document_fn is None or not results:
+            return results
+        contents = await self._document_fn([result.document.uid for result in results])
+        return [
+            dataclasses.replace(
+                result,
+                document=dataclasses.replace(
+                    result.document,
+                    document=contents.get(result.document.uid, ""),
+                ),
+            )
+            for result in results
+        ]
+
     async def count(self) -> int:
         """Return the number of documents in the collection."""
         return len(self._documents)
@@ -153,6 +237,6 @@ class LocalVectorDB(VectorDB):
             ),
             key=lambda result: result.score,
         )
-        return list(
-            itertools.islice(distances, params.num_results or DEFAULT_MAX_RESULTS)
+        return await self._load_documents(
+            list(itertools.islice(distances, params.num_results or DEFAULT_MAX_RESULTS))
         )
@@ -0,0 +1,181 @@
+"""Helpers for streaming work between blocking and async pipeline stages."""
+
+import asyncio
+import itertools
+import logging
+from collections.abc import AsyncGenerator, Awaitable, Callable, Iterator
+from dataclasses import dataclass
+from typing import Any
+
+_LOGGER = logging.getLogger(__name__)
+
+__all__ = [
+    "Stage",
+    "StageConfig",
+    "async_buffered_iterator",
+]
+
+DEFAULT_QUEUE_SIZE = 2
+DEFAULT_RETRY_DELAY = 1.0
+
+
+async def async_buffered_iterator[T](
+    iterator: Iterator[T], maxsize: int | None = None
+) -> AsyncGenerator[T]:
+    """Consume a blocking iterator in an executor through a bounded queue.
+
+    The iterator runs ahead of the consumer by at most `maxsize` items, so the
+    blocking stage (e.g. reading files) overlaps with the async stage (e.g.
+    calling an API) while peak memory is bounded by the queue size.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue[T] = asyncio.Queue(maxsize or DEFAULT_QUEUE_SIZE)
+
+    def _produce() -> None:
+        try:
+            for item in iterator:
+                asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+        except asyncio.QueueShutDown:
+            _LOGGER.debug("Consumer stopped before the iterator was exhausted")
+        finally:
+            loop.call_soon_threadsafe(queue.shutdown)
+
+    producer = loop.run_in_executor(None, _produce)
+    try:
+        while True:
+            try:
+                item = await queue.get()
+            except asyncio.QueueShutDown:
+                break
+            yield item
+    finally:
+        # Unblock the producer if it is waiting for space in the queue
+        queue.shutdown(immediate=True)
+        await producer
+
+
+@dataclass(frozen=True)
+class StageConfig:
+    """Concurrency, buffering and retry settings for a pipeline stage."""
+
+    concurrency: int = 1
+    """Number of workers processing items from the queue."""
+
+    queue_size: int = DEFAULT_QUEUE_SIZE
+    """Maximum number of items waiting in the queue, or 0 for unbounded."""
+
+    retries: int = 0
+    """Number of times to retry an item when the handler fails."""
+
+    retry_delay: float = DEFAULT_RETRY_DELAY
+    """Initial delay in seconds between retries, doubled on each attempt."""
+
+
+class Stage[T]:
+    """A pipeline stage where workers consume items from a bounded queue.
+
+    Producers block when the queue is full, which applies backpressure to the
+    previous stage rather than buffering an unbounded amount of work. Failures
+    matching `retry_on` are retried with exponential backoff, and items that
+    still fail are passed to `on_error`.
+
+    Items are processed in the order they were added, unless a `priority`
+    function is provided in which case items with the lowest priority value
+    are processed first.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        handler: Callable[[T], Awaitable[None]],
+        config: StageConfig,
+        on_error: Callable[[T, Exception], None],
+        retry_on: tuple[type[Exception], ...] = (Exception,),
+        priority: Callable[[T], Any] | None = None,
+    ) -> None:
+        """Initialize the stage."""
+        self.name = name
+        self._handler = handler
+        self._config = config
+        self._on_error = on_error
+        self._retry_on = retry_on
+        self._priority = priority
+        # Entries are (priority, sequence, item) so that items with the same
+        # priority are processed in the order they were added.
+        self._queue: asyncio.Queue[tuple[Any, int, T]] = (
+            asyncio.PriorityQueue(config.queue_size)
+            if priority
+            else asyncio.Queue(config.queue_size)
+        )
+        self._sequence = itertools.count()
+        self._workers: list[asyncio.Task[None]] = []
+
+    @property
+    def queue_depth(self) -> int:
+        """Return the number of items waiting to be processed."""
+        return self._queue.qsize()
+
+    def start(self) -> None:
+        """Start the stage workers."""
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"{self.name}-{i}")
+            for i in range(self._config.concurrency)
+        ]
+
+    async def put(self, item: T) -> None:
+        """Add an item to the stage, waiting while the queue is full."""
+        priority = self._priority(item) if self._priority else 0
+        await self._queue.put((priority, next(self._sequence), item))
+
+    async def join(self) -> None:
+        """Wait until all items added to the stage have been processed."""
+        await self._queue.join()
+
+    def shutdown(self) -> None:
+        """Cancel the stage workers, discarding any items still in the queue."""
+        self._queue.shutdown(immediate=True)
+        for worker in self._workers:
+            worker.cancel()
+
+    async def stop(self) -> None:
+        """Cancel the stage workers and wait for them to exit."""
+        self.shutdown()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def _worker(self) -> None:
+        """Process items from the queue until the stage is stopped."""
+        while True:
+            try:
+                _, _, item = await self._queue.get()
+            except asyncio.QueueShutDown:
+                return
+            try:
+                await self._handle(item)
+            finally:
+                self._queue.task_done()
+
+    async def _handle(self, item: T) -> None:
+        """Invoke the handler for an item, retrying on failure."""
+        delay = self._config.retry_delay
+        for attempt in range(self._config.retries + 1):
+            try:
+                await self._handler(item)
+            except Exception as err:  # noqa: BLE001
+                if (
+                    not isinstance(err, self._retry_on)
+                    or attempt == self._config.retries
+                ):
+                    self._on_error(item, err)
+                    return
+                _LOGGER.debug(
+                    "Stage %s failed (attempt %d), retrying in %ss: %s",
+                    self.name,
+                    attempt + 1,
+                    delay,
+                    err,
+                )
+                await asyncio.sleep(delay)
+                delay *= 2
+            else:
+                return
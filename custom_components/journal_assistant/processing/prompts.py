@@ -1,9 +1,19 @@
-"""Module for loading and managing prompts."""
+"""Module for loading and managing prompts.
 
+The system prompts for each note prefix are compiled once into the final
+instruction text sent to the model, along with a fingerprint of that text. The
+prompt files are checked for changes periodically and recompiled when edited,
+so prompt changes take effect without a restart.
+"""
+
+import hashlib
 import logging
-from functools import cache
 import re
 import datetime
+import os
+import threading
+import time
+from dataclasses import dataclass
 from pathlib import Path
 
 from .model import DynamicPrompt
@@ -31,6 +41,11 @@ FILE_PREFIX_PROMPT_MAP = {
     ],
 }
 
+# Seconds between checks of the prompt files for changes
+CHECK_INTERVAL = 30
+# Key of the compiled prompt used for pages without a known note prefix
+_DEFAULT_KEY = ""
+
 TIMESTAMP_RE = re.compile(r".*?-\d+-P(\d{20}).*")
 
 FILE_PROMPT = """Please answer in json with no other formatting since the answer will be parsed programmatically.
@@ -41,30 +56,115 @@ Content:
 """
 
 
-@cache
-def _load_dynamic_prompts() -> dict[str, DynamicPrompt]:
-    """Load all dynamic prompts from the prompts directory."""
+@dataclass(frozen=True)
+class CompiledPrompt:
+    """The system instruction sent to the model for a note prefix."""
+
+    prompts: list[DynamicPrompt]
+    """The dynamic prompts the instruction was compiled from."""
+
+    system_instruction: list[str]
+    """The instruction text for each dynamic prompt."""
+
+    fingerprint: str
+    """A hash of the instruction text that changes when any prompt changes."""
+
+
+def _compile(prompts: list[DynamicPrompt]) -> CompiledPrompt:
+    """Compile the dynamic prompts into the final system instruction."""
+    system_instruction = [prompt.as_prompt() for prompt in prompts]
+    fingerprint = hashlib.sha256()
+    for text in system_instruction:
+        fingerprint.update(text.encode())
+        fingerprint.update(b"\0")
+    return CompiledPrompt(
+        prompts=prompts,
+        system_instruction=system_instruction,
+        fingerprint=fingerprint.hexdigest()[:16],
+    )
+
+
+def note_prefix(page_filename: Path) -> str:
+    """Return the note prefix used to select prompts for a page."""
+    return page_filename.stem.split("-")[0]
+
 
-    dynamic_prompts = {}
-    for filename in DYNAMIC_PROMPTS_DIR.glob("*.yaml"):
-        _LOGGER.info(f"Loading dynamic prompt: {filename}")
-        dynamic_prompts[filename.stem] = DynamicPrompt.from_file(filename)
-    return dynamic_prompts
+class PromptRegistry:
+    """Compiled system prompts for each note prefix.
+
+    Prompts are compiled when first used and recompiled when the modification
+    time or size of the prompt files change.
+    """
+
+    def __init__(self, prompts_dir: Path = DYNAMIC_PROMPTS_DIR) -> None:
+        """Initialize the prompt registry."""
+        self._prompts_dir = prompts_dir
+        self._lock = threading.Lock()
+        self._signature: dict[str, tuple[int, int]] | None = None
+        self._compiled: dict[str, CompiledPrompt] = {}
+        self._checked = 0.0
+
+    @property
+    def stale(self) -> bool:
+        """Return True if the prompt files are due to be checked for changes."""
+        return not self._compiled or time.monotonic() - self._checked > CHECK_INTERVAL
+
+    def get(self, page_filename: Path) -> CompiledPrompt:
+        """Return the compiled prompt for a page, which may perform blocking I/O.
+
+        The prompt files are only read when they have changed, so this is cheap
+        to call when the registry is not stale.
+        """
+        if self.stale:
+            self.reload_if_changed()
+        if (compiled := self._compiled.get(note_prefix(page_filename))) is None:
+            compiled = self._compiled[_DEFAULT_KEY]
+        return compiled
+
+    def reload_if_changed(self) -> bool:
+        """Recompile the prompts if the prompt files have changed."""
+        with self._lock:
+            self._checked = time.monotonic()
+            signature = {}
+            for filename in self._prompts_dir.glob("*.yaml"):
+                stat = os.stat(filename)
+                signature[filename.name] = (stat.st_mtime_ns, stat.st_size)
+            if signature == self._signature:
+                return False
+            self._load()
+            self._signature = signature
+            return True
+
+    def _load(self) -> None:
+        """Load and compile all prompts from the prompts directory."""
+        dynamic_prompts = {}
+        for filename in sorted(self._prompts_dir.glob("*.yaml")):
+            _LOGGER.info("Loading dynamic prompt: %s", filename)
+            dynamic_prompts[filename.stem] = DynamicPrompt.from_file(filename)
+
+        def _select(prompt_names: list[str]) -> CompiledPrompt:
+            return _compile(
+                [
+                    value
+                    for prompt_prefix in prompt_names
+                    for key, value in dynamic_prompts.items()
+                    if key.startswith(prompt_prefix)
+                ]
+            )
+
+        self._compiled = {
+            prefix: _select(prompt_names)
+            for prefix, prompt_names in FILE_PREFIX_PROMPT_MAP.items()
+        }
+        self._compiled[_DEFAULT_KEY] = _select(DEFAULT)
+
+
+PROMPT_REGISTRY = PromptRegistry()
 
 
 def get_dynamic_prompts(page_filename: Path) -> list[DynamicPrompt]:
     """Get a set of prompts that match the given prefix"""
-
-    page_name = page_filename.stem
-    prefix = page_name.split("-")[0]
-    prompt_names = FILE_PREFIX_PROMPT_MAP.get(prefix, DEFAULT)
-    dynamic_prompts = _load_dynamic_prompts()
-    return [
-        value
-        for prompt_prefix in prompt_names
-        for key, value in dynamic_prompts.items()
-        if key.startswith(prompt_prefix)
-    ]
+    return PROMPT_REGISTRY.get(page_filename).prompts
 
 
 def get_file_prompt(path: Path) -> str:
@@ -0,0 +1,197 @@
+"""Client side rate limiting for model API requests.
+
+Model APIs enforce a quota on the number of requests and the number of tokens
+per minute. The rate limiter uses a token bucket for each quota so that many
+requests can run concurrently up to the quota ceiling, without sending requests
+that will be rejected. When the API rejects a request anyway, the limiter pauses
+and lowers its rates, then gradually recovers as requests succeed.
+"""
+
+import asyncio
+import logging
+import time
+from collections.abc import AsyncGenerator, Callable
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+
+_LOGGER = logging.getLogger(__name__)
+
+__all__ = [
+    "RateLimit",
+    "RateLimiter",
+    "TokenBucket",
+]
+
+# Fraction of the configured rate to drop to when the API rejects a request
+THROTTLE_FACTOR = 0.5
+# Rates never drop below this fraction of the configured rate
+MIN_RATE_SCALE = 0.1
+# Fraction of the configured rate restored after each successful request
+RECOVERY_STEP = 0.05
+# Seconds to pause when the API does not say when to retry
+DEFAULT_THROTTLE_DELAY = 10.0
+
+
+class TokenBucket:
+    """A bucket that is refilled continuously at a fixed rate up to its capacity."""
+
+    def __init__(
+        self,
+        rate_per_minute: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Initialize a full token bucket that holds one minute of tokens."""
+        self._clock = clock
+        self._capacity = rate_per_minute
+        self._rate = rate_per_minute / 60
+        self._tokens = rate_per_minute
+        self._updated = clock()
+
+    @property
+    def rate_per_minute(self) -> float:
+        """Return the rate the bucket is refilled at."""
+        return self._rate * 60
+
+    @rate_per_minute.setter
+    def rate_per_minute(self, value: float) -> None:
+        """Change the rate the bucket is refilled at, keeping its capacity."""
+        self._refill()
+        self._rate = value / 60
+
+    def delay(self, amount: float) -> float:
+        """Return the seconds until the amount of tokens is available.
+
+        Amounts larger than the capacity only wait for a full bucket, so that
+        an unusually large request can still be sent.
+        """
+        self._refill()
+        missing = min(amount, self._capacity) - self._tokens
+        return max(0.0, missing / self._rate)
+
+    def consume(self, amount: float) -> None:
+        """Remove tokens from the bucket, which may go into debt."""
+        self._refill()
+        self._tokens -= amount
+
+    def drain(self) -> None:
+        """Remove all available tokens from the bucket."""
+        self._refill()
+        self._tokens = min(self._tokens, 0.0)
+
+    def _refill(self) -> None:
+        """Add the tokens accumulated since the last update."""
+        now = self._clock()
+        self._tokens = min(
+            self._capacity, self._tokens + (now - self._updated) * self._rate
+        )
+        self._updated = now
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """Quota for requests to a model API."""
+
+    requests_per_minute: int
+    """Maximum number of requests sent per minute."""
+
+    tokens_per_minute: int
+    """Maximum number of input tokens sent per minute."""
+
+    max_concurrency: int = 4
+    """Maximum number of requests in flight at the same time."""
+
+
+class _Request:
+    """A request admitted by the rate limiter."""
+
+    def __init__(self, limiter: "RateLimiter", estimated_tokens: int) -> None:
+        """Initialize the request."""
+        self._limiter = limiter
+        self._estimated_tokens = estimated_tokens
+        self.throttled = False
+
+    def used(self, tokens: int) -> None:
+        """Correct the token bucket with the tokens the request actually used."""
+        self._limiter.tokens.consume(tokens - self._estimated_tokens)
+        self._estimated_tokens = tokens
+
+    def throttle(self, retry_after: float | None = None) -> None:
+        """Report that the API rejected the request for exceeding the quota."""
+        self.throttled = True
+        self._limiter.throttle(retry_after)
+
+
+class RateLimiter:
+    """Admit concurrent requests within the request and token quotas.
+
+    Requests are admitted in the order they arrive.
+    """
+
+    def __init__(
+        self,
+        limit: RateLimit,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Initialize the rate limiter."""
+        self._limit = limit
+        self._clock = clock
+        self.requests = TokenBucket(limit.requests_per_minute, clock)
+        self.tokens = TokenBucket(limit.tokens_per_minute, clock)
+        self._semaphore = asyncio.Semaphore(limit.max_concurrency)
+        self._lock = asyncio.Lock()
+        self._scale = 1.0
+        self._paused_until = 0.0
+
+    @property
+    def limit(self) -> RateLimit:
+        """Return the configured quota."""
+        return self._limit
+
+    @property
+    def scale(self) -> float:
+        """Return the fraction of the configured rates currently in use."""
+        return self._scale
+
+    @asynccontextmanager
+    async def request(self, estimated_tokens: int) -> AsyncGenerator[_Request]:
+        """Wait until a request using the estimated tokens is within the quota."""
+        async with self._semaphore:
+            async with self._lock:
+                while (
+                    delay := max(
+                        self._paused_until - self._clock(),
+                        self.requests.delay(1),
+                        self.tokens.delay(estimated_tokens),
+                    )
+                ) > 0:
+                    _LOGGER.debug("Rate limited, waiting %.2fs", delay)
+                    await asyncio.sleep(delay)
+                self.requests.consume(1)
+                self.tokens.consume(estimated_tokens)
+            request = _Request(self, estimated_tokens)
+            yield request
+            if not request.throttled:
+                self._recover()
+
+    def throttle(self, retry_after: float | None = None) -> None:
+        """Pause requests and lower the rates after the API rejected a request."""
+        delay = DEFAULT_THROTTLE_DELAY if retry_after is None else retry_after
+        self._paused_until = max(self._paused_until, self._clock() + delay)
+        self.requests.drain()
+        self._set_scale(max(MIN_RATE_SCALE, self._scale * THROTTLE_FACTOR))
+        _LOGGER.info(
+            "Model API quota exceeded, pausing for %.1fs at %d%% of the rate limit",
+            delay,
+            self._scale * 100,
+        )
+
+    def _recover(self) -> None:
+        """Gradually restore the configured rates after a successful request."""
+        if self._scale < 1.0:
+            self._set_scale(min(1.0, self._scale + RECOVERY_STEP))
+
+    def _set_scale(self, scale: float) -> None:
+        """Apply a fraction of the configured rates to the token buckets."""
+        self._scale = scale
+        self.requests.rate_per_minute = self._limit.requests_per_minute * scale
+        self.tokens.rate_per_minute = self._limit.tokens_per_minute * scale
@@ -1,21 +1,29 @@
 """Multi-modal vision model for processing journal pages."""
 
 import asyncio
+import dataclasses
+import hashlib
 import re
 import logging
-import json
-import yaml
 import datetime
+import json
+from abc import ABC, abstractmethod
+from http import HTTPStatus
 from pathlib import Path
-from typing import Any, cast
+from types import NoneType, UnionType
+from typing import Any, Union, cast, get_args, get_origin, get_type_hints
 
+import httpx
 import numpy as np
 from google import genai
-from google.genai import types
+from google.genai import errors, types
 from mashumaro.exceptions import MissingField
 
-from .prompts import get_dynamic_prompts
+from .batch import BatchBackend, BatchJobError, BatchRequest
+from .prompts import PROMPT_REGISTRY, CompiledPrompt, PromptRegistry
+from .image import ImageOptions, preprocess_image
 from .model import JournalPage
+from .rate_limit import RateLimit, RateLimiter
 from custom_components.journal_assistant.vectordb import Embedding
 
 
@@ -30,90 +38,633 @@ Filename: {filename}
 Created At: {created_at}
 Content:
 """
+PACKED_PROMPT = """
+This request contains {count} journal pages. Each page image follows its own
+filename and creation time. Answer with a json list containing one journal page
+for each image, using the filename given for that image.
+"""
 EXTRACT_JSON = re.compile("```json\n(.*?)\n```", re.DOTALL)
 
 EMBED_MODEL = "models/text-embedding-004"
 
+# Estimated input tokens for a page image, corrected after each request using
+# the token count reported by the API.
+PAGE_IMAGE_TOKENS = 1600
+# Approximate number of characters per token for estimating prompt size
+CHARS_PER_TOKEN = 4
+# Number of times a request rejected for exceeding the quota is retried
+MAX_RATE_LIMIT_RETRIES = 3
+# Cached system prompts expire after this long unless they are renewed
+CONTEXT_CACHE_TTL = datetime.timedelta(hours=1)
+# Cached system prompts in use are renewed when they expire within this time
+CONTEXT_CACHE_RENEW = datetime.timedelta(minutes=10)
+# Errors creating a cached system prompt that will not succeed when retried,
+# e.g. the prompt is below the minimum size or caching is not supported.
+CONTEXT_CACHE_UNSUPPORTED = (
+    HTTPStatus.BAD_REQUEST,
+    HTTPStatus.FORBIDDEN,
+    HTTPStatus.NOT_FOUND,
+)
+BATCH_DISPLAY_NAME = "journal-assistant-backfill"
+RETRY_DELAY_RE = re.compile(r"^(\d+(?:\.\d+)?)s$")
+
+
+def _response_schema(annotation: Any) -> types.Schema:
+    """Return the response schema for a type used in the journal data model."""
+    nullable = False
+    if get_origin(annotation) in (Union, UnionType):
+        args = get_args(annotation)
+        nullable = NoneType in args
+        # Fields that accept several types are answered with the first type
+        annotation = next(arg for arg in args if arg is not NoneType)
+    if dataclasses.is_dataclass(annotation):
+        hints = get_type_hints(annotation)
+        fields = dataclasses.fields(annotation)
+        return types.Schema(
+            type=types.Type.OBJECT,
+            nullable=nullable or None,
+            properties={
+                field.name: _response_schema(hints[field.name]) for field in fields
+            },
+            required=[
+                field.name
+                for field in fields
+                if field.default is dataclasses.MISSING
+                and field.default_factory is dataclasses.MISSING
+            ],
+            property_ordering=[field.name for field in fields],
+        )
+    if get_origin(annotation) is list:
+        return types.Schema(
+            type=types.Type.ARRAY,
+            nullable=nullable or None,
+            items=_response_schema(get_args(annotation)[0]),
+        )
+    schema_type = {
+        bool: types.Type.BOOLEAN,
+        int: types.Type.INTEGER,
+        float: types.Type.NUMBER,
+    }.get(annotation, types.Type.STRING)
+    return types.Schema(type=schema_type, nullable=nullable or None)
+
+
+# The model is constrained to answer with a journal page so the response can be
+# decoded directly into the data model.
+JOURNAL_PAGE_SCHEMA = _response_schema(JournalPage)
+JOURNAL_PAGES_SCHEMA = types.Schema(type=types.Type.ARRAY, items=JOURNAL_PAGE_SCHEMA)
+
+
+def _generation_config(
+    response_schema: types.Schema = JOURNAL_PAGE_SCHEMA, **kwargs: Any
+) -> types.GenerateContentConfig:
+    """Return the config for a request that extracts journal pages."""
+    return types.GenerateContentConfig(
+        response_mime_type="application/json",
+        response_schema=response_schema,
+        **kwargs,
+    )
 
-def _parse_model_response(response_text: str) -> str:
-    """Parse the response from the model and return a yaml string."""
 
-    if (match := EXTRACT_JSON.match(response_text)) is not None:
-        text = match.group(1)
-    else:
-        text = response_text
+def _page_created_at(page_name: Path) -> datetime.datetime:
+    """Return the creation time encoded in a page filename."""
+    if (re_match := TIMESTAMP_RE.match(str(page_name))) is None:
+        raise ValueError(f"Error extracting timestamp from {str(page_name)}")
+    _LOGGER.debug("Timestamp match: %s", re_match.group(1))
+    return datetime.datetime.strptime(re_match.group(1), "%Y%m%d%H%M%S%f")
 
+
+def _parse_journal_page(response_text: str) -> JournalPage:
+    """Decode a journal page from the model's JSON response text."""
+    if response_text.startswith("```") and (match := EXTRACT_JSON.match(response_text)):
+        # Responses are plain JSON, but tolerate a fenced code block
+        response_text = match.group(1)
+    try:
+        return JournalPage.from_json(response_text)
+    except (ValueError, TypeError, MissingField) as err:
+        raise ValueError(f"Error parsing journal page: {err}") from err
+
+
+def _parse_journal_pages(response_text: str) -> dict[str, JournalPage]:
+    """Decode the journal pages in a packed response, keyed by filename stem."""
     try:
-        obj = json.loads(text)
-    except ValueError as err:
-        _LOGGER.error("Error processing: %s", err)
-        return text
+        items = json.loads(response_text)
+        if not isinstance(items, list):
+            raise TypeError(f"Expected a list of journal pages, got {type(items)}")
+        pages = [JournalPage.from_dict(item) for item in items]
+    except (ValueError, TypeError, MissingField) as err:
+        raise ValueError(f"Error parsing journal pages: {err}") from err
+    return {Path(page.filename).stem: page for page in pages}
+
+
+class ExtractionCache(ABC):
+    """A content-addressed cache of journal pages extracted by the vision model."""
+
+    @abstractmethod
+    async def async_get(self, key: str) -> JournalPage | None:
+        """Return the journal page previously extracted for the key, if any."""
+
+    @abstractmethod
+    async def async_put(self, key: str, journal_page: JournalPage) -> None:
+        """Store the journal page extracted for the key."""
+
+
+def extraction_cache_key(
+    page_content: bytes,
+    prompt_fingerprint: str,
+    model: str,
+    image_options: ImageOptions | None = None,
+) -> str:
+    """Return the cache key for extracting a page image with a prompt and model.
+
+    The per-file prompt is excluded since it only contains the filename and
+    creation time, which are replaced on a cache hit.
+    """
+    fingerprint = hashlib.sha256(f"{model}\0{prompt_fingerprint}".encode())
+    if image_options is not None:
+        fingerprint.update(repr(image_options).encode())
+    image_hash = hashlib.sha256(page_content).hexdigest()
+    return f"{image_hash}:{fingerprint.hexdigest()[:16]}"
 
-    for k, v in list(obj.items()):
-        if v is None or v == "null":
-            del obj[k]
 
-    return yaml.dump(obj, explicit_start=True, sort_keys=False)
+def _retry_delay(err: errors.APIError) -> float | None:
+    """Return the delay requested by the API before retrying, if any."""
+    if not isinstance(err.details, dict):
+        return None
+    for detail in err.details.get("error", {}).get("details", ()):
+        if not str(detail.get("@type", "")).endswith("RetryInfo"):
+            continue
+        if (match := RETRY_DELAY_RE.match(str(detail.get("retryDelay", "")))) is None:
+            continue
+        return float(match.group(1))
+    return None
+
+
+@dataclasses.dataclass
+class BatchSubmission:
+    """Journal pages submitted to a batch job."""
+
+    name: str | None = None
+    """The name of the batch job, or None if every page was cached."""
+
+    cache_keys: dict[str, str | None] = dataclasses.field(default_factory=dict)
+    """The extraction cache key of each submitted page by filename, in order."""
+
+    cached: dict[str, JournalPage] = dataclasses.field(default_factory=dict)
+    """Journal pages found in the extraction cache by filename."""
+
+
+@dataclasses.dataclass
+class _PackedPage:
+    """A page waiting to be packed into a request with other pages."""
+
+    name: Path
+    content: bytes
+    created_at: datetime.datetime
+    cache_key: str | None
+
+
+@dataclasses.dataclass
+class _CachedPrompt:
+    """A handle to a system prompt stored with the model API's context cache."""
+
+    name: str
+    expire_time: datetime.datetime
 
 
 class VisionModel:
     """Multi-modal vision model for processing journal pages."""
 
-    def __init__(self, client: genai.Client, model: str) -> None:
-        """Initialize the vision model."""
+    def __init__(
+        self,
+        client: genai.Client,
+        model: str,
+        rate_limit: RateLimit | None = None,
+        cache: ExtractionCache | None = None,
+        image_options: ImageOptions | None = None,
+        prompt_registry: PromptRegistry = PROMPT_REGISTRY,
+        context_caching: bool = False,
+        batch_backend: BatchBackend | None = None,
+    ) -> None:
+        """Initialize the vision model.
+
+        When a rate limit is provided, pages processed concurrently are sent to
+        the model as fast as the quota allows. When a cache is provided, a page
+        image is only sent to the model once for the same prompt and model.
+        When image options are provided, page images are preprocessed locally
+        to reduce their size before they are sent. When context caching is
+        enabled, each compiled system prompt is stored once with the model API
+        and referenced by each request instead of being sent inline. When a
+        batch backend is provided, pages may be submitted as batch jobs.
+        """
         self._client = client
         self._model = model
+        self._rate_limiter = RateLimiter(rate_limit) if rate_limit else None
+        self._cache = cache
+        self._image_options = image_options
+        self._prompt_registry = prompt_registry
+        self._context_caching = context_caching
+        self._cached_prompts: dict[str, _CachedPrompt] = {}
+        self._uncacheable_prompts: set[str] = set()
+        self._context_cache_lock = asyncio.Lock()
+        self._batch_backend = batch_backend
+
+    async def async_warm_up(self) -> None:
+        """Open a connection to the model API ahead of the first request."""
+        try:
+            await self._client.aio.models.get(model=self._model)
+        except (errors.APIError, httpx.HTTPError) as err:
+            _LOGGER.debug("Unable to warm up the model API connection: %s", err)
+            return
+        _LOGGER.debug("Warmed up the model API connection")
 
     async def process_journal_page(
         self, page_name: Path, page_content: bytes
     ) -> JournalPage:
         """Process a journal page using a multi-modal vision model.
 
-        The response is typically a yaml content string.
+        The model is asked for a JSON response matching the journal page schema,
+        which is decoded into the returned journal page. Raises a ValueError if
+        the response can't be parsed.
         """
         _LOGGER.debug("Extract content from page %s", str(page_name))
+        created_at = _page_created_at(page_name)
+        prompt = await self._async_compiled_prompt(page_name)
+        cache_key, cached_page = await self._async_cached_page(
+            page_name, created_at, page_content, prompt
+        )
+        if cached_page is not None:
+            return cached_page
 
-        if (re_match := TIMESTAMP_RE.match(str(page_name))) is None:
-            raise ValueError(f"Error extracting timestamp from {str(page_name)}")
-        _LOGGER.debug("Timestamp match: %s", re_match.group(1))
-        created_at = datetime.datetime.strptime(re_match.group(1), "%Y%m%d%H%M%S%f")
+        file_prompt, contents = await self._async_page_contents(
+            page_name, created_at, page_content
+        )
+        prompt_chars = len(file_prompt) + sum(
+            len(text) for text in prompt.system_instruction
+        )
+        estimated_tokens = PAGE_IMAGE_TOKENS + prompt_chars // CHARS_PER_TOKEN
+        text = await self._async_generate(prompt, contents, estimated_tokens)
+        journal_page = _parse_journal_page(text)
+        if self._cache is not None and cache_key is not None:
+            await self._cache.async_put(cache_key, journal_page)
+        return journal_page
+
+    async def process_journal_pages(
+        self, pages: list[tuple[Path, bytes]]
+    ) -> dict[str, JournalPage | ValueError]:
+        """Process several journal pages with as few model requests as possible.
 
-        loop = asyncio.get_event_loop()
-        prompts = await loop.run_in_executor(None, get_dynamic_prompts, page_name)
+        Pages that use the same system prompt are packed into a single request.
+        Pages missing from a packed response, or all of its pages when the
+        response can't be parsed, are processed again one at a time.
+
+        Returns the journal page, or the error processing it, for each page
+        keyed by the page filename.
+        """
+        results: dict[str, JournalPage | ValueError] = {}
+        packs: dict[str, list[_PackedPage]] = {}
+        prompts: dict[str, CompiledPrompt] = {}
+        for page_name, page_content in pages:
+            try:
+                created_at = _page_created_at(page_name)
+            except ValueError as err:
+                results[page_name.name] = err
+                continue
+            prompt = await self._async_compiled_prompt(page_name)
+            cache_key, cached_page = await self._async_cached_page(
+                page_name, created_at, page_content, prompt
+            )
+            if cached_page is not None:
+                results[page_name.name] = cached_page
+                continue
+            prompts[prompt.fingerprint] = prompt
+            packs.setdefault(prompt.fingerprint, []).append(
+                _PackedPage(page_name, page_content, created_at, cache_key)
+            )
 
+        for fingerprint, pack in packs.items():
+            if len(pack) == 1:
+                unpacked = pack
+            else:
+                unpacked = await self._async_process_pack(
+                    prompts[fingerprint], pack, results
+                )
+            for page in unpacked:
+                try:
+                    results[page.name.name] = await self.process_journal_page(
+                        page.name, page.content
+                    )
+                except ValueError as err:
+                    results[page.name.name] = err
+        return results
+
+    async def _async_process_pack(
+        self,
+        prompt: CompiledPrompt,
+        pack: list[_PackedPage],
+        results: dict[str, JournalPage | ValueError],
+    ) -> list[_PackedPage]:
+        """Process pages that use the same system prompt in a single request.
+
+        Returns the pages that were not found in the response.
+        """
+        _LOGGER.debug("Extract content from %d pages in one request", len(pack))
+        parts = [types.Part(text=PACKED_PROMPT.format(count=len(pack)))]
+        prompt_chars = len(parts[0].text or "") + sum(
+            len(text) for text in prompt.system_instruction
+        )
+        for page in pack:
+            file_prompt, contents = await self._async_page_contents(
+                page.name, page.created_at, page.content
+            )
+            parts.extend(contents.parts or ())
+            prompt_chars += len(file_prompt)
+        estimated_tokens = (
+            PAGE_IMAGE_TOKENS * len(pack) + prompt_chars // CHARS_PER_TOKEN
+        )
+        text = await self._async_generate(
+            prompt,
+            types.Content(parts=parts),
+            estimated_tokens,
+            JOURNAL_PAGES_SCHEMA,
+        )
+        try:
+            journal_pages = _parse_journal_pages(text)
+        except ValueError as err:
+            _LOGGER.info("Processing pages one at a time: %s", err)
+            return pack
+
+        missing = []
+        for page in pack:
+            if (journal_page := journal_pages.get(page.name.stem)) is None:
+                _LOGGER.debug("Page %s missing from packed response", page.name)
+                missing.append(page)
+                continue
+            results[page.name.name] = journal_page
+            if self._cache is not None and page.cache_key is not None:
+                await self._cache.async_put(page.cache_key, journal_page)
+        return missing
+
+    async def async_submit_batch(
+        self, pages: list[tuple[Path, bytes]]
+    ) -> BatchSubmission:
+        """Submit journal pages to be processed as a batch job.
+
+        Pages found in the extraction cache are returned instead of being
+        submitted. No job is submitted when every page is cached.
+        """
+        if self._batch_backend is None:
+            raise BatchJobError("Batch jobs are not supported")
+        submission = BatchSubmission()
+        requests = []
+        for page_name, page_content in pages:
+            created_at = _page_created_at(page_name)
+            prompt = await self._async_compiled_prompt(page_name)
+            cache_key, cached_page = await self._async_cached_page(
+                page_name, created_at, page_content, prompt
+            )
+            if cached_page is not None:
+                submission.cached[page_name.name] = cached_page
+                continue
+            submission.cache_keys[page_name.name] = cache_key
+            _, contents = await self._async_page_contents(
+                page_name, created_at, page_content
+            )
+            requests.append(
+                BatchRequest(
+                    contents=contents,
+                    config=_generation_config(
+                        system_instruction=prompt.system_instruction
+                    ),
+                )
+            )
+        if requests:
+            submission.name = await self._batch_backend.submit(
+                self._model, BATCH_DISPLAY_NAME, requests
+            )
+        return submission
+
+    async def async_batch_results(
+        self, name: str, cache_keys: list[str | None]
+    ) -> list[JournalPage | ValueError | BatchJobError] | None:
+        """Return the journal pages from a batch job, or None if still running.
+
+        The results are in the order the pages were submitted, with a
+        BatchJobError for each request that failed and a ValueError for each
+        response that could not be parsed. Each journal page is added
+        to the extraction cache with the cache key it was submitted with.
+        Raises a BatchJobError if the job failed.
+        """
+        if self._batch_backend is None:
+            raise BatchJobError("Batch jobs are not supported")
+        if (results := await self._batch_backend.results(name)) is None:
+            return None
+        pages: list[JournalPage | ValueError | BatchJobError] = []
+        for i, cache_key in enumerate(cache_keys):
+            result = results[i] if i < len(results) else None
+            if result is None or result.text is None:
+                error = result.error if result else "missing result"
+                pages.append(BatchJobError(f"Batch request failed: {error}"))
+                continue
+            try:
+                journal_page = _parse_journal_page(result.text)
+            except ValueError as err:
+                pages.append(err)
+                continue
+            if self._cache is not None and cache_key is not None:
+                await self._cache.async_put(cache_key, journal_page)
+            pages.append(journal_page)
+        return pages
+
+    async def _async_cached_page(
+        self,
+        page_name: Path,
+        created_at: datetime.datetime,
+        page_content: bytes,
+        prompt: CompiledPrompt,
+    ) -> tuple[str | None, JournalPage | None]:
+        """Return the extraction cache key for a page and its cached journal page."""
+        if self._cache is None:
+            return None, None
+        cache_key = await asyncio.get_running_loop().run_in_executor(
+            None,
+            extraction_cache_key,
+            page_content,
+            prompt.fingerprint,
+            self._model,
+            self._image_options,
+        )
+        if (journal_page := await self._cache.async_get(cache_key)) is None:
+            return cache_key, None
+        _LOGGER.debug("Using cached extraction for page %s", page_name)
+        # The page may have been renamed since it was extracted
+        return cache_key, dataclasses.replace(
+            journal_page,
+            filename=page_name.name,
+            created_at=created_at.isoformat(),
+        )
+
+    async def _async_compiled_prompt(self, page_name: Path) -> CompiledPrompt:
+        """Return the compiled system prompt for a page."""
+        if self._prompt_registry.stale:
+            return await asyncio.get_running_loop().run_in_executor(
+                None, self._prompt_registry.get, page_name
+            )
+        return self._prompt_registry.get(page_name)
+
+    async def _async_page_contents(
+        self, page_name: Path, created_at: datetime.datetime, page_content: bytes
+    ) -> tuple[str, types.Content]:
+        """Return the file prompt and request contents for a page image."""
+        mime_type = "image/png"
+        if self._image_options is not None:
+            prepared = await asyncio.get_running_loop().run_in_executor(
+                None, preprocess_image, page_content, self._image_options
+            )
+            _LOGGER.debug(
+                "Preprocessed page image from %d to %d bytes",
+                len(page_content),
+                len(prepared.content),
+            )
+            page_content, mime_type = prepared.content, prepared.mime_type
+
+        file_prompt = FILE_PROMPT.format(
+            filename=page_name.name,
+            created_at=created_at.isoformat(),
+        )
         contents = types.Content(
             parts=[
-                types.Part(
-                    text=FILE_PROMPT.format(
-                        filename=page_name.name,
-                        created_at=created_at.isoformat(),
-                    )
-                ),
+                types.Part(text=file_prompt),
                 types.Part(
                     inline_data=types.Blob(
-                        mime_type="image/png",
+                        mime_type=mime_type,
                         data=page_content,
                     )
                 ),
             ]
         )
-        response = await self._client.aio.models.generate_content(
-            model=self._model,
-            config=types.GenerateContentConfig(
-                system_instruction=[p.as_prompt() for p in prompts],
-            ),
-            contents=contents,
-        )
+        return file_prompt, contents
+
+    async def _async_generate(
+        self,
+        prompt: CompiledPrompt,
+        contents: types.Content,
+        estimated_tokens: int,
+        response_schema: types.Schema = JOURNAL_PAGE_SCHEMA,
+    ) -> str:
+        """Send a request with the system prompt and return the response text.
 
+        The cached system prompt is used when available, otherwise it is sent
+        inline with the request.
+        """
+        inline_config = _generation_config(
+            response_schema, system_instruction=prompt.system_instruction
+        )
+        if (cached_content := await self._async_cached_content(prompt)) is None:
+            response = await self._generate_content(
+                contents, inline_config, estimated_tokens
+            )
+        else:
+            try:
+                response = await self._generate_content(
+                    contents,
+                    _generation_config(response_schema, cached_content=cached_content),
+                    estimated_tokens,
+                )
+            except errors.ClientError as err:
+                if err.code not in (HTTPStatus.FORBIDDEN, HTTPStatus.NOT_FOUND):
+                    raise
+                _LOGGER.info(
+                    "Cached system prompt unavailable, sending inline: %s", err
+                )
+                self._cached_prompts.pop(prompt.fingerprint, None)
+                response = await self._generate_content(
+                    contents, inline_config, estimated_tokens
+                )
         try:
-            text = response.text or ""
+            return response.text or ""
         except AttributeError as err:
             raise ValueError("AttributeError with response.text") from err
-        yaml_content = _parse_model_response(text)
-        try:
-            return JournalPage.from_yaml(yaml_content)
-        except MissingField as err:
-            raise ValueError(f"Error parsing journal page: {err}")
+
+    async def _async_cached_content(self, prompt: CompiledPrompt) -> str | None:
+        """Return the cached content name for a system prompt, if it can be cached.
+
+        The cached prompt is created on first use, and renewed when it is used
+        close to its expiration so that prompts that are no longer used expire.
+        """
+        if not self._context_caching or prompt.fingerprint in self._uncacheable_prompts:
+            return None
+        async with self._context_cache_lock:
+            now = datetime.datetime.now(datetime.UTC)
+            cached = self._cached_prompts.get(prompt.fingerprint)
+            if cached is not None and cached.expire_time - now > CONTEXT_CACHE_RENEW:
+                return cached.name
+            ttl = f"{int(CONTEXT_CACHE_TTL.total_seconds())}s"
+            try:
+                if cached is not None and cached.expire_time > now:
+                    _LOGGER.debug("Renewing cached system prompt %s", cached.name)
+                    result = await self._client.aio.caches.update(
+                        name=cached.name,
+                        config=types.UpdateCachedContentConfig(ttl=ttl),
+                    )
+                else:
+                    _LOGGER.debug("Caching system prompt %s", prompt.fingerprint)
+                    result = await self._client.aio.caches.create(
+                        model=self._model,
+                        config=types.CreateCachedContentConfig(
+                            display_name=f"journal-assistant-{prompt.fingerprint}",
+                            system_instruction=prompt.system_instruction,
+                            ttl=ttl,
+                        ),
+                    )
+            except errors.APIError as err:
+                _LOGGER.info("Unable to cache system prompt, sending inline: %s", err)
+                self._cached_prompts.pop(prompt.fingerprint, None)
+                if cached is None and err.code in CONTEXT_CACHE_UNSUPPORTED:
+                    self._uncacheable_prompts.add(prompt.fingerprint)
+                return None
+            if not result.name:
+                return None
+            cached = _CachedPrompt(
+                name=result.name,
+                expire_time=result.expire_time or now + CONTEXT_CACHE_TTL,
+            )
+            self._cached_prompts[prompt.fingerprint] = cached
+            return cached.name
+
+    async def _generate_content(
+        self,
+        contents: types.Content,
+        config: types.GenerateContentConfig,
+        estimated_tokens: int,
+    ) -> types.GenerateContentResponse:
+        """Generate content within the rate limit, retrying when over quota."""
+        if self._rate_limiter is None:
+            return await self._client.aio.models.generate_content(
+                model=self._model, config=config, contents=contents
+            )
+        attempt = 0
+        while True:
+            async with self._rate_limiter.request(estimated_tokens) as request:
+                try:
+                    response = await self._client.aio.models.generate_content(
+                        model=self._model, config=config, contents=contents
+                    )
+                except errors.ClientError as err:
+                    if (
+                        err.code != HTTPStatus.TOO_MANY_REQUESTS
+                        or attempt == MAX_RATE_LIMIT_RETRIES
+                    ):
+                        raise
+                    attempt += 1
+                    _LOGGER.debug("Model quota exceeded, retrying: %s", err)
+                    request.throttle(_retry_delay(err))
+                    continue
+                if (
+                    response.usage_metadata is not None
+                    and response.usage_metadata.prompt_token_count
+                ):
+                    request.used(response.usage_metadata.prompt_token_count)
+                return response
 
     async def _embed_query_async(
         self, texts: list[str], task_type: str
@@ -79,6 +79,20 @@ SENSOR_DESCRIPTIONS = [
         value_fn=lambda data: data.media_source_processor.scan_stats.errors,
         state_class=SensorStateClass.TOTAL,
     ),
+    JournalAssistantSensorEntityDescription(
+        key="queued_items",
+        icon="mdi:tray-full",
+        translation_key="queued_items",
+        value_fn=lambda data: sum(data.media_source_processor.queue_depths.values()),
+        state_class=SensorStateClass.MEASUREMENT,
+    ),
+    JournalAssistantSensorEntityDescription(
+        key="dead_letter_items",
+        icon="mdi:email-alert",
+        translation_key="dead_letter_items",
+        value_fn=lambda data: len(data.media_source_processor.dead_letters),
+        state_class=SensorStateClass.MEASUREMENT,
+    ),
     JournalAssistantSensorEntityDescription(
         key="last_scan_start",
         icon="mdi:clock-start",
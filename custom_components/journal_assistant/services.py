@@ -8,7 +8,12 @@ import logging
 import aiohttp
 import voluptuous as vol
 
-from homeassistant.core import HomeAssistant, ServiceCall
+from homeassistant.core import (
+    HomeAssistant,
+    ServiceCall,
+    ServiceResponse,
+    SupportsResponse,
+)
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.exceptions import ServiceValidationError
 from homeassistant.helpers import config_validation as cv, aiohttp_client
@@ -21,6 +26,7 @@ from homeassistant.components.media_player.browse_media import (
 )
 
 from .const import CONF_MEDIA_SOURCE, CONF_CONFIG_ENTRY_ID, DOMAIN
+from .processing.model import JournalPage
 from .storage import save_journal_entry
 
 _LOGGER = logging.getLogger(__name__)
@@ -45,6 +51,46 @@ PROCESS_MEDIA_SERVICE_SCHEMA = vol.Schema(
         vol.Required(CONF_CONFIG_ENTRY_ID): cv.string,
     }
 )
+LIST_FAILED_MEDIA_SERVICE = "list_failed_media"
+REPLAY_FAILED_MEDIA_SERVICE = "replay_failed_media"
+CONFIG_ENTRY_SERVICE_SCHEMA = vol.Schema(
+    {
+        vol.Required(CONF_CONFIG_ENTRY_ID): cv.string,
+    }
+)
+
+
+def _async_get_config_entry(hass: HomeAssistant, call: ServiceCall) -> ConfigEntry:
+    """Return the config entry targeted by a service call."""
+    config_entry: ConfigEntry | None = hass.config_entries.async_get_entry(
+        call.data[CONF_CONFIG_ENTRY_ID]
+    )
+    if not config_entry:
+        raise ServiceValidationError(
+            translation_domain=DOMAIN,
+            translation_key="integration_not_found",
+            translation_placeholders={"target": DOMAIN},
+        )
+    return config_entry
+
+
+async def async_extract_journal_page(
+    config_entry: ConfigEntry,
+    identifier: str,
+    title: str,
+    content: bytes,
+) -> JournalPage:
+    """Extract a journal page from already downloaded media content."""
+    vision_model = config_entry.runtime_data.vision_model
+    try:
+        return await vision_model.process_journal_page(pathlib.Path(title), content)
+    except ValueError as err:
+        _LOGGER.error("Error processing journal content: %s", err)
+        raise ServiceValidationError(
+            translation_domain=DOMAIN,
+            translation_key="journal_page_processing_error",
+            translation_placeholders={"media_source": identifier},
+        ) from err
 
 
 def async_register_services(hass: HomeAssistant) -> None:
@@ -52,16 +98,7 @@ def async_register_services(hass: HomeAssistant) -> None:
 
     async def async_process_media(call: ServiceCall) -> None:
         """Generate content from text and optionally images."""
-        config_entry: ConfigEntry | None = hass.config_entries.async_get_entry(
-            call.data[CONF_CONFIG_ENTRY_ID]
-        )
-        if not config_entry:
-            raise ServiceValidationError(
-                translation_domain=DOMAIN,
-                translation_key="integration_not_found",
-                translation_placeholders={"target": DOMAIN},
-            )
-
+        config_entry = _async_get_config_entry(hass, call)
         identifier = call.data[CONF_MEDIA_SOURCE]
         browse = await async_browse_media(hass, identifier)
         if not browse:
@@ -103,23 +140,37 @@ def async_register_services(hass: HomeAssistant) -> None:
                 translation_key="media_source_download_error",
                 translation_placeholders={"media_source": identifier},
             ) from err
-        vision_model = config_entry.runtime_data.vision_model
-        try:
-            journal_page = await vision_model.process_journal_page(
-                pathlib.Path(browse.title), content
-            )
-        except ValueError as err:
-            _LOGGER.error("Error processing journal content: %s", err)
-            raise ServiceValidationError(
-                translation_domain=DOMAIN,
-                translation_key="journal_page_processing_error",
-                translation_placeholders={"media_source": identifier},
-            ) from err
-
+        journal_page = await async_extract_journal_page(
+            config_entry, identifier, browse.title, content
+        )
         await save_journal_entry(
             hass, config_entry.entry_id, browse.title, journal_page
         )
 
+    async def async_list_failed_media(call: ServiceCall) -> ServiceResponse:
+        """Return the media items in the retry ledger, including dead-letters."""
+        config_entry = _async_get_config_entry(hass, call)
+        processor = config_entry.runtime_data.media_source_processor
+        return {
+            "items": [
+                {
+                    "media_source": identifier,
+                    "title": failure.title,
+                    "attempts": failure.attempts,
+                    "last_error": failure.last_error,
+                    "next_attempt": failure.next_attempt,
+                    "dead_lettered": failure.dead_lettered,
+                }
+                for identifier, failure in processor.failures.items()
+            ]
+        }
+
+    async def async_replay_failed_media(call: ServiceCall) -> ServiceResponse:
+        """Process the dead-lettered media items again."""
+        config_entry = _async_get_config_entry(hass, call)
+        processor = config_entry.runtime_data.media_source_processor
+        return {"items": processor.async_replay_dead_letters()}
+
     if not hass.services.has_service(DOMAIN, PROCESS_MEDIA_SERVICE):
         hass.services.async_register(
             DOMAIN,
@@ -127,3 +178,19 @@ def async_register_services(hass: HomeAssistant) -> None:
             async_process_media,
             schema=PROCESS_MEDIA_SERVICE_SCHEMA,
         )
+    if not hass.services.has_service(DOMAIN, LIST_FAILED_MEDIA_SERVICE):
+        hass.services.async_register(
+            DOMAIN,
+            LIST_FAILED_MEDIA_SERVICE,
+            async_list_failed_media,
+            schema=CONFIG_ENTRY_SERVICE_SCHEMA,
+            supports_response=SupportsResponse.ONLY,
+        )
+    if not hass.services.has_service(DOMAIN, REPLAY_FAILED_MEDIA_SERVICE):
+        hass.services.async_register(
+            DOMAIN,
+            REPLAY_FAILED_MEDIA_SERVICE,
+            async_replay_failed_media,
+            schema=CONFIG_ENTRY_SERVICE_SCHEMA,
+            supports_response=SupportsResponse.OPTIONAL,
+        )
@@ -1,10 +1,9 @@
 """Library for handling Journal Assistant storage."""
 
+from contextlib import aclosing
 from pathlib import Path
 import logging
 
-from ical.calendar import Calendar
-
 from homeassistant.core import HomeAssistant
 from homeassistant.config_entries import ConfigEntry
 
@@ -12,13 +11,20 @@ from .const import (
     DEFAULT_NOTE_NAME,
     CONF_NOTES,
     DOMAIN,
+    CONF_EMBEDDING_BACKEND,
+    DEFAULT_EMBEDDING_BACKEND,
+    EMBEDDING_BACKEND_LOCAL,
 )
 from .processing.journal import (
-    journal_from_yaml,
+    Notebooks,
+    notebooks_from_yaml,
     write_journal_page_yaml,
     indexable_notebooks_iterator,
+    create_indexable_document,
 )
+from .processing.local_embedding import LocalEmbedding
 from .processing.local_vectordb import LocalVectorDB
+from .processing.pipeline import async_buffered_iterator
 from .processing.model import JournalPage
 from .vectordb import VectorDB
 from .processing import vision_model
@@ -28,8 +34,10 @@ _LOGGER = logging.getLogger(__name__)
 
 VECTOR_DB_STORAGE_PATH = f".storage/{DOMAIN}/{{config_entry_id}}/vectordb"
 JOURNAL_STORAGE_PATH = f".storage/{DOMAIN}/{{config_entry_id}}/journal"
+JOURNAL_INDEX_STORAGE_PATH = f".storage/{DOMAIN}/{{config_entry_id}}/journal_index"
 INDEX_BATCH_SIZE = 20
 INDEX_PERSIST_SiZE = 100
+INDEX_QUEUE_SIZE = 2
 
 
 def journal_storage_path(hass: HomeAssistant, config_entry_id: str) -> Path:
@@ -48,12 +56,20 @@ def vectordb_storage_path(hass: HomeAssistant, config_entry_id: str) -> Path:
     )
 
 
-async def load_journal_entries(
-    hass: HomeAssistant, entry: ConfigEntry
-) -> dict[str, Calendar]:
+def journal_index_storage_path(hass: HomeAssistant, config_entry_id: str) -> Path:
+    """Return the storage path for the journal date index."""
+    return Path(
+        hass.config.path(
+            JOURNAL_INDEX_STORAGE_PATH.format(config_entry_id=config_entry_id)
+        )
+    )
+
+
+async def load_notebooks(hass: HomeAssistant, entry: ConfigEntry) -> Notebooks:
     return await hass.async_add_executor_job(  # type: ignore[no-any-return]
-        journal_from_yaml,
+        notebooks_from_yaml,
         journal_storage_path(hass, entry.entry_id),
+        journal_index_storage_path(hass, entry.entry_id),
         set(entry.options[CONF_NOTES].split("\n")),
         DEFAULT_NOTE_NAME,
     )
@@ -74,15 +90,40 @@ async def save_journal_entry(
 
 
 async def create_vector_db(
-    hass: HomeAssistant, entry: ConfigEntry, model: vision_model.VisionModel
+    hass: HomeAssistant,
+    entry: ConfigEntry,
+    model: vision_model.VisionModel,
+    notebooks: Notebooks,
 ) -> VectorDB:
     """Create a VectorDB instance."""
-    entries = await load_journal_entries(hass, entry)
 
-    vectordb = LocalVectorDB(
-        query_fn=model.embed_query_async,
-        index_fn=model.embed_document_async,
-    )
+    def _load_documents(uids: list[str]) -> dict[str, str]:
+        journals = [journal for uid in uids if (journal := notebooks.get(uid))]
+        return {
+            journal.uid or "": create_indexable_document(journal).document
+            for journal in notebooks.materialize(journals)
+        }
+
+    async def load_documents(uids: list[str]) -> dict[str, str]:
+        return await hass.async_add_executor_job(_load_documents, uids)  # type: ignore[no-any-return]
+
+    backend = entry.options.get(CONF_EMBEDDING_BACKEND, DEFAULT_EMBEDDING_BACKEND)
+    if backend == EMBEDDING_BACKEND_LOCAL:
+        embedding = LocalEmbedding()
+        vectordb = LocalVectorDB(
+            query_fn=embedding.embed_query_async,
+            index_fn=embedding.embed_document_async,
+            document_fn=load_documents,
+            embedding_model=embedding.name,
+            document_statistics=embedding,
+        )
+    else:
+        vectordb = LocalVectorDB(
+            query_fn=model.embed_query_async,
+            index_fn=model.embed_document_async,
+            document_fn=load_documents,
+            embedding_model=vision_model.EMBED_MODEL,
+        )
 
     storage_path = vectordb_storage_path(hass, entry.entry_id)
 
@@ -95,14 +136,25 @@ async def create_vector_db(
 
     _LOGGER.debug("Upserting document index")
     total = 0
-    for document_batch in indexable_notebooks_iterator(
-        entries, batch_size=INDEX_BATCH_SIZE
-    ):
-        await vectordb.upsert_index(document_batch)
-        total += len(document_batch)
-        if total % INDEX_PERSIST_SiZE == 0:
-            _LOGGER.debug("Persisting index after %s documents", total)
-            await vectordb.save_store(storage_path)
+    # Documents are prepared in an executor while the previous batch is
+    # embedded, so only this step is bounded by the queue. The date index pass
+    # in load_notebooks has already parsed any new or changed page files, one
+    # at a time, since the journal entries are built from the dates it finds.
+    batches = async_buffered_iterator(
+        indexable_notebooks_iterator(notebooks, batch_size=INDEX_BATCH_SIZE),
+        maxsize=INDEX_QUEUE_SIZE,
+    )
+    indexed: set[str] = set()
+    async with aclosing(batches):
+        async for document_batch in batches:
+            await vectordb.upsert_index(document_batch)
+            indexed.update(document.uid for document in document_batch)
+            total += len(document_batch)
+            if total % INDEX_PERSIST_SiZE == 0:
+                _LOGGER.debug("Persisting index after %s documents", total)
+                await vectordb.save_store(storage_path)
+    if removed := await vectordb.prune_index(indexed):
+        _LOGGER.debug("Removed %d documents no longer in the journal", removed)
     await vectordb.save_store(storage_path)
 
     return vectordb
@@ -5,6 +5,7 @@ from dataclasses import dataclass
 from homeassistant.config_entries import ConfigEntry
 
 from .processing.vision_model import VisionModel
+from .processing.journal import Notebooks
 from .vectordb import VectorDB
 from .media_source_processor import MediaSourceProcessor
 
@@ -13,6 +14,7 @@ from .media_source_processor import MediaSourceProcessor
 class JournalAssistantData:
     """Journal Assistant config entry."""
 
+    notebooks: Notebooks
     vector_db: VectorDB
     vision_model: VisionModel
     media_source_processor: MediaSourceProcessor
@@ -26,6 +26,9 @@ class Embedding:
 EmbeddingFunction = Callable[[list[str]], Awaitable[list[Embedding]]]
 """A function that takes a string and returns an embedding."""
 
+DocumentFunction = Callable[[list[str]], Awaitable[dict[str, str]]]
+"""A function that takes document uids and returns the document content."""
+
 
 @dataclass(kw_only=True)
 class IndexableDocument(DataClassJSONMixin):
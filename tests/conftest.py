@@ -66,6 +66,28 @@ class DifferentDirectoryExtension(AmberSnapshotExtension):
         return str(Path(test_location.filepath).parent.joinpath(DIFFERENT_DIRECTORY))
 
 
+def pytest_addoption(parser: pytest.Parser) -> None:
+    """Add an option to run the benchmarks."""
+    parser.addoption(
+        "--benchmark",
+        action="store_true",
+        default=False,
+        help="Run tests marked as benchmarks",
+    )
+
+
+def pytest_collection_modifyitems(
+    config: pytest.Config, items: list[pytest.Item]
+) -> None:
+    """Skip benchmarks unless they were requested."""
+    if config.getoption("--benchmark"):
+        return
+    skip_benchmark = pytest.mark.skip(reason="Benchmarks run with --benchmark")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip_benchmark)
+
+
 @pytest.fixture
 def snapshot(snapshot: SnapshotAssertion) -> SnapshotAssertion:
     return snapshot.use_extension(DifferentDirectoryExtension)
@@ -116,11 +138,21 @@ def mock_vectordb() -> Generator[Mock, None, None]:
         yield mock_vectordb
 
 
+@pytest.fixture(name="mock_warm_up")
+def mock_warm_up_fixture() -> Generator[AsyncMock]:
+    """Fixture to skip connecting to the model API when it is set up."""
+    with patch(
+        f"custom_components.{DOMAIN}.processing.vision_model.VisionModel.async_warm_up"
+    ) as mock_warm_up:
+        yield mock_warm_up
+
+
 @pytest.fixture(name="config_entry")
 async def mock_config_entry(
     hass: HomeAssistant,
     journal_storage_path: Path,
     mock_vectordb: Mock,
+    mock_warm_up: AsyncMock,
     platforms: list[Platform],
 ) -> AsyncGenerator[MockConfigEntry]:
     """Fixture to create a configuration entry."""
@@ -0,0 +1,90 @@
+"""Tests for the page image preprocessing library."""
+
+import io
+
+import pytest
+from PIL import Image, ImageChops, ImageDraw
+
+from custom_components.journal_assistant.processing.image import (
+    ImageOptions,
+    preprocess_image,
+)
+
+
+def _page_image(
+    size: tuple[int, int] = (1000, 1500),
+    content_box: tuple[int, int, int, int] = (250, 300, 750, 1200),
+    format: str = "PNG",
+) -> bytes:
+    """Return an encoded page with dark strokes inside a blank margin."""
+    paper = Image.new("RGB", size, (250, 248, 240))
+    noise = Image.effect_noise(size, 8).convert("RGB")
+    image = Image.blend(paper, noise, 0.05)
+    draw = ImageDraw.Draw(image)
+    left, top, right, bottom = content_box
+    for y in range(top, bottom, 20):
+        draw.line((left, y, right, y + 5), fill=(20, 20, 60), width=2)
+    buffer = io.BytesIO()
+    image.save(buffer, format=format)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize(
+    ("format", "mime_type"),
+    [
+        ("WEBP", "image/webp"),
+        ("JPEG", "image/jpeg"),
+    ],
+)
+def test_preprocess_image(format: str, mime_type: str) -> None:
+    """Test a page is cropped, downscaled, converted to grayscale and encoded."""
+    content = _page_image()
+    prepared = preprocess_image(content, ImageOptions(long_edge=512, format=format))
+
+    assert prepared.mime_type == mime_type
+    assert len(prepared.content) < len(content)
+    image = Image.open(io.BytesIO(prepared.content))
+    assert image.format == format
+    # WebP has no grayscale mode so it is decoded with equal color channels
+    red, green, blue = image.convert("RGB").split()
+    assert ImageChops.difference(red, green).getextrema()[1] <= 2
+    assert ImageChops.difference(red, blue).getextrema()[1] <= 2
+    # The content is 500x900 pixels so the crop keeps its aspect ratio
+    assert image.height == 512
+    assert 270 < image.width < 300
+
+
+def test_preprocess_without_crop() -> None:
+    """Test the whole page is kept when margins are not cropped."""
+    prepared = preprocess_image(
+        _page_image(), ImageOptions(long_edge=600, crop_margins=False, grayscale=False)
+    )
+    image = Image.open(io.BytesIO(prepared.content))
+    assert image.size == (400, 600)
+    assert image.mode == "RGB"
+
+
+def test_preprocess_invalid_image() -> None:
+    """Test content that is not an image is returned unchanged."""
+    prepared = preprocess_image(b"content", ImageOptions())
+    assert prepared.content == b"content"
+    assert prepared.mime_type == "image/png"
+
+
+def test_preprocess_small_image() -> None:
+    """Test an image that would not get smaller is returned unchanged."""
+    buffer = io.BytesIO()
+    Image.new("RGB", (40, 60), "white").save(buffer, format="GIF")
+    content = buffer.getvalue()
+    prepared = preprocess_image(content, ImageOptions(format="JPEG", quality=100))
+    assert prepared.content == content
+    assert prepared.mime_type == "image/gif"
+
+
+def test_preprocess_oversized_image(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test an image too large to decode safely is returned unchanged."""
+    content = _page_image()
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 1000)
+    prepared = preprocess_image(content, ImageOptions())
+    assert prepared.content == content
+    assert prepared.mime_type == "image/png"
@@ -0,0 +1,65 @@
+"""Benchmark the upload size and latency of preprocessing page images.
+
+Run with `pytest --benchmark -o log_cli=true -o log_cli_level=INFO`.
+"""
+
+import io
+import logging
+import random
+import time
+
+import pytest
+from PIL import Image, ImageDraw
+
+from custom_components.journal_assistant.processing.image import (
+    ImageOptions,
+    preprocess_image,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+ITERATIONS = 3
+
+
+def _scanned_page() -> bytes:
+    """Return a large phone scan of a handwritten page with sensor noise."""
+    rng = random.Random(0)
+    width, height = 3024, 4032
+    image = Image.effect_noise((width, height), 12).convert("RGB")
+    paper = Image.new("RGB", (width, height), (245, 240, 228))
+    image = Image.blend(paper, image, 0.15)
+    draw = ImageDraw.Draw(image)
+    for y in range(500, height - 500, 90):
+        x = 350
+        while x < width - 400:
+            word = rng.randint(60, 260)
+            points = [(x + i * 6, y + rng.randint(-18, 18)) for i in range(word // 6)]
+            draw.line(points, fill=(30, 30, 70), width=5)
+            x += word + rng.randint(30, 60)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@pytest.mark.benchmark
+def test_image_benchmark() -> None:
+    """Compare the upload size of a preprocessed page with the raw scan."""
+    content = _scanned_page()
+    options = ImageOptions()
+
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        prepared = preprocess_image(content, options)
+    latency = (time.perf_counter() - start) / ITERATIONS
+
+    ratio = len(content) / len(prepared.content)
+    _LOGGER.info(
+        "Page image raw=%d bytes preprocessed=%d bytes (%.0fx smaller) in %.0fms",
+        len(content),
+        len(prepared.content),
+        ratio,
+        latency * 1000,
+    )
+    assert ratio > 10
+    image = Image.open(io.BytesIO(prepared.content))
+    assert max(image.size) == options.long_edge
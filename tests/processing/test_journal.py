@@ -1,10 +1,22 @@
 """Test parsing journal entries as a RFC5545 Journal."""
 
 from pathlib import Path
+import datetime
+import zoneinfo
+from unittest.mock import patch
 
+import pytest
+from ical.timeline import generic_timeline
 from syrupy import SnapshotAssertion
 
-from custom_components.journal_assistant.processing.journal import journal_from_yaml
+from custom_components.journal_assistant.processing.journal import (
+    journal_from_yaml,
+    notebooks_from_yaml,
+    render_document,
+    JournalTimeline,
+)
+
+TZ = zoneinfo.ZoneInfo("America/Regina")
 
 
 def test_parse_journal_as_calendar(snapshot: SnapshotAssertion) -> None:
@@ -19,3 +31,104 @@ def test_parse_journal_as_calendar(snapshot: SnapshotAssertion) -> None:
         for calendar in calendars.values()
         for entry in calendar.journal
     ] == snapshot
+
+
+@pytest.mark.parametrize(
+    ("start", "end"),
+    [
+        (
+            datetime.datetime(2023, 12, 1, tzinfo=datetime.UTC),
+            datetime.datetime(2023, 12, 31, tzinfo=datetime.UTC),
+        ),
+        (
+            datetime.datetime(2023, 12, 20, 12, tzinfo=datetime.UTC),
+            datetime.datetime(2023, 12, 21, 12, tzinfo=datetime.UTC),
+        ),
+        (
+            datetime.datetime(2023, 12, 20, tzinfo=TZ),
+            datetime.datetime(2023, 12, 20, tzinfo=TZ),
+        ),
+        (
+            datetime.datetime(2024, 1, 1, tzinfo=datetime.UTC),
+            datetime.datetime(2024, 2, 1, tzinfo=datetime.UTC),
+        ),
+    ],
+)
+def test_journal_timeline(start: datetime.datetime, end: datetime.datetime) -> None:
+    """Test the timeline index returns the same results as the ical timeline."""
+
+    calendars = journal_from_yaml(
+        Path("tests/fixtures"), {"Daily", "Monthly"}, "Journal"
+    )
+    for calendar in calendars.values():
+        timeline = JournalTimeline(calendar.journal, TZ)
+        assert len(timeline) == len(calendar.journal)
+
+        expected = generic_timeline(calendar.journal, TZ)
+        assert [entry.uid for entry in timeline.overlapping(start, end)] == [
+            entry.uid for entry in expected.overlapping(start, end)
+        ]
+        assert [entry.uid for entry in timeline.active_after(start)] == [
+            entry.uid for entry in expected.active_after(start)
+        ]
+
+
+def test_notebooks_date_index(tmp_path: Path) -> None:
+    """Test loading notebooks from the on-disk date index."""
+
+    index_path = tmp_path / "journal_index"
+    notebooks = notebooks_from_yaml(
+        Path("tests/fixtures"), index_path, {"Daily", "Monthly"}, "Journal"
+    )
+    assert index_path.exists()
+    assert notebooks.calendars.keys() == {"Daily", "Journal", "Monthly"}
+
+    # Descriptions are only loaded on demand and match the eagerly loaded journal
+    expected = journal_from_yaml(
+        Path("tests/fixtures"), {"Daily", "Monthly"}, "Journal"
+    )
+    for key_name, calendar in notebooks.calendars.items():
+        assert all(entry.description is None for entry in calendar.journal)
+        assert [
+            entry.model_dump(exclude={"dtstamp"}, exclude_none=True)
+            for entry in notebooks.materialize(calendar.journal)
+        ] == [
+            entry.model_dump(exclude={"dtstamp"}, exclude_none=True)
+            for entry in expected[key_name].journal
+        ]
+
+    # Unchanged pages are not parsed again when the index is reloaded
+    with patch(
+        "custom_components.journal_assistant.processing.journal.JournalPage.from_yaml"
+    ) as mock_from_yaml:
+        reloaded = notebooks_from_yaml(
+            Path("tests/fixtures"), index_path, {"Daily", "Monthly"}, "Journal"
+        )
+    assert not mock_from_yaml.called
+    assert [
+        entry.uid
+        for calendar in reloaded.calendars.values()
+        for entry in calendar.journal
+    ] == [
+        entry.uid
+        for calendar in notebooks.calendars.values()
+        for entry in calendar.journal
+    ]
+
+
+def test_render_document() -> None:
+    """Test rendering the indexable document text for a journal entry."""
+
+    calendars = journal_from_yaml(
+        Path("tests/fixtures"), {"Daily", "Monthly"}, "Journal"
+    )
+    entry = calendars["Daily"].journal[-1]
+    assert render_document(entry) == (
+        "summary: Daily 2023-12-22\n"
+        "dtstart: 2023-12-22\n"
+        "categories: Daily\n"
+        "description:\n"
+        "- clean garage\n"
+    )
+    entry.description = "- wash car"
+    assert render_document(entry).endswith("description:\n- wash car\n")
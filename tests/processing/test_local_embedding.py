@@ -0,0 +1,110 @@
+"""Tests for the local embedding model."""
+
+import numpy as np
+
+from custom_components.journal_assistant.processing.local_embedding import (
+    PROJECTION_DENSITY,
+    LocalEmbedding,
+)
+
+DOCUMENTS = [
+    "Buy pumpkins and candy for the Halloween party",
+    "Call mom about decorating the Christmas tree",
+    "Team building exercise at work",
+    "Trip to the mountains with the family",
+]
+INDEXED_DOCUMENTS = {f"uid-{i}": document for i, document in enumerate(DOCUMENTS)}
+
+
+async def test_query_similarity() -> None:
+    """Test queries are most similar to documents sharing rare n-grams."""
+    embedding = LocalEmbedding()
+    await embedding.async_update_documents(INDEXED_DOCUMENTS)
+    documents = await embedding.embed_document_async(DOCUMENTS)
+    assert all(doc.embedding.shape == (256,) for doc in documents)
+    assert all(np.isclose(np.linalg.norm(doc.embedding), 1.0) for doc in documents)
+
+    for query, expected in (
+        ("christmas tree", 1),
+        ("pumpkin", 0),
+        ("mountain trip", 3),
+    ):
+        (query_embedding,) = await embedding.embed_query_async([query])
+        scores = [
+            float(np.dot(query_embedding.embedding, doc.embedding)) for doc in documents
+        ]
+        assert int(np.argmax(scores)) == expected
+
+
+async def test_embeddings_are_deterministic() -> None:
+    """Test document embeddings do not depend on the other indexed documents."""
+    embedding = LocalEmbedding()
+    (first,) = await embedding.embed_document_async(DOCUMENTS[:1])
+    await embedding.embed_document_async(DOCUMENTS[1:])
+    (again,) = await LocalEmbedding().embed_document_async(DOCUMENTS[:1])
+    assert np.array_equal(first.embedding, again.embedding)
+
+
+async def test_empty_text() -> None:
+    """Test embedding empty text."""
+    embedding = LocalEmbedding()
+    (document,) = await embedding.embed_document_async([""])
+    assert not document.embedding.any()
+    (query,) = await embedding.embed_query_async([" "])
+    assert not query.embedding.any()
+
+
+async def test_document_frequency() -> None:
+    """Test documents indexed again replace their earlier document frequencies."""
+    embedding = LocalEmbedding(dimensions=64)
+    assert embedding.name == "local/char-ngram-v2-20-64"
+    await embedding.async_update_documents(INDEXED_DOCUMENTS)
+    expected = embedding.embed_query("party").embedding
+
+    # Indexing the same documents again does not count them twice
+    await embedding.async_update_documents(INDEXED_DOCUMENTS)
+    assert embedding.documents == len(DOCUMENTS)
+    assert np.array_equal(embedding.embed_query("party").embedding, expected)
+
+    # A changed document replaces the n-grams of its earlier version
+    await embedding.async_update_documents({"uid-0": "Buy apples at the market"})
+    changed = LocalEmbedding(dimensions=64)
+    await changed.async_update_documents(
+        {**INDEXED_DOCUMENTS, "uid-0": "Buy apples at the market"}
+    )
+    assert np.array_equal(
+        embedding.embed_query("party").embedding,
+        changed.embed_query("party").embedding,
+    )
+    assert not np.array_equal(embedding.embed_query("party").embedding, expected)
+
+
+async def test_remove_documents() -> None:
+    """Test removed documents no longer count in the document frequencies."""
+    embedding = LocalEmbedding(dimensions=64)
+    await embedding.async_update_documents(INDEXED_DOCUMENTS)
+    await embedding.async_remove_documents(["uid-0", "uid-missing"])
+    assert embedding.documents == len(DOCUMENTS) - 1
+
+    remaining = LocalEmbedding(dimensions=64)
+    await remaining.async_update_documents(
+        {uid: text for uid, text in INDEXED_DOCUMENTS.items() if uid != "uid-0"}
+    )
+    assert np.array_equal(
+        embedding.embed_query("party").embedding,
+        remaining.embed_query("party").embedding,
+    )
+
+
+def test_projection_uses_all_feature_bits() -> None:
+    """Test features that only differ above the low bits use different dimensions."""
+    embedding = LocalEmbedding()
+    weights = np.ones(1)
+    dimensions = [
+        set(np.flatnonzero(embedding._project(np.array([feature], np.uint64), weights)))
+        for feature in (5, 261, 19717, 256005)
+    ]
+    assert all(len(dims) == PROJECTION_DENSITY for dims in dimensions)
+    for i, first in enumerate(dimensions):
+        for second in dimensions[i + 1 :]:
+            assert first != second
@@ -11,6 +11,9 @@ import pytest
 import numpy as np
 from syrupy import SnapshotAssertion
 
+from custom_components.journal_assistant.processing.local_embedding import (
+    LocalEmbedding,
+)
 from custom_components.journal_assistant.processing.local_vectordb import (
     LocalVectorDB,
 )
@@ -138,9 +141,61 @@ async def test_save_store(
                 }
             },
             "embeddings": {"uid-1": [48, 100, 56]},
+            "embedding_model": "models/text-embedding-004",
         }
 
 
+async def test_load_store_other_model(
+    embedding_function: FakeEmbeddingFunction,
+    db: LocalVectorDB,
+) -> None:
+    """Test a store written with a different embedding model is re-indexed."""
+    document = IndexableDocument(
+        uid="uid-1",
+        document="document-1",
+        timestamp=datetime.datetime(
+            2023, 12, 21, 0, 0, 0, tzinfo=datetime.timezone.utc
+        ),
+    )
+    await db.upsert_index([document])
+    filename = pathlib.Path(tempfile.mktemp())
+    await db.save_store(filename)
+
+    embedding = LocalEmbedding()
+    local_db = LocalVectorDB(
+        embedding.embed_document_async,
+        embedding.embed_query_async,
+        embedding_model=embedding.name,
+        document_statistics=embedding,
+    )
+    await local_db.load_store(filename)
+    assert await local_db.count() == 0
+
+    # The document is embedded again with the local model
+    await local_db.upsert_index([document])
+    assert await local_db.count() == 1
+    await local_db.save_store(filename)
+
+    reloaded_embedding = LocalEmbedding()
+    reloaded = LocalVectorDB(
+        reloaded_embedding.embed_document_async,
+        reloaded_embedding.embed_query_async,
+        embedding_model=embedding.name,
+        document_statistics=reloaded_embedding,
+    )
+    await reloaded.load_store(filename)
+    assert await reloaded.count() == 1
+    # Unchanged documents are not embedded again but are counted in the statistics
+    await reloaded.upsert_index([document])
+    assert reloaded_embedding.documents == embedding.documents == 1
+    results = await reloaded.query(QueryParams(query="document"))
+    assert [result.document.uid for result in results] == ["uid-1"]
+
+    # The original model discards the local embeddings
+    await db.load_store(filename)
+    assert embedding_function.embeds == 1
+
+
 async def test_load_store(
     snapshot: SnapshotAssertion,
     embedding_function: FakeEmbeddingFunction,
@@ -182,3 +237,67 @@ async def test_load_store(
             score=0.0,
         )
     ]
+
+
+async def test_load_documents_on_demand(
+    embedding_function: FakeEmbeddingFunction,
+) -> None:
+    """Test document content is only loaded for query results."""
+
+    loaded: list[list[str]] = []
+
+    async def document_fn(uids: list[str]) -> dict[str, str]:
+        loaded.append(uids)
+        return {uid: f"content-{uid}" for uid in uids}
+
+    db = LocalVectorDB(embedding_function, embedding_function, document_fn)
+    await db.upsert_index(
+        [
+            IndexableDocument(
+                uid=f"uid-{i}",
+                document=f"document-{i}",
+                timestamp=datetime.datetime(
+                    2023, 12, 21, 0, 0, 0, tzinfo=datetime.timezone.utc
+                ),
+            )
+            for i in range(3)
+        ]
+    )
+    assert embedding_function.embeds == 3
+    assert not loaded
+
+    filename = pathlib.Path(tempfile.mktemp())
+    await db.save_store(filename)
+    with filename.open("r") as tf:
+        data = json.loads(tf.read())
+    assert {document["document"] for document in data["documents"].values()} == {""}
+
+    results = await db.query(QueryParams(query="document-1", num_results=2))
+    assert len(results) == 2
+    assert loaded == [[result.document.uid for result in results]]
+    assert [result.document.document for result in results] == [
+        f"content-{result.document.uid}" for result in results
+    ]
+
+
+async def test_prune_index() -> None:
+    """Test documents that no longer exist are removed with their statistics."""
+    embedding = LocalEmbedding()
+    db = LocalVectorDB(
+        embedding.embed_document_async,
+        embedding.embed_query_async,
+        document_statistics=embedding,
+    )
+    await db.upsert_index(
+        [
+            IndexableDocument(uid=f"uid-{i}", document=f"document-{i}", timestamp=None)
+            for i in range(3)
+        ]
+    )
+    assert await db.prune_index({"uid-0", "uid-2"}) == 1
+    assert await db.count() == 2
+    assert embedding.documents == 2
+    results = await db.query(QueryParams(query="document-1", num_results=3))
+    assert sorted(result.document.uid for result in results) == ["uid-0", "uid-2"]
+
+    assert await db.prune_index({"uid-0", "uid-2"}) == 0
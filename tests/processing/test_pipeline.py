@@ -0,0 +1,146 @@
+"""Tests for the pipeline helpers."""
+
+import asyncio
+from collections.abc import Generator
+from contextlib import aclosing
+import threading
+from unittest.mock import Mock
+
+import pytest
+
+from custom_components.journal_assistant.processing.pipeline import (
+    Stage,
+    StageConfig,
+    async_buffered_iterator,
+)
+
+
+async def test_buffered_iterator() -> None:
+    """Test consuming all items from a blocking iterator."""
+    items = [item async for item in async_buffered_iterator(iter(range(10)))]
+    assert items == list(range(10))
+
+
+async def test_buffered_iterator_is_bounded() -> None:
+    """Test the producer does not run ahead of the consumer past the queue size."""
+    produced: list[int] = []
+
+    def generate() -> Generator[int]:
+        for item in range(100):
+            produced.append(item)
+            yield item
+
+    results = []
+    async with aclosing(async_buffered_iterator(generate(), maxsize=2)) as iterator:
+        async for item in iterator:
+            results.append(item)
+            if item == 4:
+                break
+    assert results == [0, 1, 2, 3, 4]
+    # Consumed items, plus the queue contents, plus one item waiting to be queued
+    assert len(produced) <= 5 + 2 + 1
+
+
+async def test_buffered_iterator_error() -> None:
+    """Test errors from the blocking iterator are raised to the consumer."""
+    thread_ids = set()
+
+    def generate() -> Generator[int]:
+        thread_ids.add(threading.get_ident())
+        yield 1
+        raise ValueError("failed")
+
+    results = []
+    with pytest.raises(ValueError, match="failed"):
+        async for item in async_buffered_iterator(generate()):
+            results.append(item)
+    assert results == [1]
+    assert threading.get_ident() not in thread_ids
+
+
+async def test_stage_backpressure() -> None:
+    """Test producers wait while a stage queue is full."""
+    release = asyncio.Event()
+    handled: list[int] = []
+
+    async def handle(item: int) -> None:
+        await release.wait()
+        handled.append(item)
+
+    stage = Stage("test", handle, StageConfig(queue_size=2), on_error=Mock())
+    stage.start()
+    # One item is taken by the worker, then the queue fills up
+    for item in range(3):
+        await stage.put(item)
+    await asyncio.sleep(0)
+    assert stage.queue_depth == 2
+
+    put = asyncio.create_task(stage.put(3))
+    await asyncio.sleep(0)
+    assert not put.done()
+
+    release.set()
+    await put
+    await stage.join()
+    await stage.stop()
+    assert handled == [0, 1, 2, 3]
+    assert stage.queue_depth == 0
+
+
+async def test_stage_retries() -> None:
+    """Test retryable errors are retried before reporting an error."""
+    attempts: dict[int, int] = {}
+
+    async def handle(item: int) -> None:
+        attempts[item] = attempts.get(item, 0) + 1
+        if item == 1 and attempts[item] < 3:
+            raise ValueError("transient")
+        if item == 2:
+            raise ValueError("permanent")
+        if item == 3:
+            raise KeyError("not retryable")
+
+    on_error = Mock()
+    stage = Stage(
+        "test",
+        handle,
+        StageConfig(concurrency=2, retries=2, retry_delay=0),
+        on_error=on_error,
+        retry_on=(ValueError,),
+    )
+    stage.start()
+    for item in range(4):
+        await stage.put(item)
+    await stage.join()
+    await stage.stop()
+
+    assert attempts == {0: 1, 1: 3, 2: 3, 3: 1}
+    assert sorted(call.args[0] for call in on_error.call_args_list) == [2, 3]
+
+
+async def test_stage_priority() -> None:
+    """Test items are processed in priority order, then in the order added."""
+    release = asyncio.Event()
+    handled: list[str] = []
+
+    async def handle(item: str) -> None:
+        await release.wait()
+        handled.append(item)
+
+    stage = Stage(
+        "test",
+        handle,
+        StageConfig(queue_size=0),
+        on_error=Mock(),
+        priority=lambda item: -int(item[0]),
+    )
+    stage.start()
+    # The first item is taken by the worker before the others are queued
+    await stage.put("0-first")
+    await asyncio.sleep(0)
+    for item in ("1-old", "3-new", "2-middle", "3-newer"):
+        await stage.put(item)
+    release.set()
+    await stage.join()
+    await stage.stop()
+    assert handled == ["0-first", "3-new", "3-newer", "2-middle", "1-old"]
@@ -1,8 +1,13 @@
 """Tests for the prompts module."""
 
+import os
+import shutil
 from pathlib import Path
+from unittest.mock import patch
 
 from custom_components.journal_assistant.processing.prompts import (
+    DYNAMIC_PROMPTS_DIR,
+    PromptRegistry,
     get_dynamic_prompts,
     get_file_prompt,
 )
@@ -34,3 +39,47 @@ Created At: 2023-12-20T07:31:39.675669
 Content:
 """
     )
+
+
+def test_prompt_registry(tmp_path: Path) -> None:
+    """Test prompts are compiled once per note prefix and reloaded on change."""
+    prompts_dir = tmp_path / "dynamic_prompts"
+    shutil.copytree(DYNAMIC_PROMPTS_DIR, prompts_dir)
+    registry = PromptRegistry(prompts_dir)
+    assert registry.stale
+
+    daily = registry.get(Path("Daily-01-P20221030210759068713clbdtpKcEWTi"))
+    assert not registry.stale
+    assert [Path(prompt.filename).stem for prompt in daily.prompts] == [
+        "default",
+        "rapid_log_legend",
+        "profile",
+        "daily",
+    ]
+    assert daily.system_instruction == [prompt.as_prompt() for prompt in daily.prompts]
+    assert registry.get(Path("Daily-02-P20221031080000000000")) is daily
+
+    weekly = registry.get(Path("Weekly-01-P20221030210759068713clbdtpKcEWTi"))
+    assert weekly.fingerprint != daily.fingerprint
+    other = registry.get(Path("Other-01-P20221030210759068713clbdtpKcEWTi"))
+    assert [Path(prompt.filename).stem for prompt in other.prompts] == [
+        "default",
+        "rapid_log_legend",
+        "profile",
+    ]
+
+    # Unchanged files are not compiled again
+    assert not registry.reload_if_changed()
+    assert registry.get(Path("Daily-01-P20221030210759068713clbdtpKcEWTi")) is daily
+
+    profile = prompts_dir / "profile.yaml"
+    profile.write_text(profile.read_text().replace("software engineer", "engineer"))
+    stat = profile.stat()
+    os.utime(profile, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    with patch(
+        "custom_components.journal_assistant.processing.prompts.CHECK_INTERVAL", -1
+    ):
+        assert registry.stale
+        reloaded = registry.get(Path("Daily-01-P20221030210759068713clbdtpKcEWTi"))
+    assert reloaded.fingerprint != daily.fingerprint
+    assert "software engineer" not in "".join(reloaded.system_instruction)
@@ -0,0 +1,104 @@
+"""Tests for the rate limit library."""
+
+import asyncio
+
+import pytest
+
+from custom_components.journal_assistant.processing.rate_limit import (
+    MIN_RATE_SCALE,
+    RateLimit,
+    RateLimiter,
+    TokenBucket,
+)
+
+
+class FakeClock:
+    """A clock that only advances when told to."""
+
+    def __init__(self) -> None:
+        """Initialize the clock."""
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        """Return the current time."""
+        return self.now
+
+
+def test_token_bucket() -> None:
+    """Test tokens are refilled at the configured rate up to the capacity."""
+    clock = FakeClock()
+    bucket = TokenBucket(60, clock)
+    assert bucket.delay(60) == 0
+
+    bucket.consume(60)
+    assert bucket.delay(1) == pytest.approx(1.0)
+    assert bucket.delay(10) == pytest.approx(10.0)
+    # Requests larger than the capacity wait for a full bucket
+    assert bucket.delay(120) == pytest.approx(60.0)
+
+    clock.now = 30
+    assert bucket.delay(30) == 0
+    assert bucket.delay(31) == pytest.approx(1.0)
+
+    clock.now = 1000
+    assert bucket.delay(60) == 0
+    assert bucket.delay(61) == 0
+
+    bucket.rate_per_minute = 30
+    bucket.consume(60)
+    assert bucket.delay(1) == pytest.approx(2.0)
+
+
+async def test_concurrent_requests() -> None:
+    """Test requests within the quota run concurrently."""
+    limiter = RateLimiter(
+        RateLimit(requests_per_minute=60, tokens_per_minute=1000, max_concurrency=3)
+    )
+    running = 0
+    max_running = 0
+
+    async def request() -> None:
+        nonlocal running, max_running
+        async with limiter.request(100):
+            running += 1
+            max_running = max(max_running, running)
+            await asyncio.sleep(0)
+            running -= 1
+
+    await asyncio.gather(*(request() for _ in range(5)))
+    assert max_running == 3
+
+
+async def test_token_usage() -> None:
+    """Test the token bucket is corrected with the actual token usage."""
+    clock = FakeClock()
+    limiter = RateLimiter(
+        RateLimit(requests_per_minute=60, tokens_per_minute=600), clock
+    )
+    async with limiter.request(100) as request:
+        request.used(600)
+    assert limiter.tokens.delay(1) == pytest.approx(0.1)
+
+
+async def test_throttle() -> None:
+    """Test the rates drop when the API rejects a request and then recover."""
+    clock = FakeClock()
+    limiter = RateLimiter(
+        RateLimit(requests_per_minute=60, tokens_per_minute=6000), clock
+    )
+    async with limiter.request(10) as request:
+        request.throttle(retry_after=0)
+    assert limiter.scale == 0.5
+    assert limiter.requests.rate_per_minute == 30
+    assert limiter.tokens.rate_per_minute == 3000
+
+    for _ in range(5):
+        limiter.throttle(retry_after=0)
+    assert limiter.scale == MIN_RATE_SCALE
+
+    clock.now = 1000
+    for _ in range(30):
+        async with limiter.request(10):
+            pass
+    assert limiter.scale == 1.0
+    assert limiter.requests.rate_per_minute == 60
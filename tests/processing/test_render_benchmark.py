@@ -0,0 +1,52 @@
+"""Benchmark rendering journal entries as indexable document text.
+
+Run with `pytest --benchmark -o log_cli=true -o log_cli_level=INFO`.
+"""
+
+from pathlib import Path
+import logging
+import time
+
+import pytest
+import yaml
+from ical.journal import Journal
+
+from custom_components.journal_assistant.processing.journal import (
+    journal_from_yaml,
+    render_document,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+ITERATIONS = 200
+
+
+def _yaml_serialize_content(item: Journal) -> str:
+    """Previous yaml based document serialization used as a baseline."""
+    return yaml.dump(
+        item.model_dump(
+            exclude={"uid", "dtsamp"}, exclude_unset=True, exclude_none=True
+        )
+    )
+
+
+def _throughput(batches: list[list[Journal]], render_fn) -> float:
+    """Return the number of documents rendered per second."""
+    start = time.perf_counter()
+    for entries in batches:
+        for entry in entries:
+            render_fn(entry)
+    return sum(len(entries) for entries in batches) / (time.perf_counter() - start)
+
+
+@pytest.mark.benchmark
+def test_render_benchmark() -> None:
+    """Compare document rendering throughput with the yaml serializer."""
+    calendars = journal_from_yaml(
+        Path("tests/fixtures"), {"Daily", "Monthly"}, "Journal"
+    )
+    entries = [entry for calendar in calendars.values() for entry in calendar.journal]
+
+    baseline = _throughput([entries] * ITERATIONS, _yaml_serialize_content)
+    rendered = _throughput([entries] * ITERATIONS, render_document)
+    _LOGGER.info("Documents/sec yaml=%.0f render=%.0f", baseline, rendered)
@@ -1,10 +1,33 @@
 """Test the vision model library."""
 
+import datetime
+import io
+import json
 from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
 from unittest.mock import Mock, AsyncMock
 
+import pytest
+from freezegun.api import FrozenDateTimeFactory
+from google.genai import errors, types
+from PIL import Image
 
+from custom_components.journal_assistant.processing.batch import (
+    BatchBackend,
+    BatchJobError,
+    BatchRequest,
+    BatchResult,
+)
+from custom_components.journal_assistant.processing.image import ImageOptions
+from custom_components.journal_assistant.processing.rate_limit import RateLimit
+from custom_components.journal_assistant.processing.model import JournalPage
 from custom_components.journal_assistant.processing.vision_model import (
+    CONTEXT_CACHE_RENEW,
+    CONTEXT_CACHE_TTL,
+    JOURNAL_PAGE_SCHEMA,
+    JOURNAL_PAGES_SCHEMA,
+    ExtractionCache,
     VisionModel,
 )
 from custom_components.journal_assistant.const import VISION_MODEL_NAME
@@ -54,3 +77,589 @@ async def test_processing_json_response() -> None:
     assert result.created_at == "2022-10-30T21:07:59.068713"
     assert result.label == "daily"
     assert result.date == "2022-10-30"
+
+
+async def test_rate_limited_retry() -> None:
+    """Test a request rejected for exceeding the quota is retried."""
+    mock_response = Mock()
+    mock_response.text = """{
+    "filename": "Daily-01-P20221030210759068713clbdtpKcEWTi.png",
+    "created_at": "2022-10-30T21:07:59.068713",
+    "label": "daily",
+    "date": "2022-10-30"
+}"""
+    mock_response.usage_metadata.prompt_token_count = 2000
+    quota_error = errors.ClientError(
+        429,
+        {
+            "error": {
+                "code": 429,
+                "status": "RESOURCE_EXHAUSTED",
+                "details": [
+                    {
+                        "@type": "type.googleapis.com/google.rpc.RetryInfo",
+                        "retryDelay": "0s",
+                    }
+                ],
+            }
+        },
+    )
+    mock_genai = AsyncMock()
+    mock_genai.aio.models.generate_content.side_effect = [quota_error, mock_response]
+
+    vision_model = VisionModel(
+        mock_genai,
+        VISION_MODEL_NAME,
+        RateLimit(requests_per_minute=60, tokens_per_minute=100_000),
+    )
+    result = await vision_model.process_journal_page(
+        Path("Daily-01-P20221030210759068713clbdtpKcEWTi"), b"content"
+    )
+    assert result.filename == "Daily-01-P20221030210759068713clbdtpKcEWTi.png"
+    assert mock_genai.aio.models.generate_content.await_count == 2
+
+
+async def test_rate_limited_error() -> None:
+    """Test errors other than exceeding the quota are not retried."""
+    mock_genai = AsyncMock()
+    mock_genai.aio.models.generate_content.side_effect = errors.ClientError(
+        400, {"error": {"code": 400, "status": "INVALID_ARGUMENT"}}
+    )
+    vision_model = VisionModel(
+        mock_genai,
+        VISION_MODEL_NAME,
+        RateLimit(requests_per_minute=60, tokens_per_minute=100_000),
+    )
+    with pytest.raises(errors.ClientError):
+        await vision_model.process_journal_page(
+            Path("Daily-01-P20221030210759068713clbdtpKcEWTi"), b"content"
+        )
+    assert mock_genai.aio.models.generate_content.await_count == 1
+
+
+class FakeExtractionCache(ExtractionCache):
+    """An in-memory extraction cache."""
+
+    def __init__(self) -> None:
+        """Initialize the cache."""
+        self.pages: dict[str, JournalPage] = {}
+
+    async def async_get(self, key: str) -> JournalPage | None:
+        """Return the cached page."""
+        return self.pages.get(key)
+
+    async def async_put(self, key: str, journal_page: JournalPage) -> None:
+        """Store the cached page."""
+        self.pages[key] = journal_page
+
+
+async def test_extraction_cache() -> None:
+    """Test identical pages are only sent to the vision model once."""
+    mock_response = Mock()
+    mock_response.text = """{
+    "filename": "Daily-01-P20221030210759068713clbdtpKcEWTi",
+    "created_at": "2022-10-30T21:07:59.068713",
+    "label": "daily",
+    "date": "2022-10-30"
+}"""
+    mock_genai = AsyncMock()
+    mock_genai.aio.models.generate_content.return_value = mock_response
+    cache = FakeExtractionCache()
+
+    vision_model = VisionModel(mock_genai, VISION_MODEL_NAME, cache=cache)
+    result = await vision_model.process_journal_page(
+        Path("Daily-01-P20221030210759068713clbdtpKcEWTi"), b"content"
+    )
+    assert result.label == "daily"
+    assert len(cache.pages) == 1
+
+    # A renamed page is served from the cache with its new name
+    result = await vision_model.process_journal_page(
+        Path("Daily-02-P20221031080000000000clbdtpKcEWTi"), b"content"
+    )
+    assert mock_genai.aio.models.generate_content.await_count == 1
+    assert result.filename == "Daily-02-P20221031080000000000clbdtpKcEWTi"
+    assert result.created_at == "2022-10-31T08:00:00"
+    assert result.label == "daily"
+
+    # Different content, prompts or models are extracted again
+    await vision_model.process_journal_page(
+        Path("Daily-01-P20221030210759068713clbdtpKcEWTi"), b"other-content"
+    )
+    await vision_model.process_journal_page(
+        Path("Weekly-01-P20221030210759068713clbdtpKcEWTi"), b"content"
+    )
+    other_model = VisionModel(mock_genai, "models/other", cache=cache)
+    await other_model.process_journal_page(
+        Path("Daily-01-P20221030210759068713clbdtpKcEWTi"), b"content"
+    )
+    assert mock_genai.aio.models.generate_content.await_count == 4
+    assert len(cache.pages) == 4
+
+
+async def test_preprocess_image() -> None:
+    """Test page images are preprocessed before they are sent to the model."""
+    mock_response = Mock()
+    mock_response.text = """{
+    "filename": "Daily-01-P20221030210759068713clbdtpKcEWTi.png",
+    "created_at": "2022-10-30T21:07:59.068713"
+}"""
+    mock_genai = AsyncMock()
+    mock_genai.aio.models.generate_content.return_value = mock_response
+    buffer = io.BytesIO()
+    Image.effect_noise((800, 1200), 20).save(buffer, format="PNG")
+
+    vision_model = VisionModel(
+        mock_genai, VISION_MODEL_NAME, image_options=ImageOptions(long_edge=600)
+    )
+    await vision_model.process_journal_page(
+        Path("Daily-01-P20221030210759068713clbdtpKcEWTi"), buffer.getvalue()
+    )
+    contents = mock_genai.aio.models.generate_content.call_args.kwargs["contents"]
+    blob = contents.parts[1].inline_data
+    assert blob.mime_type == "image/webp"
+    assert Image.open(io.BytesIO(blob.data)).size == (400, 600)
+
+
+PAGE_RESPONSE = """{
+    "filename": "Daily-01-P20221030210759068713clbdtpKcEWTi.png",
+    "created_at": "2022-10-30T21:07:59.068713"
+}"""
+
+
+class FakeModels:
+    """A local fake of the generative models API."""
+
+    def __init__(self) -> None:
+        """Initialize the fake."""
+        self.configs: list[types.GenerateContentConfig] = []
+        self.errors: list[Exception] = []
+        self.responses: list[str] = []
+        self.contents: list[Any] = []
+
+    async def generate_content(
+        self, *, model: str, config: types.GenerateContentConfig, contents: Any
+    ) -> types.GenerateContentResponse:
+        """Return the next queued response, or a fixed journal page response."""
+        self.configs.append(config)
+        self.contents.append(contents)
+        if self.errors:
+            raise self.errors.pop(0)
+        text = self.responses.pop(0) if self.responses else PAGE_RESPONSE
+        return types.GenerateContentResponse(
+            candidates=[
+                types.Candidate(content=types.Content(parts=[types.Part(text=text)]))
+            ]
+        )
+
+
+class FakeCaches:
+    """A local fake of the context caching API."""
+
+    def __init__(self) -> None:
+        """Initialize the fake."""
+        self.created: list[types.CreateCachedContentConfig] = []
+        self.updated: list[str] = []
+        self.error: Exception | None = None
+
+    async def create(
+        self, *, model: str, config: types.CreateCachedContentConfig
+    ) -> types.CachedContent:
+        """Create a cached content handle."""
+        if self.error is not None:
+            raise self.error
+        self.created.append(config)
+        return types.CachedContent(
+            name=f"cachedContents/{len(self.created)}",
+            model=model,
+            expire_time=datetime.datetime.now(datetime.UTC) + CONTEXT_CACHE_TTL,
+        )
+
+    async def update(
+        self, *, name: str, config: types.UpdateCachedContentConfig
+    ) -> types.CachedContent:
+        """Renew a cached content handle."""
+        self.updated.append(name)
+        return types.CachedContent(
+            name=name,
+            expire_time=datetime.datetime.now(datetime.UTC) + CONTEXT_CACHE_TTL,
+        )
+
+
+@pytest.fixture(name="fake_client")
+def fake_client_fixture() -> SimpleNamespace:
+    """Fixture for a local fake of the genai client."""
+    return SimpleNamespace(
+        aio=SimpleNamespace(models=FakeModels(), caches=FakeCaches())
+    )
+
+
+async def test_context_caching(
+    fake_client: SimpleNamespace, freezer: FrozenDateTimeFactory
+) -> None:
+    """Test system prompts are cached once per prompt and renewed while in use."""
+    vision_model = VisionModel(fake_client, VISION_MODEL_NAME, context_caching=True)
+    models, caches = fake_client.aio.models, fake_client.aio.caches
+
+    for page in ("Daily-01-P20221030210759068713", "Daily-02-P20221031210759068713"):
+        await vision_model.process_journal_page(Path(page), b"content")
+    assert len(caches.created) == 1
+    assert caches.created[0].system_instruction
+    assert [config.cached_content for config in models.configs] == [
+        "cachedContents/1",
+        "cachedContents/1",
+    ]
+    assert all(config.system_instruction is None for config in models.configs)
+
+    # A different notebook has a different system prompt
+    await vision_model.process_journal_page(
+        Path("Weekly-01-P20221030210759068713"), b"content"
+    )
+    assert len(caches.created) == 2
+    assert models.configs[-1].cached_content == "cachedContents/2"
+
+    # The cached prompt is renewed when it is used close to expiring
+    freezer.tick(CONTEXT_CACHE_TTL - CONTEXT_CACHE_RENEW / 2)
+    await vision_model.process_journal_page(
+        Path("Daily-03-P20221101210759068713"), b"content"
+    )
+    assert caches.updated == ["cachedContents/1"]
+    assert len(caches.created) == 2
+
+    # An expired cached prompt is created again
+    freezer.tick(CONTEXT_CACHE_TTL * 2)
+    await vision_model.process_journal_page(
+        Path("Daily-04-P20221102210759068713"), b"content"
+    )
+    assert len(caches.created) == 3
+    assert models.configs[-1].cached_content == "cachedContents/3"
+
+
+async def test_structured_output(fake_client: SimpleNamespace) -> None:
+    """Test the model is asked for a journal page matching the response schema."""
+    vision_model = VisionModel(fake_client, VISION_MODEL_NAME)
+    result = await vision_model.process_journal_page(
+        Path("Daily-01-P20221030210759068713"), b"content"
+    )
+    assert result == JournalPage(
+        filename="Daily-01-P20221030210759068713clbdtpKcEWTi.png",
+        created_at="2022-10-30T21:07:59.068713",
+    )
+    (config,) = fake_client.aio.models.configs
+    assert config.response_mime_type == "application/json"
+    assert config.response_schema == JOURNAL_PAGE_SCHEMA
+    assert JOURNAL_PAGE_SCHEMA.required == ["filename", "created_at"]
+    records = JOURNAL_PAGE_SCHEMA.properties["records"]
+    assert records.type == types.Type.ARRAY
+    assert records.nullable
+    assert records.items.properties["critical"].type == types.Type.BOOLEAN
+    assert records.items.properties["entries"].items.type == types.Type.STRING
+
+
+@pytest.mark.parametrize(
+    "response_text",
+    [
+        "not json",
+        '{"label": "daily"}',
+        '{"filename": "a.png", "created_at": "2022-10-30", "records": "none"}',
+        "[]",
+    ],
+)
+async def test_malformed_response(response_text: str) -> None:
+    """Test a response that does not match the journal page schema is rejected."""
+    mock_response = Mock()
+    mock_response.text = response_text
+    mock_genai = AsyncMock()
+    mock_genai.aio.models.generate_content.return_value = mock_response
+
+    vision_model = VisionModel(mock_genai, VISION_MODEL_NAME)
+    with pytest.raises(ValueError, match="Error parsing journal page"):
+        await vision_model.process_journal_page(
+            Path("Daily-01-P20221030210759068713clbdtpKcEWTi"), b"content"
+        )
+
+
+PACKED_PAGES = [
+    (Path("Daily-01-P20221030210759068713.png"), b"content-1"),
+    (Path("Daily-02-P20221031210759068713.png"), b"content-2"),
+    (Path("Weekly-01-P20221030210759068713.png"), b"content-3"),
+]
+
+
+async def test_packed_pages(fake_client: SimpleNamespace) -> None:
+    """Test pages of the same notebook are packed into a single request."""
+    models = fake_client.aio.models
+    models.responses = [
+        json.dumps(
+            [
+                {"filename": "Daily-02-P20221031210759068713.png", "created_at": "b"},
+                {"filename": "Daily-01-P20221030210759068713.png", "created_at": "a"},
+            ]
+        ),
+        json.dumps(
+            {"filename": "Weekly-01-P20221030210759068713.png", "created_at": "c"}
+        ),
+    ]
+    vision_model = VisionModel(fake_client, VISION_MODEL_NAME)
+    results = await vision_model.process_journal_pages(PACKED_PAGES)
+    assert results == {
+        "Daily-01-P20221030210759068713.png": JournalPage(
+            filename="Daily-01-P20221030210759068713.png", created_at="a"
+        ),
+        "Daily-02-P20221031210759068713.png": JournalPage(
+            filename="Daily-02-P20221031210759068713.png", created_at="b"
+        ),
+        "Weekly-01-P20221030210759068713.png": JournalPage(
+            filename="Weekly-01-P20221030210759068713.png", created_at="c"
+        ),
+    }
+    # The daily pages share one request and the weekly page has its own
+    assert len(models.configs) == 2
+    assert models.configs[0].response_schema == JOURNAL_PAGES_SCHEMA
+    assert models.configs[1].response_schema == JOURNAL_PAGE_SCHEMA
+    images = [part for part in models.contents[0].parts if part.inline_data]
+    assert [image.inline_data.data for image in images] == [b"content-1", b"content-2"]
+
+
+@pytest.mark.parametrize(
+    ("packed_response", "expected_requests"),
+    [
+        ("not json", 3),
+        ('{"filename": "Daily-01-P20221030210759068713.png"}', 3),
+        (
+            json.dumps(
+                [{"filename": "Daily-01-P20221030210759068713.png", "created_at": "a"}]
+            ),
+            2,
+        ),
+    ],
+    ids=("malformed", "not-a-list", "missing-page"),
+)
+async def test_packed_pages_fallback(
+    fake_client: SimpleNamespace, packed_response: str, expected_requests: int
+) -> None:
+    """Test pages are processed one at a time when missing from a packed response."""
+    models = fake_client.aio.models
+    models.responses = [packed_response]
+    vision_model = VisionModel(fake_client, VISION_MODEL_NAME)
+    results = await vision_model.process_journal_pages(PACKED_PAGES[:2])
+    assert list(results) == [
+        "Daily-01-P20221030210759068713.png",
+        "Daily-02-P20221031210759068713.png",
+    ]
+    assert all(isinstance(result, JournalPage) for result in results.values())
+    assert len(models.configs) == expected_requests
+    assert all(
+        config.response_schema == JOURNAL_PAGE_SCHEMA for config in models.configs[1:]
+    )
+
+
+async def test_packed_pages_cached(fake_client: SimpleNamespace) -> None:
+    """Test cached pages are not packed into a request."""
+    cache = FakeExtractionCache()
+    vision_model = VisionModel(fake_client, VISION_MODEL_NAME, cache=cache)
+    models = fake_client.aio.models
+    models.responses = [
+        json.dumps(
+            [
+                {"filename": page_name.name, "created_at": "a"}
+                for page_name, _ in PACKED_PAGES[:2]
+            ]
+        )
+    ]
+    await vision_model.process_journal_pages(PACKED_PAGES[:2])
+    assert len(models.configs) == 1
+
+    results = await vision_model.process_journal_pages(PACKED_PAGES[:2])
+    assert len(models.configs) == 1
+    assert results["Daily-02-P20221031210759068713.png"] == JournalPage(
+        filename="Daily-02-P20221031210759068713.png",
+        created_at="2022-10-31T21:07:59.068713",
+    )
+
+
+async def test_context_caching_unsupported(fake_client: SimpleNamespace) -> None:
+    """Test system prompts are sent inline when they can't be cached."""
+    vision_model = VisionModel(fake_client, VISION_MODEL_NAME, context_caching=True)
+    models, caches = fake_client.aio.models, fake_client.aio.caches
+    caches.error = errors.ClientError(
+        400, {"error": {"code": 400, "message": "Cached content is too small"}}
+    )
+
+    for page in ("Daily-01-P20221030210759068713", "Daily-02-P20221031210759068713"):
+        await vision_model.process_journal_page(Path(page), b"content")
+    assert all(config.cached_content is None for config in models.configs)
+    assert all(config.system_instruction for config in models.configs)
+
+    # Creating the cached prompt is not attempted again
+    caches.error = None
+    await vision_model.process_journal_page(
+        Path("Daily-03-P20221101210759068713"), b"content"
+    )
+    assert not caches.created
+
+
+async def test_context_cache_missing(fake_client: SimpleNamespace) -> None:
+    """Test a request is sent inline when the cached prompt no longer exists."""
+    vision_model = VisionModel(fake_client, VISION_MODEL_NAME, context_caching=True)
+    models = fake_client.aio.models
+    models.errors = [
+        errors.ClientError(404, {"error": {"code": 404, "status": "NOT_FOUND"}})
+    ]
+
+    result = await vision_model.process_journal_page(
+        Path("Daily-01-P20221030210759068713"), b"content"
+    )
+    assert result.filename == "Daily-01-P20221030210759068713clbdtpKcEWTi.png"
+    assert [config.cached_content for config in models.configs] == [
+        "cachedContents/1",
+        None,
+    ]
+    assert models.configs[1].system_instruction
+
+    # The cached prompt is created again for the next request
+    await vision_model.process_journal_page(
+        Path("Daily-02-P20221031210759068713"), b"content"
+    )
+    assert models.configs[-1].cached_content == "cachedContents/2"
+
+
+class FakeBatchBackend(BatchBackend):
+    """A batch backend that completes jobs when results are provided."""
+
+    def __init__(self) -> None:
+        """Initialize the fake batch backend."""
+        self.jobs: dict[str, list[BatchRequest]] = {}
+        self.results_by_job: dict[str, list[BatchResult]] = {}
+        self.failed: set[str] = set()
+
+    async def submit(
+        self, model: str, display_name: str, requests: list[BatchRequest]
+    ) -> str:
+        """Record the submitted requests."""
+        name = f"batches/{len(self.jobs)}"
+        self.jobs[name] = requests
+        return name
+
+    async def results(self, name: str) -> list[BatchResult] | None:
+        """Return the results provided for the job, if any."""
+        if name in self.failed:
+            raise BatchJobError(f"Batch job {name} failed")
+        return self.results_by_job.get(name)
+
+
+async def test_batch_job() -> None:
+    """Test submitting journal pages as a batch job and parsing the results."""
+    backend = FakeBatchBackend()
+    vision_model = VisionModel(AsyncMock(), VISION_MODEL_NAME, batch_backend=backend)
+    submission = await vision_model.async_submit_batch(
+        [
+            (Path("Daily-01-P20221030210759068713clbdtpKcEWTi"), b"page-1"),
+            (Path("Daily-01-P20221031210759068713clbdtpKcEWTi"), b"page-2"),
+            (Path("Daily-01-P20221101210759068713clbdtpKcEWTi"), b"page-3"),
+        ]
+    )
+    assert submission.name is not None
+    assert submission.cached == {}
+    assert list(submission.cache_keys.values()) == [None, None, None]
+    name = submission.name
+    requests = backend.jobs[name]
+    assert len(requests) == 3
+    assert requests[0].config.system_instruction
+    assert requests[1].contents.parts[1].inline_data.data == b"page-2"
+
+    assert await vision_model.async_batch_results(name, [None, None, None]) is None
+
+    backend.results_by_job[name] = [
+        BatchResult(
+            text="""```json
+{
+    "filename": "Daily-01-P20221030210759068713clbdtpKcEWTi.png",
+    "created_at": "2022-10-30T21:07:59.068713",
+    "label": "daily",
+    "date": "2022-10-30"
+}
+```"""
+        ),
+        BatchResult(error="INTERNAL"),
+    ]
+    results = await vision_model.async_batch_results(name, [None, None, None])
+    assert results is not None
+    page, error, missing = results
+    assert isinstance(page, JournalPage)
+    assert page.date == "2022-10-30"
+    assert isinstance(error, BatchJobError)
+    assert "INTERNAL" in str(error)
+    assert isinstance(missing, BatchJobError)
+
+    backend.failed.add(name)
+    with pytest.raises(BatchJobError):
+        await vision_model.async_batch_results(name, [None, None, None])
+
+
+async def test_batch_job_cache() -> None:
+    """Test batch jobs only submit pages missing from the extraction cache."""
+    backend = FakeBatchBackend()
+    cache = FakeExtractionCache()
+    vision_model = VisionModel(
+        AsyncMock(), VISION_MODEL_NAME, cache=cache, batch_backend=backend
+    )
+    pages = [
+        (Path("Daily-01-P20221030210759068713.png"), b"page-1"),
+        (Path("Daily-02-P20221031210759068713.png"), b"page-2"),
+    ]
+    submission = await vision_model.async_submit_batch(pages)
+    assert submission.name is not None
+    assert len(backend.jobs[submission.name]) == 2
+    cache_keys = list(submission.cache_keys.values())
+    assert all(cache_keys)
+
+    backend.results_by_job[submission.name] = [
+        BatchResult(text=PAGE_RESPONSE),
+        BatchResult(error="INTERNAL"),
+    ]
+    results = await vision_model.async_batch_results(submission.name, cache_keys)
+    assert results is not None
+    assert isinstance(results[0], JournalPage)
+    assert list(cache.pages) == cache_keys[:1]
+
+    # Only the page that failed is submitted again
+    submission = await vision_model.async_submit_batch(
+        [(Path("Daily-03-P20221101210759068713.png"), b"page-1"), pages[1]]
+    )
+    assert submission.cached == {
+        "Daily-03-P20221101210759068713.png": JournalPage(
+            filename="Daily-03-P20221101210759068713.png",
+            created_at="2022-11-01T21:07:59.068713",
+        )
+    }
+    assert list(submission.cache_keys) == ["Daily-02-P20221031210759068713.png"]
+    assert submission.name is not None
+    assert len(backend.jobs[submission.name]) == 1
+
+    # No job is submitted when every page is cached
+    submission = await vision_model.async_submit_batch(pages[:1])
+    assert submission.name is None
+    assert len(backend.jobs) == 2
+
+
+async def test_batch_job_unsupported() -> None:
+    """Test batch jobs require a batch backend."""
+    vision_model = VisionModel(AsyncMock(), VISION_MODEL_NAME)
+    with pytest.raises(BatchJobError):
+        await vision_model.async_submit_batch(
+            [(Path("Daily-01-P20221030210759068713clbdtpKcEWTi"), b"page-1")]
+        )
+
+
+async def test_warm_up() -> None:
+    """Test warming up the connection ignores errors from the model API."""
+    mock_genai = AsyncMock()
+    vision_model = VisionModel(mock_genai, VISION_MODEL_NAME)
+    await vision_model.async_warm_up()
+    mock_genai.aio.models.get.assert_awaited_once_with(model=VISION_MODEL_NAME)
+
+    mock_genai.aio.models.get.side_effect = errors.ClientError(
+        403, {"error": {"message": "Permission denied"}}
+    )
+    await vision_model.async_warm_up()
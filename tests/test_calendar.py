@@ -3,12 +3,14 @@
 import urllib
 from http import HTTPStatus
 
+from freezegun.api import FrozenDateTimeFactory
 import pytest
 from syrupy import SnapshotAssertion
 
 from homeassistant.core import HomeAssistant
 from homeassistant.const import Platform
 
+from pytest_homeassistant_custom_component.common import async_fire_time_changed
 from pytest_homeassistant_custom_component.typing import (
     ClientSessionGenerator,
 )
@@ -47,3 +49,36 @@ async def test_calendar(
         (event["start"], event["end"], event["summary"], event["description"])
         for event in resp
     ] == snapshot
+
+
+@pytest.mark.freeze_time("2023-12-19 10:00:00-06:00")
+@pytest.mark.usefixtures("config_entry")
+async def test_calendar_state_transitions(
+    hass: HomeAssistant,
+    freezer: FrozenDateTimeFactory,
+) -> None:
+    """Test the calendar state is updated when events start and end."""
+
+    state = hass.states.get("calendar.my_journal_daily")
+    assert state is not None
+    assert state.state == "on"
+    assert state.attributes["message"] == "Daily 2023-12-19"
+
+    # The next day's entry becomes active when the current one ends
+    freezer.move_to("2023-12-20 00:00:01-06:00")
+    async_fire_time_changed(hass)
+    await hass.async_block_till_done()
+
+    state = hass.states.get("calendar.my_journal_daily")
+    assert state is not None
+    assert state.state == "on"
+    assert state.attributes["message"] == "Daily 2023-12-20"
+
+    # No more entries after the last one ends
+    freezer.move_to("2023-12-23 00:00:01-06:00")
+    async_fire_time_changed(hass)
+    await hass.async_block_till_done()
+
+    state = hass.states.get("calendar.my_journal_daily")
+    assert state is not None
+    assert state.state == "off"
@@ -0,0 +1,181 @@
+"""Tests for the shared model API clients."""
+
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from freezegun.api import FrozenDateTimeFactory
+
+from homeassistant.const import CONF_NAME, EVENT_HOMEASSISTANT_CLOSE
+from homeassistant.core import HomeAssistant
+
+from pytest_homeassistant_custom_component.common import (
+    MockConfigEntry,
+    async_fire_time_changed,
+)
+
+from custom_components.journal_assistant.client import (
+    DATA_CLIENTS,
+    DATA_VISION_MODELS,
+    RELEASE_DELAY,
+    async_get_vision_model,
+    async_release_vision_model,
+)
+from custom_components.journal_assistant.const import (
+    CONF_MEDIA_SOURCE,
+    CONF_NOTES,
+    DOMAIN,
+)
+from custom_components.journal_assistant.processing.image import ImageOptions
+from custom_components.journal_assistant.processing.rate_limit import RateLimit
+
+from .conftest import MEDIA_SOURCE_PREFIX
+from .processing.test_vision_model import FakeCaches, FakeModels
+
+
+async def test_vision_model_reused_across_reloads(
+    hass: HomeAssistant,
+    config_entry: MockConfigEntry,
+    mock_warm_up: AsyncMock,
+) -> None:
+    """Test the vision model and client are reused when the entry is reloaded."""
+    vision_model = config_entry.runtime_data.vision_model
+    mock_warm_up.assert_awaited_once()
+
+    with patch("google.genai.Client") as mock_client:
+        assert await hass.config_entries.async_reload(config_entry.entry_id)
+        await hass.async_block_till_done()
+    mock_client.assert_not_called()
+    assert config_entry.runtime_data.vision_model is vision_model
+    mock_warm_up.assert_awaited_once()
+
+    # Another config entry with the same API key shares the vision model
+    other_entry = MockConfigEntry(
+        domain=DOMAIN,
+        options={
+            **config_entry.options,
+            CONF_NAME: "Other Journal",
+            CONF_NOTES: "Daily",
+            CONF_MEDIA_SOURCE: f"{MEDIA_SOURCE_PREFIX}/other",
+        },
+    )
+    other_entry.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(other_entry.entry_id)
+    await hass.async_block_till_done()
+    assert other_entry.runtime_data.vision_model is vision_model
+
+
+async def test_vision_model_per_options(
+    hass: HomeAssistant, mock_warm_up: AsyncMock
+) -> None:
+    """Test each API key and set of options has its own vision model."""
+    rate_limit = RateLimit(requests_per_minute=10, tokens_per_minute=1000)
+    vision_model = await async_get_vision_model(hass, "api-key-1", rate_limit)
+    other_model = await async_get_vision_model(hass, "api-key-2", rate_limit)
+    assert other_model is not vision_model
+    assert mock_warm_up.await_count == 2
+
+    assert await async_get_vision_model(hass, "api-key-1", rate_limit) is vision_model
+
+    # Other options get their own vision model sharing the client
+    new_limit = RateLimit(requests_per_minute=20, tokens_per_minute=1000)
+    new_model = await async_get_vision_model(hass, "api-key-1", new_limit)
+    assert new_model is not vision_model
+    assert new_model._client is vision_model._client
+    assert vision_model._rate_limiter is not None
+    assert vision_model._rate_limiter.limit == rate_limit
+    assert new_model._rate_limiter is not None
+    assert new_model._rate_limiter.limit == new_limit
+    assert mock_warm_up.await_count == 2
+
+    hass.bus.async_fire(EVENT_HOMEASSISTANT_CLOSE)
+    await hass.async_block_till_done()
+
+
+async def test_release_vision_model(
+    hass: HomeAssistant,
+    mock_warm_up: AsyncMock,
+    freezer: FrozenDateTimeFactory,
+) -> None:
+    """Test a vision model and its client are closed after the last user releases them."""
+    vision_model = await async_get_vision_model(hass, "api-key-1")
+    assert await async_get_vision_model(hass, "api-key-1") is vision_model
+    other_model = await async_get_vision_model(
+        hass, "api-key-1", image_options=ImageOptions()
+    )
+    _, transport = hass.data[DATA_CLIENTS]["api-key-1"]
+
+    async_release_vision_model(hass, vision_model)
+    async_release_vision_model(hass, vision_model)
+    async_release_vision_model(hass, other_model)
+
+    # Reacquiring before the delay keeps the vision model
+    assert await async_get_vision_model(hass, "api-key-1") is vision_model
+    freezer.tick(RELEASE_DELAY + 1)
+    async_fire_time_changed(hass)
+    await hass.async_block_till_done()
+    assert len(hass.data[DATA_VISION_MODELS]) == 1
+    assert "api-key-1" in hass.data[DATA_CLIENTS]
+
+    with patch.object(transport, "aclose") as mock_close:
+        async_release_vision_model(hass, vision_model)
+        freezer.tick(RELEASE_DELAY + 1)
+        async_fire_time_changed(hass)
+        await hass.async_block_till_done()
+    mock_close.assert_awaited_once()
+    assert not hass.data[DATA_VISION_MODELS]
+    assert not hass.data[DATA_CLIENTS]
+
+    assert await async_get_vision_model(hass, "api-key-1") is not vision_model
+    assert mock_warm_up.await_count == 2
+
+    hass.bus.async_fire(EVENT_HOMEASSISTANT_CLOSE)
+    await hass.async_block_till_done()
+
+
+@pytest.mark.parametrize(
+    ("context_caching", "cached_content"),
+    [(False, None), (True, "cachedContents/1")],
+)
+async def test_context_caching_option(
+    hass: HomeAssistant,
+    mock_warm_up: AsyncMock,
+    context_caching: bool,
+    cached_content: str | None,
+) -> None:
+    """Test system prompts are only cached with the model API when enabled."""
+    fake_client = SimpleNamespace(
+        aio=SimpleNamespace(models=FakeModels(), caches=FakeCaches())
+    )
+    with patch(
+        "custom_components.journal_assistant.client._create_client",
+        return_value=(fake_client, AsyncMock()),
+    ):
+        vision_model = await async_get_vision_model(
+            hass, "api-key-1", context_caching=context_caching
+        )
+    assert vision_model is not await async_get_vision_model(
+        hass, "api-key-1", context_caching=not context_caching
+    )
+
+    await vision_model.process_journal_page(
+        Path("Daily-01-P20221030210759068713"), b"content"
+    )
+    assert len(fake_client.aio.caches.created) == int(context_caching)
+    assert fake_client.aio.models.configs[0].cached_content == cached_content
+
+    hass.bus.async_fire(EVENT_HOMEASSISTANT_CLOSE)
+    await hass.async_block_till_done()
+
+
+async def test_pooled_connections(hass: HomeAssistant, mock_warm_up: AsyncMock) -> None:
+    """Test the client sends async requests with a pooled HTTP client."""
+    vision_model = await async_get_vision_model(hass, "54321")
+    api_client = vision_model._client._api_client
+    assert api_client.api_key == "54321"
+    assert not api_client._use_aiohttp()
+
+    hass.bus.async_fire(EVENT_HOMEASSISTANT_CLOSE)
+    await hass.async_block_till_done()
@@ -8,12 +8,23 @@ from homeassistant.data_entry_flow import FlowResultType
 from homeassistant.core import HomeAssistant
 from homeassistant.const import CONF_NAME
 
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
 
 from custom_components.journal_assistant.const import (
     DOMAIN,
     CONF_NOTES,
     CONF_API_KEY,
     CONF_MEDIA_SOURCE,
+    CONF_REQUESTS_PER_MINUTE,
+    CONF_TOKENS_PER_MINUTE,
+    CONF_PREPROCESS_IMAGES,
+    CONF_IMAGE_LONG_EDGE,
+    CONF_BATCH_BACKFILL,
+    CONF_PAGES_PER_REQUEST,
+    CONF_CONTEXT_CACHING,
+    CONF_EMBEDDING_BACKEND,
+    EMBEDDING_BACKEND_LOCAL,
 )
 
 
@@ -49,3 +60,47 @@ async def test_config_flow(hass: HomeAssistant) -> None:
         CONF_MEDIA_SOURCE: "media-source://test-domain/0",
     }
     assert len(mock_setup.mock_calls) == 1
+
+
+async def test_options_flow(hass: HomeAssistant) -> None:
+    """Test configuring the vision model rate limit and image preprocessing."""
+    options = {
+        CONF_NAME: "Title",
+        CONF_NOTES: "Daily\nWeekly\nMonthly",
+        CONF_API_KEY: "54321",
+        CONF_MEDIA_SOURCE: "media-source://test-domain/0",
+    }
+    config_entry = MockConfigEntry(domain=DOMAIN, options=options)
+    config_entry.add_to_hass(hass)
+
+    with patch(f"custom_components.{DOMAIN}.async_setup_entry", return_value=True):
+        result = await hass.config_entries.options.async_init(config_entry.entry_id)
+        assert result.get("type") is FlowResultType.FORM
+
+        result = await hass.config_entries.options.async_configure(
+            result["flow_id"],
+            {
+                CONF_REQUESTS_PER_MINUTE: 1000,
+                CONF_TOKENS_PER_MINUTE: 1000000,
+                CONF_PREPROCESS_IMAGES: True,
+                CONF_IMAGE_LONG_EDGE: 1024,
+                CONF_BATCH_BACKFILL: True,
+                CONF_PAGES_PER_REQUEST: 4,
+                CONF_CONTEXT_CACHING: True,
+                CONF_EMBEDDING_BACKEND: EMBEDDING_BACKEND_LOCAL,
+            },
+        )
+        await hass.async_block_till_done()
+
+    assert result.get("type") is FlowResultType.CREATE_ENTRY
+    assert config_entry.options == {
+        **options,
+        CONF_REQUESTS_PER_MINUTE: 1000,
+        CONF_TOKENS_PER_MINUTE: 1000000,
+        CONF_PREPROCESS_IMAGES: True,
+        CONF_IMAGE_LONG_EDGE: 1024,
+        CONF_BATCH_BACKFILL: True,
+        CONF_PAGES_PER_REQUEST: 4,
+        CONF_CONTEXT_CACHING: True,
+        CONF_EMBEDDING_BACKEND: EMBEDDING_BACKEND_LOCAL,
+    }
@@ -0,0 +1,98 @@
+"""Tests for the extraction cache."""
+
+import datetime
+from typing import Any
+from unittest.mock import patch
+
+from homeassistant.const import EVENT_HOMEASSISTANT_FINAL_WRITE
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt as dt_util
+
+from pytest_homeassistant_custom_component.common import async_fire_time_changed
+
+from custom_components.journal_assistant.extraction_cache import (
+    STORAGE_KEY,
+    SAVE_DELAY,
+    StoreExtractionCache,
+    async_get_extraction_cache,
+)
+from custom_components.journal_assistant.processing.model import (
+    JournalPage,
+    RapidLogEntry,
+)
+
+JOURNAL_PAGE = JournalPage(
+    filename="Daily-01-P20221030210759068713clbdtpKcEWTi.png",
+    created_at="2022-10-30T21:07:59.068713",
+    label="daily",
+    date="2022-10-30",
+    records=[RapidLogEntry(type="task", content="Write tests")],
+)
+
+
+async def test_extraction_cache(
+    hass: HomeAssistant, hass_storage: dict[str, Any]
+) -> None:
+    """Test extracted pages are persisted and shared by config entries."""
+    cache = async_get_extraction_cache(hass)
+    assert async_get_extraction_cache(hass) is cache
+
+    assert await cache.async_get("key-1") is None
+    await cache.async_put("key-1", JOURNAL_PAGE)
+    assert await cache.async_get("key-1") == JOURNAL_PAGE
+
+    async_fire_time_changed(
+        hass, dt_util.utcnow() + datetime.timedelta(seconds=SAVE_DELAY)
+    )
+    await hass.async_block_till_done()
+    stored = [
+        data["data"]["pages"]
+        for key, data in hass_storage.items()
+        if key.startswith(f"{STORAGE_KEY}.")
+    ]
+    assert stored == [{"key-1": JOURNAL_PAGE.to_dict(omit_none=True)}]
+
+    reloaded = StoreExtractionCache(hass)
+    assert await reloaded.async_get("key-1") == JOURNAL_PAGE
+
+
+async def test_extraction_cache_eviction(hass: HomeAssistant) -> None:
+    """Test the oldest extractions are evicted when the cache is full."""
+    cache = StoreExtractionCache(hass, max_entries=2, shards=1)
+    await cache.async_put("key-1", JOURNAL_PAGE)
+    await cache.async_put("key-2", JOURNAL_PAGE)
+    await cache.async_put("key-3", JOURNAL_PAGE)
+
+    assert await cache.async_get("key-1") is None
+    assert await cache.async_get("key-2") == JOURNAL_PAGE
+    assert await cache.async_get("key-3") == JOURNAL_PAGE
+
+
+async def test_extraction_cache_shards(
+    hass: HomeAssistant, hass_storage: dict[str, Any]
+) -> None:
+    """Test a save only rewrites the storage file holding the new extraction."""
+    hass_storage[STORAGE_KEY] = {
+        "version": 1,
+        "key": STORAGE_KEY,
+        "data": {"pages": {"key-0": JOURNAL_PAGE.to_dict(omit_none=True)}},
+    }
+    cache = StoreExtractionCache(hass, shards=4)
+    for index in range(1, 9):
+        await cache.async_put(f"key-{index}", JOURNAL_PAGE)
+    hass.bus.async_fire(EVENT_HOMEASSISTANT_FINAL_WRITE)
+    await hass.async_block_till_done()
+    # The legacy single storage file is removed
+    assert STORAGE_KEY not in hass_storage
+    assert await cache.async_get("key-0") is None
+
+    with patch(
+        "homeassistant.helpers.storage.Store.async_delay_save"
+    ) as mock_delay_save:
+        await cache.async_put("key-9", JOURNAL_PAGE)
+    mock_delay_save.assert_called_once()
+    assert len(mock_delay_save.call_args.args[0]()["pages"]) < 9
+
+    reloaded = StoreExtractionCache(hass, shards=4)
+    for index in range(1, 9):
+        assert await reloaded.async_get(f"key-{index}") == JOURNAL_PAGE
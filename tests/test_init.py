@@ -25,3 +25,12 @@ async def test_init(
     assert (
         config_entry.state is ConfigEntryState.NOT_LOADED  # type: ignore[comparison-overlap]
     )
+
+
+async def test_no_rate_limit_by_default(
+    hass: HomeAssistant,
+    config_entry: MockConfigEntry,
+) -> None:
+    """Test entries without a request quota are not rate limited."""
+
+    assert config_entry.runtime_data.vision_model._rate_limiter is None
@@ -0,0 +1,51 @@
+"""Tests for the local media watcher module."""
+
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from homeassistant.core import HomeAssistant
+
+from custom_components.journal_assistant.local_media_watcher import (
+    LocalMediaWatcher,
+    is_media_file,
+)
+
+
+@pytest.mark.parametrize(
+    ("path", "expected"),
+    [
+        ("Daily-01.png", True),
+        ("Notes/Daily-01.jpg", True),
+        ("Notes/README.txt", False),
+        (".hidden/Daily-01.png", False),
+        ("Notes/.Daily-01.png", False),
+    ],
+)
+def test_is_media_file(path: str, expected: bool) -> None:
+    """Test filtering files served by the local media source."""
+    assert is_media_file(Path(path)) == expected
+
+
+async def test_watch_changed_files(hass: HomeAssistant, tmp_path: Path) -> None:
+    """Test created and modified media files are reported."""
+    (tmp_path / "Notes").mkdir()
+    changed: set[Path] = set()
+    watcher = LocalMediaWatcher(hass, tmp_path, changed.add)
+    await hass.async_add_executor_job(watcher.start)
+    try:
+        await hass.async_add_executor_job(
+            (tmp_path / "Notes" / "Daily-01.png").write_bytes, b"image-content"
+        )
+        await hass.async_add_executor_job(
+            (tmp_path / "Notes" / "README.txt").write_text, "text"
+        )
+        for _ in range(50):
+            if changed:
+                break
+            await asyncio.sleep(0.1)
+    finally:
+        await hass.async_add_executor_job(watcher.stop)
+
+    assert changed == {Path("Notes/Daily-01.png")}
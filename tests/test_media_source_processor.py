@@ -1,13 +1,22 @@
 """Tests for the media source listener module."""
 
+import asyncio
+import dataclasses
+import hashlib
 import pytest
 import datetime
 from http import HTTPStatus
 import logging
 from unittest.mock import Mock, patch, AsyncMock
 from collections.abc import Generator
+from pathlib import Path
+from typing import Any
+
+from freezegun.api import FrozenDateTimeFactory
+from google.genai import errors
 
 from homeassistant.core import HomeAssistant
+from homeassistant.exceptions import HomeAssistantError
 from homeassistant.components.media_player import MediaClass, MediaType
 from homeassistant.components.media_source import (
     BrowseMediaSource,
@@ -16,9 +25,42 @@ from homeassistant.components.media_source import (
 from homeassistant.util import dt as dt_util
 
 from pytest_homeassistant_custom_component.common import (
+    MockConfigEntry,
     async_fire_time_changed,
 )
-from pytest_homeassistant_custom_component.test_util.aiohttp import AiohttpClientMocker
+from pytest_homeassistant_custom_component.test_util.aiohttp import (
+    AiohttpClientMocker,
+    mock_stream,
+)
+
+from custom_components.journal_assistant.hash_store import (
+    HashStore,
+    MAX_ATTEMPTS,
+    MAX_RETRY_BACKOFF,
+    MediaMetadata,
+    ScanStats,
+)
+from custom_components.journal_assistant.media_source_processor import (
+    DEFAULT_STAGE_CONFIGS,
+    HASH_CHUNK_SIZE,
+    FETCH_STAGE,
+    WATCH_DELAY,
+    WATCH_MAX_DELAY,
+    MediaContent,
+    MediaSourceProcessor,
+    ProcessItem,
+    ProcessMediaServiceCall,
+    VISION_STAGE,
+    async_hash_content,
+    local_media_path,
+)
+
+from custom_components.journal_assistant.processing.batch import BatchJobError
+from custom_components.journal_assistant.processing.model import JournalPage
+from custom_components.journal_assistant.processing.pipeline import StageConfig
+from custom_components.journal_assistant.processing.vision_model import (
+    BatchSubmission,
+)
 
 from .conftest import MEDIA_SOURCE_PREFIX, TEST_DOMAIN, MockMediaSource
 
@@ -42,9 +84,23 @@ def mock_process_item_fixture() -> Generator[Mock]:
     with patch(
         "custom_components.journal_assistant.ProcessMediaServiceCall"
     ) as mock_call:
-        mock_call.return_value.process = AsyncMock()
-        mock_call.return_value.process.return_value = True
-        yield mock_call.return_value.process  # mock_process.return_value.process_item
+        mock_call.return_value.extract = AsyncMock()
+        mock_call.return_value.extract.return_value = None
+        mock_call.return_value.write = AsyncMock()
+        yield mock_call.return_value.extract
+
+
+@pytest.fixture(autouse=True)
+def mock_retry_delay() -> Generator[None]:
+    """Retry failed pipeline stages without waiting."""
+    with patch.dict(
+        DEFAULT_STAGE_CONFIGS,
+        {
+            name: dataclasses.replace(config, retry_delay=0)
+            for name, config in DEFAULT_STAGE_CONFIGS.items()
+        },
+    ):
+        yield
 
 
 @pytest.mark.usefixtures("config_entry")
@@ -70,7 +126,7 @@ async def test_empty_media_source(
     now = dt_util.utcnow()
 
     async_fire_time_changed(hass, now + datetime.timedelta(hours=7))
-    await hass.async_block_till_done()
+    await hass.async_block_till_done(wait_background_tasks=True)
 
     mock_process_item.assert_not_awaited()
 
@@ -122,14 +178,20 @@ async def test_process_new_media_content(
 
     now = dt_util.utcnow()
     async_fire_time_changed(hass, now + datetime.timedelta(hours=7))
-    await hass.async_block_till_done()
+    await hass.async_block_till_done(wait_background_tasks=True)
 
-    mock_process_item.assert_awaited()
+    # The downloaded content is handed off without fetching it again
+    mock_process_item.assert_awaited_once_with(
+        hass,
+        f"{MEDIA_SOURCE_PREFIX}/image-content-1",
+        MediaContent(title="Image 1", content=b"image-content"),
+    )
+    assert aioclient_mock.call_count == 1
     mock_process_item.reset_mock()
 
     # Run again and verify no additional event is fired since the hash has not changed
     async_fire_time_changed(hass, now + datetime.timedelta(hours=14))
-    await hass.async_block_till_done()
+    await hass.async_block_till_done(wait_background_tasks=True)
 
     mock_process_item.assert_not_awaited()
 
@@ -140,9 +202,75 @@ async def test_process_new_media_content(
         content=b"image-content-updated",
     )
     async_fire_time_changed(hass, now + datetime.timedelta(hours=21))
-    await hass.async_block_till_done()
+    await hass.async_block_till_done(wait_background_tasks=True)
 
-    mock_process_item.assert_awaited()
+    # Changed content without validators is not downloaded a second time
+    mock_process_item.assert_awaited_once_with(
+        hass,
+        f"{MEDIA_SOURCE_PREFIX}/image-content-1",
+        MediaContent(title="Image 1", content=b"image-content-updated"),
+    )
+    assert aioclient_mock.call_count == 1
+
+
+async def test_newest_items_first(
+    hass: HomeAssistant,
+    mock_media_source: MockMediaSource,
+    aioclient_mock: AiohttpClientMocker,
+) -> None:
+    """Test the whole backlog is extracted newest first, not in browse order."""
+    # More items than the bounded stages hold, listed oldest first
+    count = 40
+    titles = {
+        f"image-{i}": f"Daily-01-P202501{i // 24 + 1:02}{i % 24:02}0405000000.png"
+        for i in range(count)
+    }
+    mock_media_source.browse_response = {
+        None: BrowseMediaSource(
+            domain=TEST_DOMAIN,
+            identifier="id",
+            media_class=MediaClass.ALBUM,
+            media_content_type=MediaType.ALBUM,
+            children=[
+                BrowseMediaSource(
+                    domain=TEST_DOMAIN,
+                    identifier=image,
+                    media_class=MediaClass.IMAGE,
+                    media_content_type=MediaType.IMAGE,
+                    title=title,
+                    can_expand=False,
+                    can_play=True,
+                )
+                for image, title in titles.items()
+            ],
+            title="Root",
+            can_expand=True,
+            can_play=False,
+        ),
+    }
+    for image in titles:
+        mock_media_source.resolve_response[image] = PlayMedia(
+            url=f"http://localhost/{image}.jpg", mime_type="image/jpeg"
+        )
+        aioclient_mock.get(f"http://localhost/{image}.jpg", content=image.encode())
+
+    process_item = Mock()
+    process_item.extract = AsyncMock(return_value=None)
+    processor = MediaSourceProcessor(
+        hass,
+        TEST_CONFIG_ENTRY_ID,
+        MEDIA_SOURCE_PREFIX,
+        process_item,
+        stage_configs={
+            FETCH_STAGE: StageConfig(concurrency=1, queue_size=0),
+            VISION_STAGE: StageConfig(concurrency=1, queue_size=8),
+        },
+    )
+    await processor.async_process_media(dt_util.utcnow())
+    await processor.async_detach()
+
+    extracted = [call.args[2].title for call in process_item.extract.await_args_list]
+    assert extracted == sorted(titles.values(), reverse=True)
 
 
 @pytest.mark.usefixtures("config_entry")
@@ -190,7 +318,7 @@ async def test_process_failure(
 
     now = dt_util.utcnow()
     async_fire_time_changed(hass, now + datetime.timedelta(hours=7))
-    await hass.async_block_till_done()
+    await hass.async_block_till_done(wait_background_tasks=True)
 
     # The event should not be fired as the download failed
     mock_process_item.assert_not_awaited()
@@ -260,7 +388,1046 @@ async def test_nested_folders(
 
     now = dt_util.utcnow()
     async_fire_time_changed(hass, now + datetime.timedelta(hours=7))
-    await hass.async_block_till_done()
+    await hass.async_block_till_done(wait_background_tasks=True)
 
     # Discovered a media item
     mock_process_item.assert_awaited()
+
+
+@pytest.mark.usefixtures("config_entry")
+async def test_conditional_request(
+    hass: HomeAssistant,
+    mock_process_item: Mock,
+    mock_media_source: MockMediaSource,
+    aioclient_mock: AiohttpClientMocker,
+) -> None:
+    """Test unchanged content is detected with a conditional request."""
+
+    mock_media_source.browse_response = {
+        None: BrowseMediaSource(
+            domain=TEST_DOMAIN,
+            identifier="id",
+            media_class=MediaClass.ALBUM,
+            media_content_type=MediaType.ALBUM,
+            children=[
+                BrowseMediaSource(
+                    domain=TEST_DOMAIN,
+                    identifier="image-content-1",
+                    media_class=MediaClass.IMAGE,
+                    media_content_type=MediaType.IMAGE,
+                    title="Image 1",
+                    can_expand=False,
+                    can_play=True,
+                )
+            ],
+            title="Root",
+            can_expand=True,
+            can_play=False,
+        ),
+    }
+    mock_media_source.resolve_response = {
+        "image-content-1": PlayMedia(
+            url="http://localhost/image-1.jpg",
+            mime_type="image/jpeg",
+        ),
+    }
+    aioclient_mock.get(
+        "http://localhost/image-1.jpg",
+        content=b"image-content",
+        headers={
+            "ETag": '"etag-1"',
+            "Last-Modified": "Wed, 21 Oct 2015 07:28:00 GMT",
+        },
+    )
+
+    now = dt_util.utcnow()
+    async_fire_time_changed(hass, now + datetime.timedelta(hours=7))
+    await hass.async_block_till_done(wait_background_tasks=True)
+
+    mock_process_item.assert_awaited()
+    mock_process_item.reset_mock()
+    assert not aioclient_mock.mock_calls[-1][3]
+
+    # The next scan sends the validators and skips the unmodified content
+    aioclient_mock.clear_requests()
+    aioclient_mock.get(
+        "http://localhost/image-1.jpg",
+        status=HTTPStatus.NOT_MODIFIED,
+    )
+    async_fire_time_changed(hass, now + datetime.timedelta(hours=14))
+    await hass.async_block_till_done(wait_background_tasks=True)
+
+    mock_process_item.assert_not_awaited()
+    headers = aioclient_mock.mock_calls[-1][3]
+    assert headers["If-None-Match"] == '"etag-1"'
+    assert headers["If-Modified-Since"] == "Wed, 21 Oct 2015 07:28:00 GMT"
+
+
+async def test_local_media_path(hass: HomeAssistant) -> None:
+    """Test mapping media source identifiers to local media files."""
+    hass.config.media_dirs = {"local": "/media"}
+
+    assert local_media_path(
+        hass, "media-source://media_source/local/Notes/Daily-01.png"
+    ) == Path("/media/Notes/Daily-01.png")
+    assert local_media_path(hass, "media-source://media_source/other/Daily.png") is None
+    assert local_media_path(hass, "media-source://media_source/local/../etc") is None
+    assert local_media_path(hass, f"{MEDIA_SOURCE_PREFIX}/image-content-1") is None
+
+
+@pytest.mark.usefixtures("config_entry")
+async def test_concurrent_scan(
+    hass: HomeAssistant,
+    mock_process_item: Mock,
+    mock_media_source: MockMediaSource,
+    aioclient_mock: AiohttpClientMocker,
+) -> None:
+    """Test that folders are crawled concurrently and extraction is bounded."""
+    folders = []
+    for folder in range(3):
+        folder_id = f"folder-{folder}"
+        folders.append(
+            BrowseMediaSource(
+                domain=TEST_DOMAIN,
+                identifier=folder_id,
+                media_class=MediaClass.ALBUM,
+                media_content_type=MediaType.ALBUM,
+                title=folder_id,
+                can_expand=True,
+                can_play=False,
+            )
+        )
+        images = []
+        for image in range(2):
+            image_id = f"image-{folder}-{image}"
+            images.append(
+                BrowseMediaSource(
+                    domain=TEST_DOMAIN,
+                    identifier=image_id,
+                    media_class=MediaClass.IMAGE,
+                    media_content_type=MediaType.IMAGE,
+                    title=image_id,
+                    can_expand=False,
+                    can_play=True,
+                )
+            )
+            mock_media_source.resolve_response[image_id] = PlayMedia(
+                url=f"http://localhost/{image_id}.jpg",
+                mime_type="image/jpeg",
+            )
+            aioclient_mock.get(
+                f"http://localhost/{image_id}.jpg", content=image_id.encode()
+            )
+        mock_media_source.browse_response[folder_id] = BrowseMediaSource(
+            domain=TEST_DOMAIN,
+            identifier=folder_id,
+            media_class=MediaClass.ALBUM,
+            media_content_type=MediaType.ALBUM,
+            children=images,
+            title=folder_id,
+            can_expand=True,
+            can_play=False,
+        )
+    mock_media_source.browse_response[None] = BrowseMediaSource(
+        domain=TEST_DOMAIN,
+        identifier="id",
+        media_class=MediaClass.ALBUM,
+        media_content_type=MediaType.ALBUM,
+        children=folders,
+        title="Root",
+        can_expand=True,
+        can_play=False,
+    )
+
+    active = 0
+    max_active = 0
+
+    async def extract(
+        hass: HomeAssistant, identifier: str, media_content: MediaContent | None
+    ) -> None:
+        nonlocal active, max_active
+        active += 1
+        max_active = max(max_active, active)
+        await asyncio.sleep(0)
+        active -= 1
+
+    mock_process_item.side_effect = extract
+
+    now = dt_util.utcnow()
+    async_fire_time_changed(hass, now + datetime.timedelta(hours=7))
+    await hass.async_block_till_done(wait_background_tasks=True)
+
+    assert mock_process_item.await_count == 6
+    assert max_active == DEFAULT_STAGE_CONFIGS[VISION_STAGE].concurrency
+
+
+@pytest.mark.parametrize(
+    ("algorithm", "expected_prefix"),
+    [
+        ("sha256", ""),
+        ("blake2b", "blake2b:"),
+    ],
+)
+async def test_hash_content(algorithm: str, expected_prefix: str) -> None:
+    """Test hashing streamed content across multiple chunks."""
+    content = b"x" * (HASH_CHUNK_SIZE * 2 + 1)
+    result = await async_hash_content(mock_stream(content), algorithm)
+    assert result == expected_prefix + hashlib.new(algorithm, content).hexdigest()
+
+
+async def test_hash_algorithm(
+    hass: HomeAssistant,
+    hass_storage: dict[str, Any],
+    mock_media_source: MockMediaSource,
+    aioclient_mock: AiohttpClientMocker,
+) -> None:
+    """Test new content is hashed with blake2b while existing sha256 hashes still match."""
+    key = f"journal_assistant/{TEST_CONFIG_ENTRY_ID}/hashes"
+    hass_storage[key] = {
+        "version": 1,
+        "minor_version": 1,
+        "key": key,
+        "data": {
+            "hashes": {
+                f"{MEDIA_SOURCE_PREFIX}/image-1": hashlib.sha256(
+                    b"image-1"
+                ).hexdigest(),
+            },
+        },
+    }
+    mock_media_source.browse_response = {
+        None: BrowseMediaSource(
+            domain=TEST_DOMAIN,
+            identifier="id",
+            media_class=MediaClass.ALBUM,
+            media_content_type=MediaType.ALBUM,
+            children=[
+                BrowseMediaSource(
+                    domain=TEST_DOMAIN,
+                    identifier=image,
+                    media_class=MediaClass.IMAGE,
+                    media_content_type=MediaType.IMAGE,
+                    title=image,
+                    can_expand=False,
+                    can_play=True,
+                )
+                for image in ("image-1", "image-2")
+            ],
+            title="Root",
+            can_expand=True,
+            can_play=False,
+        ),
+    }
+    for image in ("image-1", "image-2"):
+        mock_media_source.resolve_response[image] = PlayMedia(
+            url=f"http://localhost/{image}.jpg", mime_type="image/jpeg"
+        )
+        aioclient_mock.get(f"http://localhost/{image}.jpg", content=image.encode())
+
+    process_item = Mock()
+    process_item.extract = AsyncMock(return_value=None)
+    processor = MediaSourceProcessor(
+        hass, TEST_CONFIG_ENTRY_ID, MEDIA_SOURCE_PREFIX, process_item
+    )
+    with patch.object(hass.config_entries, "async_reload"):
+        await processor.async_process_media(dt_util.utcnow())
+    await processor.async_detach()
+
+    # The unchanged item is compared with the algorithm it was stored with
+    assert [call.args[1] for call in process_item.extract.await_args_list] == [
+        f"{MEDIA_SOURCE_PREFIX}/image-2"
+    ]
+    items = hass_storage[key]["data"]["items"]
+    assert ":" not in items["/image-1"][0]
+    assert items["/image-2"][0].startswith("blake2b:")
+
+
+async def test_hash_store_migration(
+    hass: HomeAssistant, hass_storage: dict[str, Any]
+) -> None:
+    """Test migrating the hash store to the compact storage format."""
+    key = f"journal_assistant/{TEST_CONFIG_ENTRY_ID}/hashes"
+    sha256 = hashlib.sha256(b"image-1").hexdigest()
+    blake2b = hashlib.blake2b(b"image-2").hexdigest()
+    hass_storage[key] = {
+        "version": 1,
+        "minor_version": 1,
+        "key": key,
+        "data": {
+            "scan_stats": {"scanned_files": 2},
+            "hashes": {
+                f"{MEDIA_SOURCE_PREFIX}/image-1": sha256,
+                "media-source://other/image-2": f"blake2b:{blake2b}",
+            },
+            "metadata": {
+                f"{MEDIA_SOURCE_PREFIX}/image-1": {"size": 10, "mtime_ns": 20},
+                "media-source://other/image-2": {},
+            },
+        },
+    }
+
+    store = HashStore(hass, TEST_CONFIG_ENTRY_ID, MEDIA_SOURCE_PREFIX)
+    await store.async_load()
+    assert store.scan_stats.scanned_files == 2
+    assert store.hashes == {
+        f"{MEDIA_SOURCE_PREFIX}/image-1": sha256,
+        "media-source://other/image-2": f"blake2b:{blake2b}",
+    }
+    assert store.metadata == {
+        f"{MEDIA_SOURCE_PREFIX}/image-1": MediaMetadata(size=10, mtime_ns=20),
+    }
+
+    # Updates are coalesced and only written on flush
+    store.hashes[f"{MEDIA_SOURCE_PREFIX}/image-3"] = sha256
+    store.async_schedule_save()
+    await store.async_flush()
+
+    data = hass_storage[key]
+    assert data["version"] == 2
+    items = data["data"]["items"]
+    assert items["/image-1"] == [items["/image-3"][0], None, None, 10, 20]
+    assert len(items["/image-3"][0]) < len(sha256)
+    assert items["media-source://other/image-2"][0].startswith("blake2b:")
+
+    reloaded = HashStore(hass, TEST_CONFIG_ENTRY_ID, MEDIA_SOURCE_PREFIX)
+    await reloaded.async_load()
+    assert reloaded.hashes == store.hashes
+    assert reloaded.metadata == store.metadata
+
+
+async def test_process_downloaded_content(
+    hass: HomeAssistant,
+    config_entry: MockConfigEntry,
+    aioclient_mock: AiohttpClientMocker,
+) -> None:
+    """Test processing already downloaded content without the service call."""
+    process_item = ProcessMediaServiceCall(config_entry.entry_id)
+    journal_page = JournalPage(
+        filename="Daily-01.png",
+        created_at="2022-10-30T21:07:00",
+        label="daily",
+        date="2022-10-30",
+    )
+    with (
+        patch(
+            "custom_components.journal_assistant.processing.vision_model.VisionModel.process_journal_page",
+            return_value=journal_page,
+        ) as mock_process,
+        patch(
+            "custom_components.journal_assistant.media_source_processor.save_journal_entry"
+        ) as mock_save,
+    ):
+        result = await process_item.extract(
+            hass,
+            f"{MEDIA_SOURCE_PREFIX}/Daily-01.png",
+            MediaContent(title="Daily-01", content=b"image-content"),
+        )
+        assert result == journal_page
+        await process_item.write(hass, "Daily-01", result)
+
+    mock_process.assert_awaited_once_with(Path("Daily-01"), b"image-content")
+    mock_save.assert_awaited_once_with(
+        hass, config_entry.entry_id, "Daily-01", journal_page
+    )
+    assert aioclient_mock.call_count == 0
+
+
+async def test_process_downloaded_content_api_error(
+    hass: HomeAssistant, config_entry: MockConfigEntry
+) -> None:
+    """Test a model API error extracting downloaded content is retried."""
+    process_item = ProcessMediaServiceCall(config_entry.entry_id)
+    with (
+        patch(
+            "custom_components.journal_assistant.processing.vision_model.VisionModel.process_journal_page",
+            side_effect=errors.ServerError(503, {"error": {"message": "overloaded"}}),
+        ),
+        pytest.raises(HomeAssistantError, match="overloaded"),
+    ):
+        await process_item.extract(
+            hass,
+            f"{MEDIA_SOURCE_PREFIX}/Daily-01.png",
+            MediaContent(title="Daily-01", content=b"image-content"),
+        )
+
+
+async def test_watch_local_media(hass: HomeAssistant, tmp_path: Path) -> None:
+    """Test changed files in a local media directory are processed without a full scan."""
+    hass.config.media_dirs = {"local": str(tmp_path)}
+    processor = MediaSourceProcessor(
+        hass,
+        TEST_CONFIG_ENTRY_ID,
+        "media-source://media_source/local",
+        Mock(),
+    )
+    with patch.object(MediaSourceProcessor, "_async_run_scan") as mock_run_scan:
+        await processor.async_attach()
+        try:
+            await hass.async_add_executor_job(
+                (tmp_path / "Daily-01.png").write_bytes, b"image-content"
+            )
+            for _ in range(50):
+                await asyncio.sleep(0.1)
+                async_fire_time_changed(
+                    hass, dt_util.utcnow() + datetime.timedelta(seconds=WATCH_DELAY)
+                )
+                await hass.async_block_till_done(wait_background_tasks=True)
+                if mock_run_scan.called:
+                    break
+        finally:
+            await processor.async_detach()
+            await hass.async_block_till_done()
+
+    assert mock_run_scan.call_count == 1
+    items = mock_run_scan.call_args.kwargs["items"]
+    assert [(item.identifier, item.title) for item in items] == [
+        ("media-source://media_source/local/Daily-01.png", "Daily-01.png")
+    ]
+
+
+async def test_watch_local_media_max_delay(
+    hass: HomeAssistant, freezer: FrozenDateTimeFactory
+) -> None:
+    """Test files that keep changing can't postpone processing indefinitely."""
+    processor = MediaSourceProcessor(
+        hass,
+        TEST_CONFIG_ENTRY_ID,
+        "media-source://media_source/local",
+        Mock(),
+    )
+    with patch.object(MediaSourceProcessor, "_async_run_scan") as mock_run_scan:
+        # Another file changes just before each change has settled
+        for i in range(WATCH_MAX_DELAY // (WATCH_DELAY - 1) + 1):
+            processor._async_file_changed(Path(f"Daily-{i:02}.png"))
+            freezer.tick(WATCH_DELAY - 1)
+            async_fire_time_changed(hass)
+            await hass.async_block_till_done()
+        await processor.async_detach()
+
+    assert mock_run_scan.call_count == 1
+    items = mock_run_scan.call_args.kwargs["items"]
+    assert len(items) == WATCH_MAX_DELAY // (WATCH_DELAY - 1) + 1
+
+
+async def test_resume_interrupted_scan(
+    hass: HomeAssistant,
+    hass_storage: dict[str, Any],
+    mock_media_source: MockMediaSource,
+    aioclient_mock: AiohttpClientMocker,
+) -> None:
+    """Test a scan resumes from the persisted crawl frontier."""
+    key = f"journal_assistant/{TEST_CONFIG_ENTRY_ID}/hashes"
+    hass_storage[key] = {
+        "version": 2,
+        "minor_version": 1,
+        "key": key,
+        "data": {
+            "scan_stats": {"scanned_folders": 1, "scanned_files": 1},
+            "prefix": MEDIA_SOURCE_PREFIX,
+            "items": {},
+            "frontier": {
+                "folders": ["/folder-1"],
+                "items": {"/image-2": "Image 2"},
+            },
+        },
+    }
+    # The root folder was already listed and is not browsed again
+    mock_media_source.browse_response = {
+        "folder-1": BrowseMediaSource(
+            domain=TEST_DOMAIN,
+            identifier="folder-1",
+            media_class=MediaClass.ALBUM,
+            media_content_type=MediaType.ALBUM,
+            children=[
+                BrowseMediaSource(
+                    domain=TEST_DOMAIN,
+                    identifier="image-1",
+                    media_class=MediaClass.IMAGE,
+                    media_content_type=MediaType.IMAGE,
+                    title="Image 1",
+                    can_expand=False,
+                    can_play=True,
+                )
+            ],
+            title="Folder 1",
+            can_expand=True,
+            can_play=False,
+        ),
+    }
+    for image in ("image-1", "image-2"):
+        mock_media_source.resolve_response[image] = PlayMedia(
+            url=f"http://localhost/{image}.jpg", mime_type="image/jpeg"
+        )
+        aioclient_mock.get(f"http://localhost/{image}.jpg", content=image.encode())
+
+    process_item = Mock()
+    process_item.extract = AsyncMock(return_value=None)
+    process_item.write = AsyncMock()
+    processor = MediaSourceProcessor(
+        hass, TEST_CONFIG_ENTRY_ID, MEDIA_SOURCE_PREFIX, process_item
+    )
+    with patch.object(hass.config_entries, "async_reload"):
+        await processor.async_attach()
+        await hass.async_block_till_done(wait_background_tasks=True)
+    await processor.async_detach()
+
+    assert sorted(call.args[1] for call in process_item.extract.await_args_list) == [
+        f"{MEDIA_SOURCE_PREFIX}/image-1",
+        f"{MEDIA_SOURCE_PREFIX}/image-2",
+    ]
+    assert processor.scan_stats.errors == 0
+    assert processor.scan_stats.scanned_files == 2
+    assert "frontier" not in hass_storage[key]["data"]
+    assert len(hass_storage[key]["data"]["items"]) == 2
+
+
+def _folder_with_image(folder_id: str, image_id: str) -> BrowseMediaSource:
+    """Return a folder browse response containing a single image."""
+    return BrowseMediaSource(
+        domain=TEST_DOMAIN,
+        identifier=folder_id,
+        media_class=MediaClass.ALBUM,
+        media_content_type=MediaType.ALBUM,
+        children=[
+            BrowseMediaSource(
+                domain=TEST_DOMAIN,
+                identifier=image_id,
+                media_class=MediaClass.IMAGE,
+                media_content_type=MediaType.IMAGE,
+                title=image_id,
+                can_expand=False,
+                can_play=True,
+            )
+        ],
+        title=folder_id,
+        can_expand=True,
+        can_play=False,
+    )
+
+
+async def test_resume_partially_listed_folder(
+    hass: HomeAssistant,
+    hass_storage: dict[str, Any],
+    mock_media_source: MockMediaSource,
+    aioclient_mock: AiohttpClientMocker,
+) -> None:
+    """Test items restored from the frontier are not queued again by their folder."""
+    key = f"journal_assistant/{TEST_CONFIG_ENTRY_ID}/hashes"
+    hass_storage[key] = {
+        "version": 2,
+        "minor_version": 1,
+        "key": key,
+        "data": {
+            "scan_stats": {"scanned_folders": 1, "scanned_files": 1},
+            "prefix": MEDIA_SOURCE_PREFIX,
+            "items": {},
+            # Interrupted after queuing the image but before the folder was done
+            "frontier": {
+                "folders": ["/folder-1"],
+                "items": {"/image-1": "image-1"},
+            },
+        },
+    }
+    mock_media_source.browse_response = {
+        "folder-1": _folder_with_image("folder-1", "image-1"),
+    }
+    mock_media_source.resolve_response["image-1"] = PlayMedia(
+        url="http://localhost/image-1.jpg", mime_type="image/jpeg"
+    )
+    aioclient_mock.get("http://localhost/image-1.jpg", content=b"image-1")
+
+    process_item = Mock()
+    process_item.extract = AsyncMock(return_value=None)
+    process_item.write = AsyncMock()
+    processor = MediaSourceProcessor(
+        hass, TEST_CONFIG_ENTRY_ID, MEDIA_SOURCE_PREFIX, process_item
+    )
+    with patch.object(hass.config_entries, "async_reload"):
+        await processor.async_attach()
+        await hass.async_block_till_done(wait_background_tasks=True)
+    await processor.async_detach()
+
+    assert aioclient_mock.call_count == 1
+    process_item.extract.assert_awaited_once()
+    assert processor.scan_stats.scanned_files == 1
+    assert "frontier" not in hass_storage[key]["data"]
+
+
+async def test_detach_cancels_scan(
+    hass: HomeAssistant,
+    hass_storage: dict[str, Any],
+    mock_media_source: MockMediaSource,
+    aioclient_mock: AiohttpClientMocker,
+) -> None:
+    """Test detaching stops a running scan and saves its frontier for the next listener."""
+    mock_media_source.browse_response = {
+        None: _folder_with_image("root", "image-1"),
+    }
+    mock_media_source.resolve_response["image-1"] = PlayMedia(
+        url="http://localhost/image-1.jpg", mime_type="image/jpeg"
+    )
+    aioclient_mock.get("http://localhost/image-1.jpg", content=b"image-1")
+
+    extracting = asyncio.Event()
+
+    async def extract(
+        hass: HomeAssistant, identifier: str, media_content: MediaContent | None
+    ) -> None:
+        extracting.set()
+        await asyncio.Event().wait()
+
+    process_item = Mock()
+    process_item.extract = AsyncMock(side_effect=extract)
+    process_item.write = AsyncMock()
+    processor = MediaSourceProcessor(
+        hass, TEST_CONFIG_ENTRY_ID, MEDIA_SOURCE_PREFIX, process_item
+    )
+    await processor.async_attach()
+    scan = hass.async_create_task(processor.async_process_media(dt_util.utcnow()))
+    await extracting.wait()
+    assert processor.scanning
+
+    await processor.async_detach()
+    assert scan.cancelled()
+    assert not processor.scanning
+    key = f"journal_assistant/{TEST_CONFIG_ENTRY_ID}/hashes"
+    assert hass_storage[key]["data"]["frontier"]["items"] == {"/image-1": "image-1"}
+
+    # The listener of the reloaded config entry resumes the scan
+    process_item.extract = AsyncMock(return_value=None)
+    resumed = MediaSourceProcessor(
+        hass, TEST_CONFIG_ENTRY_ID, MEDIA_SOURCE_PREFIX, process_item
+    )
+    await resumed.async_attach()
+    await hass.async_block_till_done(wait_background_tasks=True)
+    await resumed.async_detach()
+
+    process_item.extract.assert_awaited_once()
+    assert "frontier" not in hass_storage[key]["data"]
+
+
+async def test_retry_backoff_and_dead_letter(
+    hass: HomeAssistant,
+    hass_storage: dict[str, Any],
+    freezer: FrozenDateTimeFactory,
+    mock_media_source: MockMediaSource,
+    aioclient_mock: AiohttpClientMocker,
+) -> None:
+    """Test failed items are retried with backoff and then dead-lettered."""
+    identifier = f"{MEDIA_SOURCE_PREFIX}/image-1"
+    mock_media_source.browse_response = {
+        None: BrowseMediaSource(
+            domain=TEST_DOMAIN,
+            identifier="id",
+            media_class=MediaClass.ALBUM,
+            media_content_type=MediaType.ALBUM,
+            children=[
+                BrowseMediaSource(
+                    domain=TEST_DOMAIN,
+                    identifier="image-1",
+                    media_class=MediaClass.IMAGE,
+                    media_content_type=MediaType.IMAGE,
+                    title="Image 1",
+                    can_expand=False,
+                    can_play=True,
+                )
+            ],
+            title="Root",
+            can_expand=True,
+            can_play=False,
+        ),
+    }
+    mock_media_source.resolve_response = {
+        "image-1": PlayMedia(url="http://localhost/image-1.jpg", mime_type="image/jpeg")
+    }
+    aioclient_mock.get("http://localhost/image-1.jpg", content=b"image-1")
+
+    process_item = Mock()
+    process_item.extract = AsyncMock(side_effect=HomeAssistantError("quota"))
+    process_item.write = AsyncMock()
+    processor = MediaSourceProcessor(
+        hass, TEST_CONFIG_ENTRY_ID, MEDIA_SOURCE_PREFIX, process_item
+    )
+    with patch.object(hass.config_entries, "async_reload"):
+        # The vision stage retries within the scan before recording a failure
+        await processor.async_process_media(dt_util.utcnow())
+        assert process_item.extract.await_count == 3
+        failure = processor.failures[identifier]
+        assert failure.attempts == 1
+        assert failure.last_error == "quota"
+        assert not failure.dead_lettered
+
+        # The item is skipped until the backoff has elapsed
+        process_item.extract.reset_mock()
+        await processor.async_process_media(dt_util.utcnow())
+        process_item.extract.assert_not_awaited()
+        assert processor.scan_stats.skipped_items == 1
+
+        for _ in range(MAX_ATTEMPTS - 1):
+            freezer.tick(MAX_RETRY_BACKOFF)
+            await processor.async_process_media(dt_util.utcnow())
+        assert processor.failures[identifier].attempts == MAX_ATTEMPTS
+        assert list(processor.dead_letters) == [identifier]
+
+        # Dead-lettered items are persisted and no longer retried
+        key = f"journal_assistant/{TEST_CONFIG_ENTRY_ID}/hashes"
+        assert hass_storage[key]["data"]["failures"]["/image-1"]["next_attempt"] is None
+        process_item.extract.reset_mock()
+        freezer.tick(MAX_RETRY_BACKOFF * 10)
+        await processor.async_process_media(dt_util.utcnow())
+        process_item.extract.assert_not_awaited()
+
+        reloaded = HashStore(hass, TEST_CONFIG_ENTRY_ID, MEDIA_SOURCE_PREFIX)
+        await reloaded.async_load()
+        assert reloaded.failures == processor.failures
+
+        # Replaying the dead-letter list processes the item again
+        process_item.extract.side_effect = None
+        process_item.extract.return_value = None
+        assert processor.async_replay_dead_letters() == [identifier]
+        async_fire_time_changed(hass, dt_util.utcnow())
+        await hass.async_block_till_done(wait_background_tasks=True)
+        process_item.extract.assert_awaited_once()
+        assert processor.failures == {}
+        assert "failures" not in hass_storage[key]["data"]
+
+
+async def test_batch_backfill(
+    hass: HomeAssistant,
+    hass_storage: dict[str, Any],
+    mock_media_source: MockMediaSource,
+    aioclient_mock: AiohttpClientMocker,
+) -> None:
+    """Test a full scan submits changed items as a batch job and polls for results."""
+    titles = {
+        "image-1": "Daily-01-P20250102030405000000.png",
+        "image-2": "Daily-01-P20250103030405000000.png",
+        "image-3": "Daily-01-P20250104030405000000.png",
+    }
+    mock_media_source.browse_response = {
+        None: BrowseMediaSource(
+            domain=TEST_DOMAIN,
+            identifier="id",
+            media_class=MediaClass.ALBUM,
+            media_content_type=MediaType.ALBUM,
+            children=[
+                BrowseMediaSource(
+                    domain=TEST_DOMAIN,
+                    identifier=image,
+                    media_class=MediaClass.IMAGE,
+                    media_content_type=MediaType.IMAGE,
+                    title=title,
+                    can_expand=False,
+                    can_play=True,
+                )
+                for image, title in titles.items()
+            ],
+            title="Root",
+            can_expand=True,
+            can_play=False,
+        ),
+    }
+    for image in titles:
+        mock_media_source.resolve_response[image] = PlayMedia(
+            url=f"http://localhost/{image}.jpg", mime_type="image/jpeg"
+        )
+        aioclient_mock.get(f"http://localhost/{image}.jpg", content=image.encode())
+
+    journal_page = JournalPage(
+        filename=titles["image-2"], created_at="2025-01-03T03:04:05"
+    )
+    process_item = Mock()
+    process_item.extract = AsyncMock(return_value=None)
+    process_item.write = AsyncMock()
+    process_item.submit_batch = AsyncMock(
+        return_value=BatchSubmission(
+            name="batches/123",
+            cache_keys={
+                titles["image-1"]: None,
+                titles["image-2"]: "key-2",
+                titles["image-3"]: None,
+            },
+        )
+    )
+    process_item.batch_results = AsyncMock(return_value=None)
+    processor = MediaSourceProcessor(
+        hass,
+        TEST_CONFIG_ENTRY_ID,
+        MEDIA_SOURCE_PREFIX,
+        process_item,
+        batch_backfill=True,
+    )
+    key = f"journal_assistant/{TEST_CONFIG_ENTRY_ID}/hashes"
+    with patch.object(hass.config_entries, "async_reload") as mock_reload:
+        await processor.async_process_media(dt_util.utcnow())
+        process_item.extract.assert_not_awaited()
+        process_item.submit_batch.assert_awaited_once()
+        media_contents = process_item.submit_batch.await_args.args[1]
+        assert sorted(content.title for content in media_contents) == sorted(
+            titles.values()
+        )
+        assert list(processor.batch_jobs) == ["batches/123"]
+        assert "batches/123" in hass_storage[key]["data"]["batch_jobs"]
+        mock_reload.assert_not_called()
+
+        # Items waiting for the batch job are not submitted again
+        await processor.async_process_media(dt_util.utcnow())
+        process_item.submit_batch.assert_awaited_once()
+        assert processor.scan_stats.skipped_items == 3
+
+        # The job is still running
+        await processor.async_poll_batch_jobs(dt_util.utcnow())
+        process_item.write.assert_not_awaited()
+        assert list(processor.batch_jobs) == ["batches/123"]
+
+        # Results are written in the order the items were submitted
+        pages = processor.batch_jobs["batches/123"]
+        results: dict[str, JournalPage | Exception] = {
+            titles["image-1"]: BatchJobError("INTERNAL"),
+            titles["image-2"]: journal_page,
+            titles["image-3"]: ValueError("bad response"),
+        }
+        process_item.batch_results.return_value = [
+            results[page.title] for page in pages
+        ]
+        await processor.async_poll_batch_jobs(dt_util.utcnow())
+        await hass.async_block_till_done()
+        process_item.batch_results.assert_awaited_with(
+            hass,
+            "batches/123",
+            [page.cache_key for page in pages],
+        )
+        assert sorted(
+            page.cache_key for page in pages if page.cache_key is not None
+        ) == ["key-2"]
+        process_item.write.assert_awaited_once_with(
+            hass, titles["image-2"], journal_page
+        )
+        mock_reload.assert_called_once()
+    await processor.async_detach()
+
+    assert processor.batch_jobs == {}
+    # A failed request is retried but a bad response is skipped
+    assert list(processor.failures) == [f"{MEDIA_SOURCE_PREFIX}/image-1"]
+    data = hass_storage[key]["data"]
+    assert "batch_jobs" not in data
+    assert sorted(data["items"]) == ["/image-2", "/image-3"]
+
+
+async def test_batch_poll_during_scan(
+    hass: HomeAssistant, hass_storage: dict[str, Any]
+) -> None:
+    """Test batch jobs are not polled, or the integration reloaded, during a scan."""
+    key = f"journal_assistant/{TEST_CONFIG_ENTRY_ID}/hashes"
+    hass_storage[key] = {
+        "version": 2,
+        "minor_version": 1,
+        "key": key,
+        "data": {
+            "prefix": MEDIA_SOURCE_PREFIX,
+            "items": {},
+            "batch_jobs": {
+                "batches/123": [
+                    {
+                        "identifier": "/image-1",
+                        "title": "Daily-01",
+                        "content_hash": "blake2b:616263",
+                        "metadata": {},
+                    }
+                ]
+            },
+        },
+    }
+    journal_page = JournalPage(filename="Daily-01", created_at="2025-01-03T03:04:05")
+    polling = asyncio.Event()
+    finish_poll = asyncio.Event()
+
+    async def batch_results(
+        hass: HomeAssistant, name: str, cache_keys: list[str | None]
+    ) -> list[JournalPage]:
+        polling.set()
+        await finish_poll.wait()
+        return [journal_page]
+
+    process_item = Mock()
+    process_item.write = AsyncMock()
+    process_item.batch_results = AsyncMock(side_effect=batch_results)
+    processor = MediaSourceProcessor(
+        hass, TEST_CONFIG_ENTRY_ID, MEDIA_SOURCE_PREFIX, process_item
+    )
+    await processor.async_attach()
+    finish_scan = asyncio.Event()
+
+    async def process_media() -> ScanStats:
+        await finish_scan.wait()
+        return ScanStats()
+
+    with (
+        patch.object(processor, "_async_process_media", side_effect=process_media),
+        patch.object(hass.config_entries, "async_reload") as mock_reload,
+    ):
+        scan = hass.async_create_task(processor.async_process_media(dt_util.utcnow()))
+        assert processor.scanning
+        # Batch jobs are not polled while a scan is running
+        await processor.async_poll_batch_jobs(dt_util.utcnow())
+        process_item.batch_results.assert_not_awaited()
+        finish_scan.set()
+        await scan
+
+        # A scan started while polling reloads the integration once it ends
+        finish_scan.clear()
+        poll = hass.async_create_task(processor.async_poll_batch_jobs(dt_util.utcnow()))
+        await polling.wait()
+        scan = hass.async_create_task(processor.async_process_media(dt_util.utcnow()))
+        assert processor.scanning
+        finish_poll.set()
+        await poll
+        process_item.write.assert_awaited_once_with(hass, "Daily-01", journal_page)
+        mock_reload.assert_not_called()
+
+        finish_scan.set()
+        await scan
+        mock_reload.assert_called_once()
+    await processor.async_detach()
+
+
+async def test_packed_backfill(
+    hass: HomeAssistant,
+    mock_media_source: MockMediaSource,
+    aioclient_mock: AiohttpClientMocker,
+) -> None:
+    """Test a full scan packs changed items of the same notebook into requests."""
+    titles = {
+        "image-1": "Daily-01-P20250102030405000000.png",
+        "image-2": "Daily-02-P20250103030405000000.png",
+        "image-3": "Daily-03-P20250104030405000000.png",
+        "image-4": "Weekly-01-P20250102030405000000.png",
+    }
+    mock_media_source.browse_response = {
+        None: BrowseMediaSource(
+            domain=TEST_DOMAIN,
+            identifier="id",
+            media_class=MediaClass.ALBUM,
+            media_content_type=MediaType.ALBUM,
+            children=[
+                BrowseMediaSource(
+                    domain=TEST_DOMAIN,
+                    identifier=image,
+                    media_class=MediaClass.IMAGE,
+                    media_content_type=MediaType.IMAGE,
+                    title=title,
+                    can_expand=False,
+                    can_play=True,
+                )
+                for image, title in titles.items()
+            ],
+            title="Root",
+            can_expand=True,
+            can_play=False,
+        ),
+    }
+    for image in titles:
+        mock_media_source.resolve_response[image] = PlayMedia(
+            url=f"http://localhost/{image}.jpg", mime_type="image/jpeg"
+        )
+        aioclient_mock.get(f"http://localhost/{image}.jpg", content=image.encode())
+
+    async def extract_pages(
+        hass: HomeAssistant, media_contents: list[MediaContent]
+    ) -> dict[str, JournalPage | ValueError]:
+        results: dict[str, JournalPage | ValueError] = {}
+        for media_content in media_contents:
+            if media_content.title == titles["image-3"]:
+                results[media_content.title] = ValueError("bad response")
+            elif media_content.title != titles["image-4"]:
+                results[media_content.title] = JournalPage(
+                    filename=media_content.title, created_at="2025-01-02T03:04:05"
+                )
+        return results
+
+    process_item = Mock()
+    process_item.extract = AsyncMock(return_value=None)
+    process_item.extract_pages = AsyncMock(side_effect=extract_pages)
+    process_item.write = AsyncMock()
+    processor = MediaSourceProcessor(
+        hass,
+        TEST_CONFIG_ENTRY_ID,
+        MEDIA_SOURCE_PREFIX,
+        process_item,
+        pages_per_request=2,
+    )
+    with patch.object(hass.config_entries, "async_reload"):
+        await processor.async_process_media(dt_util.utcnow())
+        await hass.async_block_till_done()
+    await processor.async_detach()
+
+    process_item.extract.assert_not_awaited()
+    # Up to two pages of each notebook are packed into one request
+    packs = [
+        [content.title.split("-")[0] for content in call.args[1]]
+        for call in process_item.extract_pages.await_args_list
+    ]
+    assert sorted(packs) == [["Daily"], ["Daily", "Daily"], ["Weekly"]]
+    # A page the model could not read is skipped like when extracted on its own
+    written = [call.args[1] for call in process_item.write.await_args_list]
+    assert sorted(written) == [titles["image-1"], titles["image-2"]]
+    # A page missing from the response is retried by a later scan
+    assert list(processor.failures) == [f"{MEDIA_SOURCE_PREFIX}/image-4"]
+
+
+async def test_batch_backfill_cached(
+    hass: HomeAssistant,
+    mock_media_source: MockMediaSource,
+    aioclient_mock: AiohttpClientMocker,
+) -> None:
+    """Test items already extracted are written without waiting for a batch job."""
+    title = "Daily-01-P20250102030405000000.png"
+    mock_media_source.browse_response = {
+        None: BrowseMediaSource(
+            domain=TEST_DOMAIN,
+            identifier="id",
+            media_class=MediaClass.ALBUM,
+            media_content_type=MediaType.ALBUM,
+            children=[
+                BrowseMediaSource(
+                    domain=TEST_DOMAIN,
+                    identifier="image-1",
+                    media_class=MediaClass.IMAGE,
+                    media_content_type=MediaType.IMAGE,
+                    title=title,
+                    can_expand=False,
+                    can_play=True,
+                )
+            ],
+            title="Root",
+            can_expand=True,
+            can_play=False,
+        ),
+    }
+    mock_media_source.resolve_response["image-1"] = PlayMedia(
+        url="http://localhost/image-1.jpg", mime_type="image/jpeg"
+    )
+    aioclient_mock.get("http://localhost/image-1.jpg", content=b"image-1")
+
+    journal_page = JournalPage(filename=title, created_at="2025-01-02T03:04:05")
+    process_item = Mock()
+    process_item.write = AsyncMock()
+    process_item.submit_batch = AsyncMock(
+        return_value=BatchSubmission(cached={title: journal_page})
+    )
+    processor = MediaSourceProcessor(
+        hass,
+        TEST_CONFIG_ENTRY_ID,
+        MEDIA_SOURCE_PREFIX,
+        process_item,
+        batch_backfill=True,
+    )
+    with patch.object(hass.config_entries, "async_reload") as mock_reload:
+        await processor.async_process_media(dt_util.utcnow())
+        await hass.async_block_till_done()
+    await processor.async_detach()
+
+    process_item.write.assert_awaited_once_with(hass, title, journal_page)
+    assert processor.batch_jobs == {}
+    assert processor.scan_stats.processed_files == 1
+    mock_reload.assert_called_once()
@@ -32,6 +32,8 @@ async def test_vector_db_count(
         ("sensor.my_journal_processed_files", "0"),
         ("sensor.my_journal_skipped_items", "0"),
         ("sensor.my_journal_errors", "0"),
+        ("sensor.my_journal_queued_items", "0"),
+        ("sensor.my_journal_dead_lettered_items", "0"),
         ("sensor.my_journal_last_scan_start", "unknown"),
         ("sensor.my_journal_last_scan_end", "unknown"),
     ],
@@ -62,7 +62,7 @@ async def test_process_media(
 
     with (
         patch(
-            "custom_components.journal_assistant.VisionModel.process_journal_page"
+            "custom_components.journal_assistant.processing.vision_model.VisionModel.process_journal_page"
         ) as mock_process,
         patch("custom_components.journal_assistant.processing.journal.write_content"),
     ):
@@ -121,3 +121,31 @@ async def test_invalid_config_entry(
             },
             blocking=True,
         )
+
+
+@pytest.mark.usefixtures("config_entry")
+async def test_failed_media(
+    hass: HomeAssistant,
+    config_entry: MockConfigEntry,
+) -> None:
+    """Test service calls to inspect and replay failed media items."""
+    assert hass.services.has_service(DOMAIN, "list_failed_media")
+    assert hass.services.has_service(DOMAIN, "replay_failed_media")
+
+    response = await hass.services.async_call(
+        DOMAIN,
+        "list_failed_media",
+        {"config_entry_id": config_entry.entry_id},
+        blocking=True,
+        return_response=True,
+    )
+    assert response == {"items": []}
+
+    response = await hass.services.async_call(
+        DOMAIN,
+        "replay_failed_media",
+        {"config_entry_id": config_entry.entry_id},
+        blocking=True,
+        return_response=True,
+    )
+    assert response == {"items": []}